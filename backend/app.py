@@ -1,4 +1,6 @@
-from flask import Flask, jsonify
+import time
+
+from flask import Flask, g, jsonify, request
 from db import SessionLocal
 from routes.districts import bp as districts_bp
 from routes.cooling_sites import bp as cooling_sites_bp
@@ -8,6 +10,13 @@ from routes.devices import bp as devices_bp
 from routes.notify_internal import bp as notify_internal_bp
 from routes.aed_sites import bp as aed_sites_bp
 from routes.aqi import bp as aqi_bp
+from routes.batch import bp as batch_bp
+from routes.context import bp as context_bp
+from routes.metrics import bp as metrics_bp
+from routes.tiles import bp as tiles_bp
+from services import metrics
+from services.cams_prefetch import start_prefetcher
+from services.forecast_store import start_forecast_refresher
 
 
 def create_app() -> Flask:
@@ -26,6 +35,16 @@ def create_app() -> Flask:
     app.register_blueprint(tempdiff_bp)
     app.register_blueprint(aed_sites_bp)
     app.register_blueprint(aqi_bp)
+    app.register_blueprint(batch_bp)
+    app.register_blueprint(context_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(tiles_bp)
+
+    # CAMS PM2.5 背景預抓（CAMS_PREFETCH=0 可關閉）
+    start_prefetcher()
+    # CWA 熱傷害 / 溫差預報落地（CWA_REFRESH=0 可關閉）
+    start_forecast_refresher()
+
     @app.errorhandler(400)
     def bad_request(e):
         return jsonify(error=str(getattr(e, "description", e))), 400
@@ -34,6 +53,25 @@ def create_app() -> Flask:
     def internal_error(_e):
         return jsonify(error="internal server error"), 500
 
+    # 每個路由的延遲（route 用規則字串，例如 /sites/nearest，避免 label 爆量）
+    @app.before_request
+    def start_timer():
+        g.metrics_t0 = time.perf_counter()
+        metrics.HTTP_IN_FLIGHT.inc()
+
+    @app.after_request
+    def record_latency(resp):
+        t0 = g.get("metrics_t0")
+        if t0 is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            metrics.observe_request(request.method, route, resp.status_code, time.perf_counter() - t0)
+        return resp
+
+    @app.teardown_request
+    def end_timer(_exc):
+        if g.pop("metrics_t0", None) is not None:
+            metrics.HTTP_IN_FLIGHT.dec()
+
     @app.teardown_appcontext
     def remove_session(_exc):
         try:
@@ -0,0 +1,184 @@
+# backend/asgi.py
+"""
+ASGI 入口（uvicorn asgi:app）。
+
+- 會等上游的路由改用 async 版：/heat/forecast、/tempdiff/forecast、/aqi/pm25、/aqi/grid、/internal/notify
+  上游（CWA / FCM）等待中只佔一個 coroutine，不佔 worker thread
+- 資料庫走 asyncpg（AsyncSession）；行政區、CAMS 格點照舊用記憶體索引
+- 其餘路由原封不動交給 Flask app（a2wsgi 包成 ASGI，在 thread pool 裡跑）
+- 回傳格式、錯誤碼與 Flask 版相同
+"""
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from a2wsgi import WSGIMiddleware
+from flask import Flask
+from sqlalchemy import select
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.exceptions import BadRequest, HTTPException
+
+from app import create_app
+from db import dispose_async_engine, get_async_sessionmaker
+from models import DeviceToken
+from routes.notify_internal import _check_auth
+from services import metrics, push_service_rest
+from services.aqi_service import aget_aqi_by_point_cached, aget_aqi_grid
+from services.district_service import aget_district_by_point
+from services.heat_service import afetch_heat_forecast_for_town
+from services.push_fanout import start_district_fanout
+from services.tempdiff_service import afetch_tempdiff_forecast_for_town
+
+log = logging.getLogger(__name__)
+
+
+def _json_errors(handler):
+    """
+    與 Flask 的 errorhandler 對齊：400 → {"error": 描述}、未預期的例外 → 500 JSON，
+    其他 HTTPException（401 等）同 Flask 輸出 werkzeug 預設頁；並記錄路由延遲。
+    """
+    async def wrapped(request: Request):
+        t0 = time.perf_counter()
+        metrics.HTTP_IN_FLIGHT.inc()
+        try:
+            resp = await handler(request)
+        except HTTPException as e:
+            if e.code == 400:
+                resp = JSONResponse({"error": e.description}, status_code=e.code)
+            else:
+                resp = Response(e.get_body(), status_code=e.code, media_type="text/html")
+        except Exception:
+            log.exception("unhandled error on %s", request.url.path)
+            resp = JSONResponse({"error": "internal server error"}, status_code=500)
+        finally:
+            metrics.HTTP_IN_FLIGHT.dec()
+        metrics.observe_request(request.method, request.url.path, resp.status_code, time.perf_counter() - t0)
+        return resp
+    return wrapped
+
+
+def _lat_lon(request: Request):
+    try:
+        return float(request.query_params["lat"]), float(request.query_params["lon"])
+    except Exception:
+        raise BadRequest("lat/lon required")
+
+
+async def _forecast(request: Request, fetch):
+    lat, lon = _lat_lon(request)
+    session_factory = get_async_sessionmaker()
+    district = await aget_district_by_point(session_factory, lat, lon)
+    result = await fetch(session_factory, district) if district else None
+    if not result:
+        return JSONResponse({"note": "no data"})
+    return JSONResponse(result)
+
+
+@_json_errors
+async def heat_forecast(request: Request):
+    """根據使用者經緯度，回傳所在區的未來所有熱傷害指數預報"""
+    return await _forecast(request, afetch_heat_forecast_for_town)
+
+
+@_json_errors
+async def tempdiff_forecast(request: Request):
+    """依 lat/lon 判斷行政區，回傳該區溫差提醒指數"""
+    return await _forecast(request, afetch_tempdiff_forecast_for_town)
+
+
+@_json_errors
+async def aqi_pm25(request: Request):
+    lat, lon = _lat_lon(request)
+    result = await aget_aqi_by_point_cached(lat, lon)
+    return JSONResponse(result, status_code=200 if "error" not in result else 503)
+
+
+@_json_errors
+async def aqi_grid(request: Request):
+    """整片 CAMS 格點的 AQI；格點還沒載入時與 /aqi/pm25 一樣先從 aqi_grid_cache 載回"""
+    lead = request.query_params.get("lead")
+    try:
+        lead_hour = int(lead) if lead is not None else None
+    except Exception:
+        raise BadRequest("invalid lead (hours)")
+
+    result = await aget_aqi_grid(lead_hour)
+    if result is None:
+        return JSONResponse({"error": "CAMS data not ready yet"}, status_code=503)
+    if lead_hour is not None and not result["leads"]:
+        raise BadRequest("unknown lead hour")
+    return JSONResponse(result, headers={"Cache-Control": "public, max-age=300"})
+
+
+@_json_errors
+async def internal_notify(request: Request):
+    _check_auth(request)
+    try:
+        js = await request.json()
+    except Exception:
+        js = None
+    js = js if isinstance(js, dict) else {}
+    title = js.get("title") or "通知"
+    body = js.get("body") or ""
+    try:
+        data = push_service_rest.validate_message(title, body, js.get("data"))
+    except ValueError as e:
+        raise BadRequest(str(e))
+    token = js.get("token")
+    topic = js.get("topic")
+    user_id = js.get("user_id")
+    tokens = js.get("tokens")
+    district = js.get("district")
+
+    if topic:
+        return JSONResponse(await push_service_rest.asend_to_topic(topic, title, body, data))
+
+    if token:
+        return JSONResponse(await push_service_rest.asend_to_token(token, title, body, data))
+
+    if tokens and isinstance(tokens, list):
+        return JSONResponse(await push_service_rest.asend_multicast(tokens, title, body, data))
+
+    if district:
+        return JSONResponse(start_district_fanout(district, title, body, data), status_code=202)
+
+    if user_id:
+        async with get_async_sessionmaker()() as s:
+            ts = (await s.execute(
+                select(DeviceToken.fcm_token).where(DeviceToken.user_id == user_id)
+            )).scalars().all()
+        if not ts:
+            return JSONResponse({"success": False, "reason": "no tokens for user"}, status_code=404)
+        return JSONResponse(await push_service_rest.asend_multicast(ts, title, body, data))
+
+    raise BadRequest("need one of: token | tokens[] | topic | district | user_id")
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    yield
+    await push_service_rest.aclose()
+    await dispose_async_engine()
+
+
+def create_asgi_app(flask_app: Optional[Flask] = None) -> Starlette:
+    # create_app() 會註冊所有 blueprint 並啟動 CAMS 預抓
+    flask_app = flask_app or create_app()
+    return Starlette(
+        routes=[
+            Route("/heat/forecast", heat_forecast, methods=["GET"]),
+            Route("/tempdiff/forecast", tempdiff_forecast, methods=["GET"]),
+            Route("/aqi/pm25", aqi_pm25, methods=["GET"]),
+            Route("/aqi/grid", aqi_grid, methods=["GET"]),
+            Route("/internal/notify", internal_notify, methods=["POST"]),
+            Mount("/", app=WSGIMiddleware(flask_app)),
+        ],
+        lifespan=lifespan,
+    )
+
+
+app = create_asgi_app()
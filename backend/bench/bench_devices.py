@@ -0,0 +1,128 @@
+# backend/bench/bench_devices.py
+"""
+裝置註冊吞吐：舊版（SELECT + ORM insert/update）vs 單一 upsert vs 批次 upsert。
+
+直接對資料庫量（不經 HTTP），每種方式以 N 個 thread 持續註冊 --duration 秒，
+token 一半是新的、一半重複（模擬 App 每次啟動都重新註冊）。
+結束後刪除所有 bench- 開頭的 token。
+
+用法（在 web 容器內或 backend/ 目錄）：
+  python -m bench.bench_devices --duration 10 --threads 8 --batch-sizes 100,1000,5000
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import select, text
+
+from bench.stats import latency_summary
+from db import SessionLocal
+from models import DeviceToken
+from services.device_service import register_device, register_devices
+
+PREFIX = "bench-dev-"
+
+
+def legacy_register(session, token: str, user_id: str, platform: str) -> None:
+    """舊版 routes/devices.py：先 SELECT 再 ORM 更新或新增"""
+    existing = session.execute(select(DeviceToken).where(DeviceToken.fcm_token == token)).scalar_one_or_none()
+    if existing:
+        existing.user_id = user_id
+        existing.platform = platform
+    else:
+        session.add(DeviceToken(fcm_token=token, user_id=user_id, platform=platform))
+    session.commit()
+
+
+def _token(counter, pool: int) -> str:
+    # 偶數為新 token、奇數落在前 pool 個（重複註冊）
+    n = next(counter)
+    return f"{PREFIX}{n if n % 2 == 0 else n % pool}"
+
+
+def _run(name: str, threads: int, duration: float, unit: int,
+         call: Callable[[Any, Any], None]) -> Dict[str, Any]:
+    counter = itertools.count()
+    lat_ms: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        s = SessionLocal()
+        local: List[float] = []
+        try:
+            while time.monotonic() < deadline:
+                t0 = time.perf_counter()
+                try:
+                    call(s, counter)
+                except Exception:
+                    s.rollback()
+                    with lock:
+                        errors[0] += 1
+                    continue
+                local.append((time.perf_counter() - t0) * 1000)
+        finally:
+            SessionLocal.remove()
+            with lock:
+                lat_ms.extend(local)
+
+    started = time.monotonic()
+    ts = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    elapsed = time.monotonic() - started
+    out = {"case": name, "errors": errors[0], "calls": len(lat_ms), **latency_summary(lat_ms, elapsed)}
+    out["tokens_per_sec"] = round(len(lat_ms) * unit / elapsed, 1) if elapsed else None
+    return out
+
+
+def _cleanup() -> None:
+    s = SessionLocal()
+    try:
+        s.execute(text("DELETE FROM device_tokens WHERE fcm_token LIKE :p"), {"p": PREFIX + "%"})
+        s.commit()
+    finally:
+        s.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--duration", type=float, default=10.0, help="每種方式持續幾秒")
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--batch-sizes", default="100,1000,5000")
+    ap.add_argument("--pool", type=int, default=5000, help="重複註冊的 token 池大小")
+    ap.add_argument("--out", help="輸出 JSON 檔（預設印到 stdout）")
+    args = ap.parse_args()
+
+    def one(fn):
+        return lambda s, c: fn(s, _token(c, args.pool), "bench-user", "android")
+
+    def batch(size):
+        return lambda s, c: register_devices(
+            s, [(_token(c, args.pool), "bench-user", "android", None) for _ in range(size)])
+
+    results = []
+    try:
+        results.append(_run("legacy_select_then_write", args.threads, args.duration, 1, one(legacy_register)))
+        results.append(_run("upsert_single", args.threads, args.duration, 1, one(register_device)))
+        for size in (int(x) for x in args.batch_sizes.split(",") if x.strip()):
+            results.append(_run(f"upsert_batch_{size}", args.threads, args.duration, size, batch(size)))
+    finally:
+        _cleanup()
+
+    body = json.dumps({"threads": args.threads, "duration_sec": args.duration, "results": results},
+                      ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(body)
+    print(body)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# backend/bench/bench_geojson.py
+"""
+比較 GeoJSON 兩種組裝方式的 CPU 與延遲：
+
+  python：撈 ORM 列 → 組 dict → 編碼（orjson，沒裝時退回 json）
+  db    ：PostGIS 以 json_build_object / json_agg 組好，Python 只接上外框
+
+每個案例量兩段：
+  build   ：只呼叫組裝函式（不含壓縮），即快照 miss 時的編碼成本
+  request ：經 Flask test client 的完整請求；cold 每次先 invalidate 快照，warm 則直接命中快照
+bbox 串流（/sites?bbox=...）不走快照，只量 request。
+
+前置：資料庫已匯入 AED 與納涼地點（make seed、make import-aed）。
+
+量測結果（--repeat 30，p50 毫秒；web process 的 CPU，不含資料庫端）：
+  環境：1 vCPU、PostgreSQL 18（無 PostGIS，geometry 以 EWKT 文字 + SQL 版 ST_AsGeoJSON 代替）、
+  AED 2728 筆、納涼地點 521 筆；「前」為 python + 標準庫 json，「後」為 db + orjson 3.8.3
+                              前 CPU   後 CPU    前 wall   後 wall
+  /aeds 快照 miss（含壓縮）    314.1    134.7     355.2     163.6
+  /sites?limit=1000 快照 miss  101.5     50.5     119.0      66.6
+  /sites bbox 串流（每請求）    93.9     35.8     121.8      58.3
+  快照命中（兩種都是）           ~0.5     ~0.5
+  python + orjson 介於中間（/aeds miss 265.1、/sites miss 77.6、bbox 73.6），主要省在 db 不逐列解析。
+  wall 只供參考：資料庫端用的不是 PostGIS，且與 bench 共用同一顆 CPU。
+用法（在 web 容器內或 backend/ 目錄）：
+  python -m bench.bench_geojson --repeat 30 --out bench_geojson.json
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from bench.stats import pct
+from db import SessionLocal
+from services import geojson_snapshot, json_codec
+from services.aed_service import all_aeds_geojson_body
+from services.cooling_sites_service import cooling_sites_page_body
+
+MODES = ("python", "db")
+SITES_PAGE = "/sites?limit=1000"
+SITES_BBOX = "/sites?bbox=121.45,24.95,121.65,25.15&limit=1000"
+
+
+def _summary(cpu_ms: List[float], wall_ms: List[float], size: int) -> Dict[str, Any]:
+    return {
+        "cpu_p50_ms": round(statistics.median(cpu_ms), 3),
+        "cpu_mean_ms": round(statistics.fmean(cpu_ms), 3),
+        "wall_p50_ms": round(statistics.median(wall_ms), 3),
+        "wall_p95_ms": round(pct(wall_ms, 95), 3),
+        "bytes": size,
+    }
+
+
+def _measure(fn: Callable[[], bytes], repeat: int, warmup: int) -> Dict[str, Any]:
+    for _ in range(warmup):
+        fn()
+    cpu_ms, wall_ms, size = [], [], 0
+    for _ in range(repeat):
+        c0, t0 = time.process_time(), time.perf_counter()
+        size = len(fn())
+        wall_ms.append((time.perf_counter() - t0) * 1000)
+        cpu_ms.append((time.process_time() - c0) * 1000)
+    return _summary(cpu_ms, wall_ms, size)
+
+
+def _get(client, path: str, cold: bool) -> Callable[[], bytes]:
+    def fn() -> bytes:
+        if cold:
+            geojson_snapshot.invalidate("aed_sites")
+            geojson_snapshot.invalidate("cooling_sites")
+        resp = client.get(path)
+        if resp.status_code != 200:
+            raise RuntimeError(f"{path} -> {resp.status_code}")
+        return resp.get_data()
+    return fn
+
+
+def run(repeat: int, warmup: int) -> Dict[str, Any]:
+    from app import create_app   # 延後 import：--help 不需要資料庫設定
+
+    client = create_app().test_client()
+    report: Dict[str, Any] = {"repeat": repeat, "orjson": json_codec.orjson is not None, "modes": {}}
+    original = json_codec.GEOJSON_BUILD
+    s = SessionLocal()
+    try:
+        for mode in MODES:
+            json_codec.GEOJSON_BUILD = mode
+            report["modes"][mode] = {
+                "build": {
+                    "aeds": _measure(lambda: all_aeds_geojson_body(s), repeat, warmup),
+                    "sites_page": _measure(lambda: cooling_sites_page_body(s, limit=1000), repeat, warmup),
+                },
+                "request": {
+                    "aeds_cold": _measure(_get(client, "/aeds", True), repeat, warmup),
+                    "aeds_warm": _measure(_get(client, "/aeds", False), repeat, warmup),
+                    "sites_page_cold": _measure(_get(client, SITES_PAGE, True), repeat, warmup),
+                    "sites_page_warm": _measure(_get(client, SITES_PAGE, False), repeat, warmup),
+                    "sites_bbox_stream": _measure(_get(client, SITES_BBOX, False), repeat, warmup),
+                },
+            }
+            s.rollback()
+    finally:
+        json_codec.GEOJSON_BUILD = original
+        s.close()
+
+    # 兩種方式的內容必須相同（只比解析後的結構，空白與鍵的格式不同無所謂）
+    bodies = {}
+    for mode in MODES:
+        json_codec.GEOJSON_BUILD = mode
+        s = SessionLocal()
+        try:
+            bodies[mode] = (json.loads(all_aeds_geojson_body(s)), json.loads(cooling_sites_page_body(s, limit=1000)))
+        finally:
+            s.close()
+    json_codec.GEOJSON_BUILD = original
+    report["same_output"] = bodies["python"] == bodies["db"]
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=30)
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--out", help="輸出 JSON 檔（預設印到 stdout）")
+    args = ap.parse_args()
+
+    report = run(args.repeat, args.warmup)
+    body = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(body)
+    print(body)
+
+
+if __name__ == "__main__":
+    main()
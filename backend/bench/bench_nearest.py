@@ -0,0 +1,142 @@
+# backend/bench/bench_nearest.py
+"""
+比較「最近 AED / 納涼地點」新舊查詢的執行計畫與延遲。
+
+前置：資料庫已用 data/ 內的 CSV 匯入（make seed、scripts/import_aed.sh）。
+用法（在 web 容器內或 backend/ 目錄）：
+  python -m bench.bench_nearest --points 200 --limit 5 --out bench_nearest.json
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy import select, func, text
+from sqlalchemy.dialects import postgresql
+
+from bench.stats import pct
+from bench.workload import random_points
+from db import SessionLocal
+from models import AedSite, CoolingSite
+from services.nearest_query import nearest_query
+
+def legacy_aed_query(lat: float, lon: float, limit: int):
+    """舊版：ORDER BY ST_Distance(geography)（整表 cast + 排序）"""
+    pt = func.ST_SetSRID(func.ST_Point(lon, lat), 4326)
+    return (
+        select(
+            AedSite,
+            func.ST_AsGeoJSON(AedSite.geom).label("geom_json"),
+            func.ST_Distance(func.Geography(AedSite.geom), func.Geography(pt)).label("distance_m"),
+        )
+        .where(AedSite.geom.isnot(None))
+        .order_by(func.ST_Distance(func.Geography(AedSite.geom), func.Geography(pt)))
+        .limit(limit)
+    )
+
+
+def legacy_site_within_query(lat: float, lon: float, limit: int, radius_m: float = 1000.0):
+    """舊版納涼地點第一段：ST_DWithin(geography) + ORDER BY ST_Distance"""
+    pt = func.ST_SetSRID(func.ST_Point(lon, lat), 4326)
+    return (
+        select(
+            CoolingSite,
+            func.ST_AsGeoJSON(CoolingSite.geom).label("geom_json"),
+            func.ST_Distance(func.Geography(CoolingSite.geom), func.Geography(pt)).label("distance_m"),
+        )
+        .where(
+            CoolingSite.geom.isnot(None),
+            func.ST_DWithin(func.Geography(CoolingSite.geom), func.Geography(pt), radius_m),
+        )
+        .order_by(func.ST_Distance(func.Geography(CoolingSite.geom), func.Geography(pt)))
+        .limit(limit)
+    )
+
+
+CASES = {
+    "aed_legacy": lambda lat, lon, k: legacy_aed_query(lat, lon, k),
+    "aed_knn": lambda lat, lon, k: nearest_query(AedSite, lat, lon, k),
+    "site_legacy": lambda lat, lon, k: legacy_site_within_query(lat, lon, k),
+    "site_knn": lambda lat, lon, k: nearest_query(CoolingSite, lat, lon, k),
+}
+
+
+def _literal_sql(q) -> str:
+    return str(q.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def _plan_nodes(node: Dict[str, Any], out: List[str]) -> List[str]:
+    label = node.get("Node Type", "")
+    if node.get("Index Name"):
+        label += f" using {node['Index Name']}"
+    elif node.get("Relation Name"):
+        label += f" on {node['Relation Name']}"
+    out.append(label)
+    for child in node.get("Plans", []) or []:
+        _plan_nodes(child, out)
+    return out
+
+
+def explain(session, q) -> Dict[str, Any]:
+    plan = session.execute(text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + _literal_sql(q))).scalar()
+    root = plan[0]
+    return {
+        "nodes": _plan_nodes(root["Plan"], []),
+        "execution_ms": root.get("Execution Time"),
+        "shared_hit_blocks": root["Plan"].get("Shared Hit Blocks"),
+    }
+
+
+def run(points: int, limit: int, seed: int, warmup: int) -> Dict[str, Any]:
+    pts = random_points(points, seed)
+    s = SessionLocal()
+    try:
+        report: Dict[str, Any] = {"points": points, "limit": limit, "seed": seed, "cases": {}}
+        for name, build in CASES.items():
+            for lat, lon in pts[:warmup]:
+                s.execute(build(lat, lon, limit)).all()
+            lat0, lon0 = pts[0]
+            lat_ms = []
+            for lat, lon in pts:
+                t0 = time.perf_counter()
+                s.execute(build(lat, lon, limit)).all()
+                lat_ms.append((time.perf_counter() - t0) * 1000)
+            report["cases"][name] = {
+                "plan": explain(s, build(lat0, lon0, limit)),
+                "p50_ms": round(statistics.median(lat_ms), 3),
+                "p95_ms": round(pct(lat_ms, 95), 3),
+                "mean_ms": round(statistics.fmean(lat_ms), 3),
+            }
+
+        # 正確性：新舊結果的前 limit 名是否一致（僅 AED；納涼地點舊版有半徑限制）
+        mismatches = 0
+        for lat, lon in pts:
+            old = [r[0].id for r in s.execute(legacy_aed_query(lat, lon, limit)).all()]
+            new = [r[0].id for r in s.execute(nearest_query(AedSite, lat, lon, limit)).all()]
+            mismatches += old != new
+        report["aed_result_mismatches"] = mismatches
+        return report
+    finally:
+        s.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--points", type=int, default=200)
+    ap.add_argument("--limit", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--warmup", type=int, default=20)
+    ap.add_argument("--out", help="輸出 JSON 檔（預設印到 stdout）")
+    args = ap.parse_args()
+
+    report = run(args.points, args.limit, args.seed, args.warmup)
+    body = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(body)
+    print(body)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# backend/bench/compare.py
+"""
+比較兩份 bench.suite 結果，找出效能退步（只用標準函式庫，可在容器外跑）。
+
+退步條件（任一成立）：
+- p95 變慢超過 --threshold（比例）且至少 --min-ms 毫秒
+- 吞吐下降超過 --threshold
+- 每請求 SQL 數增加超過 0.5
+- 新版出現錯誤而舊版沒有
+
+用法：
+  python -m bench.compare old.json new.json [--threshold 0.2] [--min-ms 2]
+有退步時 exit code 為 1。
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+
+def _ratio(new: Optional[float], old: Optional[float]) -> Optional[float]:
+    if new is None or old in (None, 0):
+        return None
+    return new / old - 1
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], threshold: float, min_ms: float) -> List[Dict[str, Any]]:
+    rows = []
+    for key in sorted(set(old["results"]) | set(new["results"])):
+        o, n = old["results"].get(key), new["results"].get(key)
+        if o is None or n is None:
+            rows.append({"case": key, "status": "added" if o is None else "removed"})
+            continue
+        p95 = _ratio(n.get("p95_ms"), o.get("p95_ms"))
+        rps = _ratio(n.get("throughput_rps"), o.get("throughput_rps"))
+        dq = n.get("queries_per_request", 0) - o.get("queries_per_request", 0)
+        reasons = []
+        if p95 is not None and p95 > threshold and n["p95_ms"] - o["p95_ms"] >= min_ms:
+            reasons.append(f"p95 +{p95:.0%}")
+        if rps is not None and rps < -threshold:
+            reasons.append(f"throughput {rps:.0%}")
+        if dq > 0.5:
+            reasons.append(f"queries/req +{dq:.2f}")
+        if n.get("errors", 0) and not o.get("errors", 0):
+            reasons.append(f"errors {n['errors']}")
+        rows.append({
+            "case": key,
+            "status": "regression" if reasons else "ok",
+            "reasons": reasons,
+            "p95_ms": [o.get("p95_ms"), n.get("p95_ms")],
+            "throughput_rps": [o.get("throughput_rps"), n.get("throughput_rps")],
+            "queries_per_request": [o.get("queries_per_request"), n.get("queries_per_request")],
+        })
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("old")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=0.2)
+    ap.add_argument("--min-ms", type=float, default=2.0)
+    ap.add_argument("--json", action="store_true", help="輸出 JSON（預設為文字表格）")
+    args = ap.parse_args()
+
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    rows = compare(old, new, args.threshold, args.min_ms)
+
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    else:
+        print(f"{old['meta'].get('git_rev')} -> {new['meta'].get('git_rev')}")
+        print(f"{'case':<28}{'p95 ms (old→new)':>24}{'rps (old→new)':>22}{'q/req':>14}  status")
+        for r in rows:
+            if "p95_ms" not in r:
+                print(f"{r['case']:<28}{'':>60}  {r['status']}")
+                continue
+            p95 = "{}→{}".format(*r["p95_ms"])
+            rps = "{}→{}".format(*r["throughput_rps"])
+            q = "{}→{}".format(*r["queries_per_request"])
+            status = r["status"] + (f" ({', '.join(r['reasons'])})" if r["reasons"] else "")
+            print(f"{r['case']:<28}{p95:>24}{rps:>22}{q:>14}  {status}")
+    sys.exit(1 if any(r["status"] == "regression" for r in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# backend/bench/fakes.py
+"""
+離線壓測用的假上游（不連外網、結果可重現）。
+
+- CWA：GET /api/v1/rest/datastore/M-A0085-001（熱傷害）、F-A0085-005（溫差），臺北市 12 區；支援 TownName 過濾
+- FCM：POST /v1/projects/<id>/messages:send；token 以 "bad" 開頭回 404 UNREGISTERED
+- CAMS：write_canned_netcdf() 產生固定的 pm2p5 NetCDF，交給 prefetcher.load_file()
+- GET /__fake/stats 回傳各上游被呼叫的次數
+
+每個上游可設定固定延遲（秒），模擬慢的外部服務。
+通常由 bench.server 在同一程序內啟動；壓測要數 app 的 thread 時改成獨立程序：
+  python -m bench.fakes --port 5099 --cwa-latency 3 --fcm-latency 2
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+TW_TZ = timezone(timedelta(hours=8))
+
+TAIPEI_TOWNS = [
+    "中正區", "大同區", "中山區", "松山區", "大安區", "萬華區",
+    "信義區", "士林區", "北投區", "內湖區", "南港區", "文山區",
+]
+HEAT_DATASET = "M-A0085-001"
+TEMPDIFF_DATASET = "F-A0085-005"
+CANNED_REFERENCE_TIME = "2025-07-01 00:00 UTC"
+
+
+def _issue_base() -> datetime:
+    return datetime(2025, 7, 1, 8, 0, tzinfo=TW_TZ)
+
+
+def cwa_heat_payload(hours: int = 72, step: int = 3) -> Dict[str, Any]:
+    base = _issue_base()
+    towns = []
+    for k, town in enumerate(TAIPEI_TOWNS):
+        times = []
+        for h in range(0, hours, step):
+            idx = 28 + (k + h // step) % 8
+            times.append({
+                "IssueTime": (base + timedelta(hours=h)).strftime("%Y-%m-%d %H:%M:%S"),
+                "WeatherElements": {
+                    "HeatInjuryIndex": str(idx),
+                    "HeatInjuryWarning": "注意" if idx >= 32 else "",
+                },
+            })
+        towns.append({"TownName": town, "Time": times})
+    return {"success": "true", "records": {"Locations": [{"CountyName": "臺北市", "Location": towns}]}}
+
+
+def cwa_tempdiff_payload(hours: int = 72, step: int = 12) -> Dict[str, Any]:
+    base = _issue_base()
+    towns = []
+    for k, town in enumerate(TAIPEI_TOWNS):
+        times = []
+        for h in range(0, hours, step):
+            start = base + timedelta(hours=h)
+            idx = 6 + (k + h // step) % 5
+            times.append({
+                "IssueTime": start.isoformat(),
+                "StartTime": start.isoformat(),
+                "EndTime": (start + timedelta(hours=step)).isoformat(),
+                "WeatherElements": {
+                    "TemperatureDifferenceIndex": str(idx),
+                    "TemperatureDifferenceWarning": "注意" if idx >= 9 else "",
+                },
+            })
+        towns.append({"TownName": town, "Time": times})
+    return {"success": "true", "records": {"Locations": [{"CountyName": "臺北市", "Location": towns}]}}
+
+
+def write_canned_netcdf(path: str, seed: int = 0) -> str:
+    """CAMS 格式的 pm2p5（kg m-3），0.4° 外框 × 0.1° 格距 × 9 個 lead。"""
+    import xarray as xr
+
+    from services.cams_prefetch import LEAD_HOURS, TAIPEI_AREA
+
+    north, west, south, east = TAIPEI_AREA
+    lats = np.round(np.arange(north, south - 1e-9, -0.1), 4)
+    lons = np.round(np.arange(west, east + 1e-9, 0.1), 4)
+    rng = np.random.default_rng(seed)
+    ug = rng.uniform(5.0, 60.0, size=(len(LEAD_HOURS), len(lats), len(lons)))
+    da = xr.DataArray(
+        ug * 1e-9,
+        dims=("forecast_period", "latitude", "longitude"),
+        coords={
+            "forecast_period": np.array(LEAD_HOURS, dtype="timedelta64[h]"),
+            "latitude": lats,
+            "longitude": lons,
+        },
+        attrs={"units": "kg m**-3"},
+        name="pm2p5",
+    )
+    da.to_dataset().to_netcdf(path)
+    return path
+
+
+def _only_town(payload: Dict[str, Any], town: str) -> Dict[str, Any]:
+    county = payload["records"]["Locations"][0]
+    keep = [t for t in county["Location"] if t["TownName"] == town]
+    return {**payload, "records": {"Locations": [{**county, "Location": keep}]}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeUpstreams"
+
+    def log_message(self, *_args):
+        pass
+
+    def _send(self, code: int, body: Dict[str, Any]) -> None:
+        b = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(b)))
+        self.end_headers()
+        self.wfile.write(b)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path
+        if path == "/__fake/stats":
+            return self._send(200, self.server.stats())
+        for name, payload in self.server.cwa.items():
+            if path.endswith(f"/datastore/{name}"):
+                self.server.hit(f"cwa:{name}")
+                time.sleep(self.server.cwa_latency)
+                town = parse_qs(url.query).get("TownName")
+                return self._send(200, _only_town(payload, town[0]) if town else payload)
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(n) if n else b"{}"
+        if not self.path.endswith("/messages:send"):
+            return self._send(404, {"error": "not found"})
+        self.server.hit("fcm")
+        time.sleep(self.server.fcm_latency)
+        msg = (json.loads(raw or b"{}") or {}).get("message") or {}
+        target = msg.get("token") or msg.get("topic") or ""
+        if target.startswith("bad"):
+            return self._send(404, {"error": {"code": 404, "status": "NOT_FOUND",
+                                              "details": [{"errorCode": "UNREGISTERED"}]}})
+        self._send(200, {"name": f"projects/bench/messages/{target}"})
+
+
+class FakeUpstreams(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr: Tuple[str, int], cwa_latency: float = 0.0, fcm_latency: float = 0.0):
+        super().__init__(addr, _Handler)
+        self.cwa_latency = cwa_latency
+        self.fcm_latency = fcm_latency
+        self.cwa = {HEAT_DATASET: cwa_heat_payload(), TEMPDIFF_DATASET: cwa_tempdiff_payload()}
+        self._hits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str) -> None:
+        with self._lock:
+            self._hits[key] = self._hits.get(key, 0) + 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._hits)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeUpstreams":
+        threading.Thread(target=self.serve_forever, daemon=True, name="fake-upstreams").start()
+        return self
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=5099)
+    ap.add_argument("--cwa-latency", type=float, default=0.0)
+    ap.add_argument("--fcm-latency", type=float, default=0.0)
+    args = ap.parse_args()
+    FakeUpstreams(("127.0.0.1", args.port), cwa_latency=args.cwa_latency,
+                  fcm_latency=args.fcm_latency).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
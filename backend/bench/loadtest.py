@@ -0,0 +1,112 @@
+# backend/bench/loadtest.py
+"""
+HTTP 壓測：同一組請求分別打 Flask（app.run，port 5000）與 ASGI（uvicorn，port 8000），比較吞吐與延遲。
+
+固定數量的 client 同時送請求（closed loop），每個 client 收到回應才送下一個。
+上游變慢時（例如假 FCM 延遲 2 秒），Flask 的 worker thread 會被佔滿，ASGI 只多佔 coroutine。
+
+用法（在 backend/ 目錄）：
+  python -m bench.loadtest --target flask=http://localhost:5000 --target asgi=http://localhost:8000 \\
+      --path "/heat/forecast?lat=25.0330&lon=121.5654" --concurrency 200 --duration 30 --out loadtest.json
+  # POST（例如 /internal/notify 打假 FCM）
+  python -m bench.loadtest --target asgi=http://localhost:8000 --path /internal/notify \\
+      --method POST --body '{"token": "fake", "title": "t"}'
+
+慢上游 + 高併發（假上游獨立一個程序，app 程序的 thread 數才準）：
+  python -m bench.fakes --port 5099 --cwa-latency 3 --fcm-latency 2 &
+  python -m bench.server --port 5055 --upstream http://127.0.0.1:5099 [--asgi] [--cams-latency 15] &
+  python -m bench.loadtest --target x=http://127.0.0.1:5055 --path ... --concurrency 1000 --duration 30 --timeout 60
+"""
+import argparse
+import asyncio
+import json
+import ssl
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from bench.stats import latency_summary
+
+
+async def _worker(base_url: str, method: str, path: str, body: Optional[Dict[str, Any]], timeout: float,
+                  ssl_ctx: ssl.SSLContext, deadline: float, lat_ms: List[float], statuses: Counter) -> None:
+    # 每個 client 各自一條 keep-alive 連線（共用大連線池時，httpx 排程成本隨連線數平方成長，會拖慢壓測端）
+    limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits, verify=ssl_ctx) as client:
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(method, path, json=body)
+                statuses[r.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+                continue
+            lat_ms.append((time.perf_counter() - t0) * 1000)
+
+
+async def run_target(base_url: str, path: str, method: str, body: Optional[Dict[str, Any]],
+                     concurrency: int, duration: float, timeout: float) -> Dict[str, Any]:
+    lat_ms: List[float] = []
+    statuses: Counter = Counter()
+    ssl_ctx = ssl.create_default_context()  # 共用，避免每個 client 各載一次 CA
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(*(
+        _worker(base_url, method, path, body, timeout, ssl_ctx, deadline, lat_ms, statuses)
+        for _ in range(concurrency)
+    ))
+    elapsed = time.monotonic() - started
+
+    ok = sum(n for code, n in statuses.items() if isinstance(code, int) and code < 500)
+    total = sum(statuses.values())
+    report: Dict[str, Any] = {
+        "base_url": base_url,
+        "requests": total,
+        "ok": ok,
+        "error_rate": round(1 - ok / total, 4) if total else 0.0,    # 5xx + 連線錯誤 / 逾時
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        **latency_summary(lat_ms, elapsed),
+    }
+    return report
+
+
+def _parse_target(s: str) -> Tuple[str, str]:
+    name, sep, url = s.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError("target must be name=url")
+    return name, url.rstrip("/")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--target", type=_parse_target, action="append", required=True,
+                    help="name=base_url，可重複（依序各跑一次）")
+    ap.add_argument("--path", required=True)
+    ap.add_argument("--method", default="GET")
+    ap.add_argument("--body", help="POST 的 JSON body")
+    ap.add_argument("--concurrency", type=int, default=100)
+    ap.add_argument("--duration", type=float, default=20.0, help="每個 target 的秒數")
+    ap.add_argument("--timeout", type=float, default=30.0, help="單一請求逾時（秒）")
+    ap.add_argument("--out", help="輸出 JSON 檔（預設印到 stdout）")
+    args = ap.parse_args()
+
+    body = json.loads(args.body) if args.body else None
+    report: Dict[str, Any] = {
+        "path": args.path, "method": args.method,
+        "concurrency": args.concurrency, "duration_sec": args.duration, "targets": {},
+    }
+    for name, url in args.target:
+        report["targets"][name] = asyncio.run(run_target(
+            url, args.path, args.method.upper(), body, args.concurrency, args.duration, args.timeout))
+
+    out = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out)
+    print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# backend/bench/server.py
+"""
+壓測用的伺服器程序：假上游 + 正式的 app，對外只差環境變數。
+
+- 啟動 bench.fakes 的假 CWA / FCM，環境變數指過去（CWA_BASE_URL、FCM_BASE_URL…）；
+  --upstream 改用另外跑的 python -m bench.fakes（app 程序的 thread 數才不含假上游的）
+- CAMS 不下載，直接載入固定的 NetCDF（CAMS_PREFETCH=0）；--cams-latency 秒後才載入，模擬剛啟動、
+  預抓還沒回來的那段時間（期間 /aqi/pm25 走 aqi_grid_cache）
+- 額外掛 GET /__bench/stats：累計 SQL 次數與假上游呼叫次數（壓測端用前後差值算每請求查詢數）
+- 預設與 app.run 相同（werkzeug threaded）；--asgi 改用 uvicorn asgi:app
+
+通常由 bench.suite 啟動，不需手動執行：
+  python -m bench.server --port 5055 [--asgi] [--cwa-latency 0.2] [--fcm-latency 0.05] [--cams-latency 30]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5055)
+    ap.add_argument("--asgi", action="store_true", help="以 uvicorn 跑 asgi:app")
+    ap.add_argument("--cwa-latency", type=float, default=0.0)
+    ap.add_argument("--fcm-latency", type=float, default=0.0)
+    ap.add_argument("--cams-latency", type=float, default=0.0, help="CAMS 格點延遲幾秒才載入")
+    ap.add_argument("--upstream", help="外部假上游的 base URL（此時忽略 --cwa/--fcm-latency）")
+    args = ap.parse_args()
+
+    from bench.fakes import CANNED_REFERENCE_TIME, FakeUpstreams, write_canned_netcdf
+
+    if args.upstream:
+        import requests
+
+        upstream_url = args.upstream.rstrip("/")
+
+        def upstream_stats():
+            return requests.get(f"{upstream_url}/__fake/stats", timeout=5).json()
+    else:
+        fakes = FakeUpstreams(("127.0.0.1", 0), cwa_latency=args.cwa_latency,
+                              fcm_latency=args.fcm_latency).start()
+        upstream_url, upstream_stats = fakes.base_url, fakes.stats
+    # 必須在 import app / services 之前設好（模組層級常數）
+    os.environ.update({
+        "CWA_BASE_URL": upstream_url,
+        "CWA_API_KEY": "bench",
+        "FCM_BASE_URL": upstream_url,
+        "FCM_PROJECT_ID": "bench",
+        "FCM_ACCESS_TOKEN": "bench",
+        "CAMS_PREFETCH": "0",
+        "INTERNAL_API_KEY": "",
+    })
+
+    from flask import jsonify
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    from app import create_app
+    from services.cams_prefetch import prefetcher
+
+    nc_path = write_canned_netcdf(os.path.join(tempfile.mkdtemp(prefix="bench-cams-"), "cams.nc"))
+    if args.cams_latency > 0:
+        threading.Timer(args.cams_latency, prefetcher.load_file, (nc_path, CANNED_REFERENCE_TIME)).start()
+    else:
+        prefetcher.load_file(nc_path, CANNED_REFERENCE_TIME)
+
+    queries = {"n": 0}
+    lock = threading.Lock()
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _count(*_a, **_kw):
+        with lock:
+            queries["n"] += 1
+
+    def install(app):
+        @app.get("/__bench/stats")
+        def bench_stats():
+            return jsonify(queries=queries["n"], upstream=upstream_stats())
+        return app
+
+    if args.asgi:
+        import uvicorn
+        from asgi import create_asgi_app
+
+        uvicorn.run(create_asgi_app(install(create_app())), host=args.host, port=args.port, log_level="warning")
+    else:
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)  # 不逐筆印 access log
+        install(create_app()).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+# backend/bench/stats.py
+import statistics
+from typing import Any, Dict, List
+
+
+def pct(values: List[float], p: float) -> float:
+    """最近秩百分位數（values 不需先排序）"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def latency_summary(lat_ms: List[float], elapsed_sec: float) -> Dict[str, Any]:
+    """吞吐（成功回應數 / 秒）與 p50/p95/p99/mean/max（毫秒）"""
+    out: Dict[str, Any] = {
+        "elapsed_sec": round(elapsed_sec, 2),
+        "throughput_rps": round(len(lat_ms) / elapsed_sec, 1) if elapsed_sec else 0.0,
+    }
+    if lat_ms:
+        out.update(
+            p50_ms=round(statistics.median(lat_ms), 2),
+            p95_ms=round(pct(lat_ms, 95), 2),
+            p99_ms=round(pct(lat_ms, 99), 2),
+            mean_ms=round(statistics.fmean(lat_ms), 2),
+            max_ms=round(max(lat_ms), 2),
+        )
+    return out
@@ -0,0 +1,269 @@
+# backend/bench/suite.py
+"""
+離線效能測試：每個 blueprint 一組案例，輸出可在版本間 diff 的 JSON。
+
+前置：PostGIS 已匯入 data/ 的 SHP 與 CSV（make bench 會先跑 seed + import-aed）。
+流程：
+  1. 以 bench.server 啟動 app（假 CWA / FCM、固定的 CAMS NetCDF，不連外網）
+  2. 在 taipei_districts 內以固定 seed 撒點，產生每個案例的請求
+  3. 各案例依序以 N 個 client 同時送（closed loop），先暖身再量測
+  4. 每個案例回報 p50/p95/p99、吞吐、每請求 SQL 數與上游呼叫數
+
+用法（在 backend/ 目錄或 web 容器內）：
+  python -m bench.suite --requests 300 --concurrency 1,32 --out bench.json
+  python -m bench.suite --cases heat_forecast,context --asgi --cwa-latency 0.3
+  python -m bench.compare old.json new.json     # 比較兩份結果
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import ssl
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import text
+
+from bench.stats import latency_summary
+from bench.workload import Point, taipei_points
+from db import SessionLocal
+
+# (method, path, json body)
+Spec = Tuple[str, str, Optional[Dict[str, Any]]]
+
+BENCH_TOKEN_PREFIX = "bench-"
+BATCH_POINTS = 100
+REGISTER_BATCH = 500
+
+
+def _q(lat: float, lon: float) -> str:
+    return f"lat={lat}&lon={lon}"
+
+
+def _bbox(lat: float, lon: float, d: float = 0.01) -> str:
+    return f"{lon - d:.6f},{lat - d:.6f},{lon + d:.6f},{lat + d:.6f}"
+
+
+# 案例名稱 → (第 i 個請求, 座標, 全部座標) -> Spec
+CASES: Dict[str, Callable[[int, Point, List[Point]], Spec]] = {
+    "health": lambda i, p, pts: ("GET", "/health", None),
+    "which_district": lambda i, p, pts: ("GET", f"/which-district?{_q(*p)}", None),
+    "sites_page": lambda i, p, pts: ("GET", "/sites?limit=100", None),
+    "sites_bbox": lambda i, p, pts: ("GET", f"/sites?limit=200&bbox={_bbox(*p)}", None),
+    "sites_nearest": lambda i, p, pts: ("GET", f"/sites/nearest?{_q(*p)}&limit=3", None),
+    "aeds": lambda i, p, pts: ("GET", "/aeds", None),
+    "aeds_nearest": lambda i, p, pts: ("GET", f"/aeds/nearest?{_q(*p)}&limit=3", None),
+    "heat_forecast": lambda i, p, pts: ("GET", f"/heat/forecast?{_q(*p)}", None),
+    "tempdiff_forecast": lambda i, p, pts: ("GET", f"/tempdiff/forecast?{_q(*p)}", None),
+    "aqi_pm25": lambda i, p, pts: ("GET", f"/aqi/pm25?{_q(*p)}", None),
+    "aqi_grid": lambda i, p, pts: ("GET", "/aqi/grid?lead=0", None),
+    "devices_register": lambda i, p, pts: ("POST", "/devices/register", {
+        "fcm_token": f"{BENCH_TOKEN_PREFIX}{i}", "user_id": f"bench-user-{i % 100}", "platform": "android",
+    }),
+    "devices_register_batch": lambda i, p, pts: ("POST", "/devices/register:batch", {
+        "devices": [{"fcm_token": f"{BENCH_TOKEN_PREFIX}b{i}-{j}", "user_id": f"bench-user-{j % 100}",
+                     "platform": "ios"} for j in range(REGISTER_BATCH)],
+    }),
+    "notify_multicast": lambda i, p, pts: ("POST", "/internal/notify", {
+        "tokens": [f"{BENCH_TOKEN_PREFIX}{i}-{j}" for j in range(10)], "title": "bench", "body": "bench",
+    }),
+    "batch_spatial": lambda i, p, pts: ("POST", "/batch/spatial", {
+        "points": [list(pts[(i * BATCH_POINTS + j) % len(pts)]) for j in range(BATCH_POINTS)],
+        "ops": {"district": True, "aed": {"k": 1}, "cooling": {"k": 1, "r": 1000}},
+    }),
+    "context": lambda i, p, pts: ("GET", f"/context?{_q(*p)}", None),
+}
+
+
+async def _worker(base_url: str, specs: List[Spec], cursor: List[int], timeout: float, ssl_ctx: ssl.SSLContext,
+                  lat_ms: List[float], statuses: Counter) -> None:
+    # 每個 worker 一條 keep-alive 連線，模擬獨立的使用者
+    limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits, verify=ssl_ctx) as client:
+        while cursor[0] < len(specs):
+            method, path, body = specs[cursor[0]]
+            cursor[0] += 1
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(method, path, json=body)
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+                continue
+            statuses[r.status_code] += 1
+            if r.status_code < 500:
+                lat_ms.append((time.perf_counter() - t0) * 1000)
+
+
+async def _drive(base_url: str, specs: List[Spec], concurrency: int, timeout: float) -> Dict[str, Any]:
+    lat_ms: List[float] = []
+    statuses: Counter = Counter()
+    cursor = [0]
+    ssl_ctx = ssl.create_default_context()
+    started = time.monotonic()
+    await asyncio.gather(*(
+        _worker(base_url, specs, cursor, timeout, ssl_ctx, lat_ms, statuses)
+        for _ in range(min(concurrency, len(specs)))
+    ))
+    elapsed = time.monotonic() - started
+    errors = sum(n for code, n in statuses.items() if not isinstance(code, int) or code >= 500)
+    return {
+        "requests": len(specs),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        **latency_summary(lat_ms, elapsed),
+    }
+
+
+def _server_stats(base_url: str) -> Dict[str, Any]:
+    return httpx.get(f"{base_url}/__bench/stats", timeout=10).json()
+
+
+def run_case(base_url: str, name: str, points: List[Point], n: int, warmup: int,
+             concurrency: int, timeout: float) -> Dict[str, Any]:
+    build = CASES[name]
+    specs = [build(i, points[i % len(points)], points) for i in range(warmup + n)]
+    if warmup:
+        asyncio.run(_drive(base_url, specs[:warmup], concurrency, timeout))
+    before = _server_stats(base_url)
+    result = asyncio.run(_drive(base_url, specs[warmup:], concurrency, timeout))
+    after = _server_stats(base_url)
+
+    # 計數包含背景 thread（例如 /context 的 fan-out），以整段的差值平均
+    result["queries_per_request"] = round((after["queries"] - before["queries"]) / n, 3)
+    upstream = {k: v - before["upstream"].get(k, 0) for k, v in after["upstream"].items()}
+    result["upstream_calls"] = {k: v for k, v in upstream.items() if v}
+    return result
+
+
+def _wait_ready(base_url: str, proc: subprocess.Popen, timeout: float = 90.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"bench server exited with {proc.returncode}")
+        try:
+            if httpx.get(f"{base_url}/__bench/stats", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("bench server did not become ready")
+
+
+def _git_rev() -> Optional[str]:
+    if os.getenv("BENCH_GIT_REV"):  # 容器內沒有 .git，由 make 傳入
+        return os.getenv("BENCH_GIT_REV")
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except Exception:
+        return None
+
+
+def _dataset_counts(session) -> Dict[str, Optional[int]]:
+    out: Dict[str, Optional[int]] = {}
+    for table in ("taipei_districts", "cooling_sites", "aed_sites", "device_tokens"):
+        try:
+            out[table] = session.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+        except Exception:
+            session.rollback()
+            out[table] = None
+    return out
+
+
+def _cleanup(session) -> None:
+    session.execute(text("DELETE FROM device_tokens WHERE fcm_token LIKE :p"), {"p": BENCH_TOKEN_PREFIX + "%"})
+    session.commit()
+
+
+def _log(msg: str) -> None:
+    print(msg, file=sys.stderr, flush=True)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--cases", default=",".join(CASES), help="逗號分隔；預設全部")
+    ap.add_argument("--requests", type=int, default=300, help="每個案例量測的請求數")
+    ap.add_argument("--warmup", type=int, default=20)
+    ap.add_argument("--concurrency", default="1,32", help="逗號分隔；每個值各跑一輪")
+    ap.add_argument("--points", type=int, default=2000, help="撒點數")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--port", type=int, default=5055)
+    ap.add_argument("--asgi", action="store_true", help="伺服器改用 uvicorn asgi:app")
+    ap.add_argument("--cwa-latency", type=float, default=0.0, help="假 CWA 的固定延遲（秒）")
+    ap.add_argument("--fcm-latency", type=float, default=0.02, help="假 FCM 的固定延遲（秒）")
+    ap.add_argument("--out", help="輸出 JSON 檔（預設印到 stdout）")
+    args = ap.parse_args()
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        ap.error(f"unknown cases: {', '.join(unknown)} (available: {', '.join(CASES)})")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    s = SessionLocal()
+    try:
+        points = taipei_points(s, args.points, args.seed)
+        dataset = _dataset_counts(s)
+    finally:
+        s.close()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    cmd = [sys.executable, "-m", "bench.server", "--port", str(args.port),
+           "--cwa-latency", str(args.cwa_latency), "--fcm-latency", str(args.fcm_latency)]
+    if args.asgi:
+        cmd.append("--asgi")
+    proc = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    report: Dict[str, Any] = {
+        "meta": {
+            "git_rev": _git_rev(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "server": "asgi" if args.asgi else "flask",
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "requests": args.requests, "warmup": args.warmup, "concurrency": levels,
+            "points": len(points), "seed": args.seed,
+            "cwa_latency_sec": args.cwa_latency, "fcm_latency_sec": args.fcm_latency,
+            "dataset": dataset,
+        },
+        "results": {},
+    }
+    try:
+        _wait_ready(base_url, proc)
+        for name in cases:
+            for c in levels:
+                key = f"{name}@{c}"
+                _log(f"==> {key}")
+                r = run_case(base_url, name, points, args.requests, args.warmup, c, args.timeout)
+                report["results"][key] = r
+                _log(f"    p50={r.get('p50_ms')}ms p95={r.get('p95_ms')}ms p99={r.get('p99_ms')}ms "
+                     f"rps={r['throughput_rps']} q/req={r['queries_per_request']} errors={r['errors']}")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        s = SessionLocal()
+        try:
+            _cleanup(s)
+        except Exception as e:
+            _log(f"cleanup failed: {e}")
+        finally:
+            s.close()
+
+    body = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(body)
+    print(body)
+
+
+if __name__ == "__main__":
+    main()
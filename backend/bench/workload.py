@@ -0,0 +1,45 @@
+# backend/bench/workload.py
+"""
+壓測用的座標產生器（固定 seed，結果可重現）。
+
+- taipei_points：在 taipei_districts 多邊形內均勻撒點（ST_GeneratePoints），分布與實際市區相同
+- random_points：台北外框內均勻撒點（沒有行政區資料時的後備，會有部分點落在市界外）
+"""
+import random
+from typing import List, Tuple
+
+from sqlalchemy import text
+
+# 台北市範圍（粗略外框）
+TAIPEI_BBOX = (121.457, 24.96, 121.666, 25.21)
+
+Point = Tuple[float, float]  # (lat, lon)
+
+_GENERATE_SQL = text("""
+SELECT ST_Y(p) AS lat, ST_X(p) AS lon
+FROM (
+  SELECT (ST_Dump(ST_GeneratePoints(ST_Union(geom), :n, :seed))).geom AS p
+  FROM taipei_districts
+  WHERE geom IS NOT NULL
+) s
+""")
+
+
+def random_points(n: int, seed: int) -> List[Point]:
+    rnd = random.Random(seed)
+    min_lon, min_lat, max_lon, max_lat = TAIPEI_BBOX
+    return [(rnd.uniform(min_lat, max_lat), rnd.uniform(min_lon, max_lon)) for _ in range(n)]
+
+
+def taipei_points(session, n: int, seed: int) -> List[Point]:
+    try:
+        rows = session.execute(_GENERATE_SQL, {"n": n, "seed": max(1, seed)}).all()
+    except Exception:
+        session.rollback()
+        rows = []
+    if len(rows) < n:
+        return random_points(n, seed)
+    pts = [(round(r.lat, 6), round(r.lon, 6)) for r in rows]
+    # ST_GeneratePoints 依多邊形順序輸出；打散避免連續請求都落在同一區
+    random.Random(seed).shuffle(pts)
+    return pts
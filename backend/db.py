@@ -3,6 +3,8 @@ import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
 
+from services.metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool, instrument_sqlalchemy, register_pool
+
 DB_USER = os.getenv("POSTGRES_USER", "postgres")
 DB_PWD  = os.getenv("POSTGRES_PASSWORD", "postgres")
 DB_HOST = os.getenv("DB_HOST", "db")
@@ -13,10 +15,45 @@ DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PWD}@{DB_HOST}:{DB_PORT}/{D
 
 engine = create_engine(
     DATABASE_URL,
+    poolclass=TimedQueuePool,
+    pool_logging_name="main",
     pool_pre_ping=True,
     pool_size=5,
     max_overflow=10,
 )
+instrument_sqlalchemy()
+register_pool(engine, "main")
 
 # 使用 scoped_session，讓每個請求各自獨立
 SessionLocal = scoped_session(sessionmaker(bind=engine, autoflush=False, autocommit=False))
+
+# ---- async（ASGI 模式用；asyncpg）----
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PWD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_sessionmaker():
+    """第一次呼叫時才建立 async engine（Flask 模式不需要 asyncpg）。"""
+    global _async_engine, _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            poolclass=TimedAsyncAdaptedQueuePool,
+            pool_logging_name="async",
+            pool_pre_ping=True,
+            pool_size=int(os.getenv("ASYNC_DB_POOL_SIZE", "10")),
+            max_overflow=int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "10")),
+        )
+        register_pool(_async_engine, "async")
+        _async_sessionmaker = async_sessionmaker(_async_engine, expire_on_commit=False)
+    return _async_sessionmaker
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_sessionmaker = None
@@ -0,0 +1,12 @@
+# backend/importer/__init__.py
+"""
+CSV 批次匯入（取代 scripts/import_aed.sh、import_cooling_sites.sh 的 TRUNCATE + INSERT）。
+
+用法見 importer/__main__.py；只需要能連到資料庫（DB_HOST 等環境變數，同 db.py），不需要 docker。
+"""
+from importer.csv_stream import CsvError, open_csv
+from importer.open_hours import parse_open_hours
+from importer.pipeline import ImportBusy, run_import
+from importer.sources import SOURCES, Source
+
+__all__ = ["CsvError", "ImportBusy", "SOURCES", "Source", "open_csv", "parse_open_hours", "run_import"]
@@ -0,0 +1,74 @@
+# backend/importer/__main__.py
+"""
+匯入 CSV 到 PostGIS，或重建行政區衍生表。
+
+  swap：寫進 staging 表、建好 geom / 索引 / ANALYZE 後一次換上（預設；匯入期間 API 照常讀舊表）
+  diff：只 INSERT / UPDATE / DELETE 有變動的列，沒變的列 id 不變
+
+用法（backend/ 目錄或 web 容器內；DB_HOST / POSTGRES_* 同 db.py）：
+  python -m importer aed ../data/aed/taipei.csv
+  python -m importer cooling_sites ../data/cooling_sites/taipei.csv --mode diff
+  python -m importer aed - --encoding big5 < aed.csv      # 從 stdin 讀
+  python -m importer districts                            # SHP 匯入後重建切塊 / 簡化邊界
+"""
+import argparse
+import json
+import logging
+import sys
+
+from importer.csv_stream import CsvError, open_csv
+from importer.districts import rebuild_district_derived
+from importer.pipeline import ImportBusy, run_import
+from importer.sources import SOURCES
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(prog="python -m importer", description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("source", choices=[*sorted(SOURCES), "districts"])
+    ap.add_argument("csv", nargs="?", help='CSV 路徑；"-" 為 stdin（districts 不需要）')
+    ap.add_argument("--mode", choices=("swap", "diff"), default="swap")
+    ap.add_argument("--encoding", default="auto", help="auto（BOM / UTF-8 / Big5 自動判斷）或 Python 編碼名稱")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    from db import engine   # 延後 import：--help 不需要資料庫設定
+
+    if args.source == "districts":
+        conn = engine.raw_connection()
+        try:
+            stats = rebuild_district_derived(conn)
+        except ImportBusy as e:
+            print(f"重建失敗：{e}", file=sys.stderr)
+            return 1
+        finally:
+            conn.close()
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+        return 0
+
+    if not args.csv:
+        ap.error("csv is required")
+    src = SOURCES[args.source]
+    try:
+        f, encoding = open_csv(args.csv, args.encoding)
+    except (OSError, CsvError) as e:
+        print(f"無法開啟 CSV：{e}", file=sys.stderr)
+        return 1
+    logging.info("匯入 %s → %s（mode=%s, encoding=%s）", args.csv, src.table, args.mode, encoding)
+
+    conn = engine.raw_connection()
+    try:
+        with f:
+            stats = run_import(conn, src, f, mode=args.mode, name=args.csv)
+    except (CsvError, ImportBusy) as e:
+        print(f"匯入失敗：{e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    stats["encoding"] = encoding
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# backend/importer/csv_stream.py
+"""
+CSV 串流：偵測編碼 → 逐列轉型 → 包成給 COPY FROM STDIN 讀的檔案物件。
+
+整個檔案不會讀進記憶體；stdin（"-"）也能偵測編碼（先讀一段樣本再接回去）。
+"""
+import codecs
+import csv
+import io
+import sys
+from typing import BinaryIO, Iterator, List, Optional, Sequence, Tuple
+
+from importer.sources import Source
+
+SAMPLE_BYTES = 1 << 20
+# 政府開放資料常見：UTF-8（含/不含 BOM），舊檔為 Big5（cp950 為其超集）
+FALLBACK_ENCODINGS = ("utf-8", "cp950")
+
+
+class CsvError(ValueError):
+    pass
+
+
+def detect_encoding(head: bytes, complete: bool) -> str:
+    """依 BOM 或試解碼判斷編碼；complete=False 表示 head 只是檔頭樣本（結尾可能切在多位元組字中間）。"""
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    for enc in FALLBACK_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(enc)().decode(head, final=complete)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    raise CsvError(f"無法判斷 CSV 編碼（試過 {', '.join(FALLBACK_ENCODINGS)}），請以 --encoding 指定")
+
+
+class _Rewound(io.RawIOBase):
+    """先吐出已讀的樣本，再接著讀原本的串流。"""
+
+    def __init__(self, head: bytes, rest: BinaryIO):
+        self._head = memoryview(head)
+        self._rest = rest
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self._head:
+            n = min(len(b), len(self._head))
+            b[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        data = self._rest.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def open_csv(path: str, encoding: str = "auto") -> Tuple[io.TextIOWrapper, str]:
+    """回傳 (文字串流, 實際編碼)；path 為 "-" 時讀 stdin。"""
+    raw = sys.stdin.buffer if path == "-" else open(path, "rb")
+    if encoding.lower() == "auto":
+        head = raw.read(SAMPLE_BYTES)
+        encoding = detect_encoding(head, complete=len(head) < SAMPLE_BYTES)
+        raw = io.BufferedReader(_Rewound(head, raw))
+    elif encoding.lower().replace("-", "").replace("_", "") == "utf8":
+        encoding = "utf-8-sig"   # 指定 UTF-8 時一樣吃掉 BOM
+    return io.TextIOWrapper(raw, encoding=encoding, newline=""), encoding
+
+
+def iter_rows(src: Source, f: io.TextIOWrapper, name: str = "<csv>") -> Iterator[Tuple[int, List[object]]]:
+    """逐列回傳 (檔案中的資料列序號, 轉型後的欄位值)；欄位順序同 src.columns。"""
+    reader = csv.reader(f)
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise CsvError(f"{name}: 空檔案")
+    # 去掉殘留的 BOM（例如檔案被串接過）與標題前後空白
+    header = [h.lstrip("\ufeff").strip() for h in header]
+    try:
+        pos = [header.index(c.header) for c in src.columns]
+    except ValueError:
+        missing = [c.header for c in src.columns if c.header not in header]
+        raise CsvError(f"{name}: 缺少欄位 {', '.join(missing)}")
+
+    n = 0
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue   # 空白列（檔尾常見）
+        n += 1
+        try:
+            yield n, [c.convert(row[i] if i < len(row) else "") for c, i in zip(src.columns, pos)]
+        except ValueError as e:
+            raise CsvError(f"{name}: 第 {reader.line_num} 行格式錯誤：{e}")
+
+
+def _ewkt_point(lon: Optional[float], lat: Optional[float]) -> Optional[str]:
+    if lon is None or lat is None:
+        return None
+    return f"SRID=4326;POINT({lon!r} {lat!r})"
+
+
+def _copy_value(v: object) -> object:
+    if isinstance(v, bool):
+        return "t" if v else "f"
+    if isinstance(v, float):
+        return repr(v)
+    return v
+
+
+class CopyStream(io.TextIOBase):
+    """
+    把 iter_rows 的結果轉成 COPY ... (FORMAT csv) 的內容，給 cursor.copy_expert 以 read() 拉取。
+    每列為 (id, 各欄位..., 衍生欄位..., geom)：id 依檔案順序從 1 起算，geom 為 EWKT（PostGIS 直接解析）。
+    NULL 以空值表示（轉型時空字串已一律轉成 None，與舊腳本的 NULLIF(x, '') 相同）。
+    """
+
+    def __init__(self, src: Source, rows: Iterator[Tuple[int, List[object]]]):
+        names = [c.name for c in src.columns]
+        self._lon, self._lat = names.index("lon"), names.index("lat")
+        self._derived = [(names.index(d.source), d.convert) for d in src.derived]
+        self._rows = rows
+        self._buf = io.StringIO()
+        self._writer = csv.writer(self._buf, lineterminator="\n")
+        self._pending = ""
+        self.rows = 0
+        self.error: Optional[Exception] = None   # read() 裡的例外會被 psycopg2 包成 QueryCanceled，留著給呼叫端
+
+    @staticmethod
+    def columns(src: Source) -> Sequence[str]:
+        return ["id", *(c.name for c in src.columns), *(d.name for d in src.derived), "geom"]
+
+    def readable(self) -> bool:
+        return True
+
+    def _fill(self, size: int) -> None:
+        for n, values in self._rows:
+            geom = _ewkt_point(values[self._lon], values[self._lat])
+            derived = [convert(values[i]) for i, convert in self._derived]
+            self._writer.writerow([n, *(_copy_value(v) for v in values), *(_copy_value(v) for v in derived), geom])
+            self.rows = n
+            if self._buf.tell() >= size:
+                break
+        self._pending += self._buf.getvalue()
+        self._buf.seek(0)
+        self._buf.truncate()
+
+    def read(self, size: int = -1) -> str:
+        size = size if size and size > 0 else 1 << 16
+        if len(self._pending) < size:
+            try:
+                self._fill(size)
+            except Exception as e:
+                self.error = e
+                raise
+        out, self._pending = self._pending[:size], self._pending[size:]
+        return out
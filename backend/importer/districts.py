@@ -0,0 +1,85 @@
+# backend/importer/districts.py
+"""
+由 taipei_districts 重建衍生表（SHP 重新匯入後執行）：
+
+  taipei_district_parts       ST_Subdivide 小塊 + 預先轉好的 geography（行政區判斷用）
+  taipei_district_boundaries  每個 tier 的簡化邊界 GeoJSON（/districts/boundaries 用）
+
+兩張表都很小（幾百列），用 DELETE + INSERT 在同一交易內重建；讀取端在 commit 前都看得到舊資料。
+同一交易內把 taipei_districts 當下的指紋寫進 taipei_district_derived_source（db/13），
+district_service 以此判斷小塊表是否還對得上來源表。
+"""
+import os
+import time
+from typing import Any, Dict
+
+from importer.pipeline import lock_table
+from services.district_boundaries import TIERS
+from services.table_version import fingerprint_sql
+
+PART_MAX_VERTICES = int(os.getenv("DISTRICT_PART_MAX_VERTICES", "64"))
+
+_PARTS = """
+    INSERT INTO taipei_district_parts (district_id, city_name, district_name, geom, geog)
+    SELECT d.id, d.city_name, d.district_name, p.geom, p.geom::geography
+      FROM taipei_districts d
+     CROSS JOIN LATERAL ST_Subdivide(ST_MakeValid(d.geom), %(max_vertices)s) AS s(piece)
+     CROSS JOIN LATERAL ST_Dump(ST_CollectionExtract(s.piece, 3)) AS p
+     WHERE d.geom IS NOT NULL
+"""
+
+_BOUNDARIES = """
+    INSERT INTO taipei_district_boundaries
+           (tier, district_id, city_name, district_name, tolerance_deg, n_points, geojson)
+    SELECT %(tier)s, d.id, d.city_name, d.district_name, %(tol)s, ST_NPoints(g.geom),
+           ST_AsGeoJSON(g.geom, %(precision)s)
+      FROM taipei_districts d
+     CROSS JOIN LATERAL (SELECT ST_SimplifyPreserveTopology(d.geom, %(tol)s) AS geom) g
+     WHERE d.geom IS NOT NULL
+"""
+
+_SOURCE = """
+    INSERT INTO taipei_district_derived_source (id, source_oid, source_rows, source_xmin, built_at)
+    VALUES (true, %s, %s, %s, now())
+    ON CONFLICT (id) DO UPDATE SET source_oid = EXCLUDED.source_oid, source_rows = EXCLUDED.source_rows,
+                                   source_xmin = EXCLUDED.source_xmin, built_at = EXCLUDED.built_at
+"""
+
+
+def rebuild_district_derived(conn) -> Dict[str, Any]:
+    """conn 為 psycopg2 連線；成功 commit，失敗 rollback 後往外丟。"""
+    stats: Dict[str, Any] = {"table": "taipei_districts", "mode": "derive"}
+    started = time.perf_counter()
+    cur = conn.cursor()
+    try:
+        lock_table(cur, "taipei_districts")
+        cur.execute("SELECT count(*), coalesce(sum(ST_NPoints(geom)), 0) FROM taipei_districts")
+        stats["districts"], stats["source_points"] = cur.fetchone()
+
+        cur.execute("DELETE FROM taipei_district_parts")
+        cur.execute(_PARTS, {"max_vertices": PART_MAX_VERTICES})
+        stats["parts"] = cur.rowcount
+
+        cur.execute("DELETE FROM taipei_district_boundaries")
+        tiers = []
+        for t in TIERS:
+            cur.execute(_BOUNDARIES, {"tier": t.tier, "tol": t.tolerance_deg, "precision": t.precision})
+            cur.execute("SELECT coalesce(sum(n_points), 0), coalesce(sum(octet_length(geojson)), 0) "
+                        "FROM taipei_district_boundaries WHERE tier = %s", (t.tier,))
+            points, size = cur.fetchone()
+            tiers.append({"tier": t.tier, "points": points, "geojson_bytes": size})
+        stats["tiers"] = tiers
+
+        cur.execute(fingerprint_sql("taipei_districts"))
+        cur.execute(_SOURCE, cur.fetchone())
+
+        cur.execute("ANALYZE taipei_district_parts")
+        cur.execute("ANALYZE taipei_district_boundaries")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    stats["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return stats
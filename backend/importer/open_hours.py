@@ -0,0 +1,198 @@
+# backend/importer/open_hours.py
+"""
+把納涼地點的「開放時間」自由文字解析成一週內的分鐘區間。
+
+時間軸：週一 00:00 = 0，每天 1440 分，整週 WEEK_MINUTES；區間為 [start, end)。
+跨午夜（例如 6:00-1:00）拆成當天到 24:00 加隔天 0:00-1:00，週日跨到週一則繞回週首。
+
+看得懂的寫法（資料中常見）：
+  24小時 / 全天
+  8:30-17:30、6:00至22:00、09:30–17:30（全形、~、～、至皆可）
+  週一至週五8:30-17:30、週日、週一:\\n9:00-17:00\\n週二~週六:\\n8:30-21:00、週六日（星期/周同義）
+  多段時間：9:00-12:00、14:00-17:00
+  公休（括號內或 ; 之後）：星期一休館、每周三休園、假日不開放、例假日及國定假日除外 → 整天扣掉
+  （「假日」指週六日；「國定假日」無法表示，一律當一般日）
+看不懂就回傳 None（匯入時 open_hours_parsed = false，open_now 查詢不會選到），包括：
+  依月份不同（6月：…）、「延長 / 延至」、「晚上」等部分時段例外、時間格式錯誤，
+  以及先寫了不分星期的時段、後面又出現指定星期的時段（無法判斷是覆蓋還是追加），
+  和寫在時段後面、之後沒有緊接時段的星期（9:00-17:00 週一至週五：無從確定屬於哪一段）。
+  （週二至週五9:00-21:00、週六\n9:00-17:00 這種星期後緊接下一個時段的，照常配給下一段。）
+"""
+import re
+from typing import List, Optional, Sequence, Tuple
+
+DAY_MINUTES = 24 * 60
+WEEK_MINUTES = 7 * DAY_MINUTES
+ALL_DAYS = frozenset(range(7))
+WEEKEND = frozenset((5, 6))
+
+Interval = Tuple[int, int]
+
+_DAY = "一二三四五六日天"
+_DAY_INDEX = {c: i for i, c in enumerate("一二三四五六日")}
+_DAY_INDEX["天"] = 6
+
+_NORMALIZE = str.maketrans({
+    "–": "-", "—": "-", "－": "-", "~": "-", "～": "-", "〜": "-",
+    "：": ":", "（": "(", "）": ")", "﹙": "(", "﹚": ")", "，": ",", "；": ";",
+})
+
+_UNSUPPORTED = re.compile(r"\d+\s*月|延長|延至|晚上|上午|下午|夜間|\?")
+_CLOSED = re.compile(r"休館|休園|公休|休息|不開放|未開放|除外")
+
+_BARE_TIME = re.compile(r"\d{1,2}:\d{2}")
+_TOKEN = re.compile(
+    r"(?P<time>(?P<h1>\d{1,2}):(?P<m1>\d{2})\s*(?:-|至|到)\s*(?P<h2>\d{1,2}):(?P<m2>\d{2}))"
+    r"|(?P<always>24\s*(?:小時|hr|h)|全天)"
+    rf"|(?P<days>週(?P<first>[{_DAY}])(?:\s*(?:-|至|到)\s*週?(?P<last>[{_DAY}]))?"
+    rf"(?P<rest>(?:\s*[、,及和與]?\s*週?[{_DAY}](?![{_DAY}]))*))"
+    r"|(?P<holiday>(?<!國定)假日)",
+    re.I,
+)
+_LIST_DAY = re.compile(rf"[{_DAY}]")
+
+
+def _normalize(text: str) -> str:
+    text = text.translate(_NORMALIZE)
+    return re.sub(r"星期|禮拜|周", "週", text)
+
+
+def _day_set(m: "re.Match") -> frozenset:
+    first, last, rest = m.group("first"), m.group("last"), m.group("rest") or ""
+    a = _DAY_INDEX[first]
+    if last:
+        b = _DAY_INDEX[last]
+        days = {(a + i) % 7 for i in range(((b - a) % 7) + 1)}   # 週日至週四 → 日、一…四
+    else:
+        days = {a}
+    days.update(_DAY_INDEX[c] for c in _LIST_DAY.findall(rest))
+    return frozenset(days)
+
+
+def _minutes(h: str, m: str) -> int:
+    h, m = int(h), int(m)
+    if h > 24 or m > 59 or (h == 24 and m):
+        raise ValueError(f"{h}:{m:02d}")
+    return h * 60 + m
+
+
+def _segments(text: str) -> List[str]:
+    """依換行與括號切段：括號內通常是公休或補充說明，要和前面的時段分開判斷。"""
+    return [s.strip() for s in re.split(r"[\n();]", text) if s.strip()]
+
+
+def merge(intervals: Sequence[Interval]) -> List[Interval]:
+    """排序並合併重疊 / 相接的區間。"""
+    out: List[Interval] = []
+    for s, e in sorted(intervals):
+        if out and s <= out[-1][1]:
+            out[-1] = (out[-1][0], max(out[-1][1], e))
+        else:
+            out.append((s, e))
+    return out
+
+
+def _week_intervals(days, start: int, end: int) -> List[Interval]:
+    if end <= start:
+        end += DAY_MINUTES      # 跨午夜；0:00 結束即到 24:00
+    out = []
+    for d in days:
+        s, e = d * DAY_MINUTES + start, d * DAY_MINUTES + end
+        if e > WEEK_MINUTES:
+            out += [(s, WEEK_MINUTES), (0, e - WEEK_MINUTES)]
+        else:
+            out.append((s, e))
+    return out
+
+
+def _subtract_days(intervals: List[Interval], days) -> List[Interval]:
+    out = intervals
+    for d in days:
+        lo, hi = d * DAY_MINUTES, (d + 1) * DAY_MINUTES
+        cut = []
+        for s, e in out:
+            if e <= lo or s >= hi:
+                cut.append((s, e))
+                continue
+            if s < lo:
+                cut.append((s, lo))
+            if e > hi:
+                cut.append((hi, e))
+        out = cut
+    return out
+
+
+def parse_open_hours(text: Optional[str]) -> Optional[List[Interval]]:
+    """回傳合併後的週區間；空白或看不懂回傳 None。"""
+    if not text or not text.strip():
+        return None
+    text = _normalize(text)
+    if _UNSUPPORTED.search(text):
+        return None
+
+    intervals: List[Interval] = []
+    closed = set()
+    days, pending = None, None      # days：目前時段套用的星期；pending：剛讀到、還沒配到時段的星期
+    trailing = False                # pending 是接在同段時段後面讀到的，下一個 token 必須是時段
+    used_all_days = False
+    n_times = 0
+    try:
+        for seg in _segments(text):
+            if _CLOSED.search(seg):
+                # 公休段：段內提到的星期（或假日）整天不開；沒提到星期的（如「中午休息」）忽略
+                for m in _TOKEN.finditer(seg):
+                    if m.group("time"):
+                        return None
+                    if m.group("days"):
+                        closed |= _day_set(m)
+                    elif m.group("holiday"):
+                        closed |= WEEKEND
+                continue
+            seg_has_time = False
+            for m in _TOKEN.finditer(seg):
+                if m.group("days"):
+                    if trailing:
+                        return None
+                    pending = (pending or frozenset()) | _day_set(m)
+                    trailing = seg_has_time
+                    continue
+                if m.group("holiday"):
+                    return None
+                if pending is not None:
+                    days, pending = pending, None
+                    if used_all_days:
+                        return None
+                elif days is None:
+                    used_all_days = True
+                trailing, seg_has_time = False, True
+                if m.group("always"):
+                    start, end = 0, DAY_MINUTES
+                else:
+                    n_times += 1
+                    start, end = _minutes(m.group("h1"), m.group("m1")), _minutes(m.group("h2"), m.group("m2"))
+                intervals += _week_intervals(days if days is not None else ALL_DAYS, start, end)
+    except ValueError:
+        return None
+    if pending is not None:
+        return None             # 最後的星期沒有配到時段
+
+    # 有落單的時間（例如 9:0017:00）代表格式有誤
+    if len(_BARE_TIME.findall(text)) != 2 * n_times:
+        return None
+    intervals = merge(_subtract_days(intervals, closed))
+    return intervals or None
+
+
+def to_multirange(intervals: Optional[Sequence[Interval]]) -> Optional[str]:
+    """PostgreSQL int4multirange 文字格式，例如 {[0,1440),[2880,4320)}。"""
+    if not intervals:
+        return None
+    return "{" + ",".join(f"[{s},{e})" for s, e in intervals) + "}"
+
+
+def open_week(text: Optional[str]) -> Optional[str]:
+    return to_multirange(parse_open_hours(text))
+
+
+def open_hours_parsed(text: Optional[str]) -> bool:
+    return parse_open_hours(text) is not None
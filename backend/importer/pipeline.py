@@ -0,0 +1,229 @@
+# backend/importer/pipeline.py
+"""
+匯入流程（皆在同一個交易內，失敗整批 rollback，正式表不受影響）：
+
+swap 模式（整表重灌）：
+  1. CREATE TABLE <表>_new (LIKE <表> ...)，不含索引
+  2. COPY FROM STDIN 串流寫入（id 依檔案順序、geom 以 EWKT 一併寫入，不再另跑 UPDATE）
+  3. 依正式表現有的索引 / 主鍵定義在 staging 上重建，ANALYZE
+  4. DROP 正式表 → RENAME staging，索引、約束、序列改回原名
+     只有這一步需要 ACCESS EXCLUSIVE，讀取端最多被擋住一瞬間，不會看到空表
+
+diff 模式（增量）：
+  COPY 到暫存表後，以自然鍵（Source.key，同鍵多筆依檔案順序配對）和正式表比對，
+  只 DELETE 消失的、UPDATE 內容有變的、INSERT 新增的列；沒變的列完全不動（id 不變）。
+
+同一張表同時只允許一個匯入（advisory lock）。
+"""
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Tuple
+
+from psycopg2 import errors as pg_errors
+
+from importer.csv_stream import CopyStream, iter_rows
+from importer.sources import Source
+
+log = logging.getLogger(__name__)
+
+SWAP_LOCK_TIMEOUT = os.getenv("IMPORT_LOCK_TIMEOUT", "5s")
+SWAP_RETRIES = int(os.getenv("IMPORT_SWAP_RETRIES", "5"))
+ADVISORY_LOCK_PREFIX = "import:"
+
+_INDEX_DEF = re.compile(r"^(CREATE (?:UNIQUE )?INDEX) (\S+) ON (?:ONLY )?(\S+) ")
+
+
+class ImportBusy(RuntimeError):
+    pass
+
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def lock_table(cur, table: str) -> None:
+    cur.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", (ADVISORY_LOCK_PREFIX + table,))
+    if not cur.fetchone()[0]:
+        raise ImportBusy(f"{table} 已有其他匯入在進行")
+
+
+def _copy(cur, src: Source, staging: str, f, name: str) -> int:
+    stream = CopyStream(src, iter_rows(src, f, name))
+    cols = ", ".join(_q(c) for c in CopyStream.columns(src))
+    try:
+        cur.copy_expert(f"COPY {staging} ({cols}) FROM STDIN WITH (FORMAT csv)", stream)
+    except pg_errors.QueryCanceled:
+        if stream.error is not None:
+            raise stream.error   # CSV 格式錯誤等，照原本的型別往外丟
+        raise
+    return stream.rows
+
+
+def _indexes(cur, table: str) -> List[Tuple[str, str]]:
+    """正式表上不屬於約束的索引 (名稱, 定義)。"""
+    cur.execute("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid)
+          FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+         WHERE i.indrelid = to_regclass(%s)
+           AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+         ORDER BY c.relname
+    """, (table,))
+    return cur.fetchall()
+
+
+def _constraints(cur, table: str) -> List[Tuple[str, str]]:
+    """主鍵 / unique / exclusion 約束 (名稱, 定義)；CHECK 已由 LIKE ... INCLUDING CONSTRAINTS 帶過去。"""
+    cur.execute("""
+        SELECT conname, pg_get_constraintdef(oid)
+          FROM pg_constraint
+         WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'x')
+         ORDER BY conname
+    """, (table,))
+    return cur.fetchall()
+
+
+def _tmp_name(name: str) -> str:
+    return (name[:59] + "_new") if len(name) > 59 else name + "_new"
+
+
+def _swap(cur, table: str, staging: str, indexes, constraints, seq) -> None:
+    cur.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+    if seq:
+        cur.execute(f"ALTER SEQUENCE {seq} OWNED BY NONE")   # 否則 DROP 正式表會連序列一起刪
+    cur.execute(f"DROP TABLE {_q(table)}")
+    cur.execute(f"ALTER TABLE {staging} RENAME TO {_q(table)}")
+    for name, _ in indexes:
+        cur.execute(f"ALTER INDEX {_q(_tmp_name(name))} RENAME TO {_q(name)}")
+    for name, _ in constraints:
+        cur.execute(f"ALTER TABLE {_q(table)} RENAME CONSTRAINT {_q(_tmp_name(name))} TO {_q(name)}")
+    if seq:
+        cur.execute(f"ALTER SEQUENCE {seq} OWNED BY {_q(table)}.id")
+        cur.execute(f"SELECT setval(%s, GREATEST(max(id), 1), max(id) IS NOT NULL) FROM {_q(table)}", (seq,))
+    cur.execute("SET LOCAL lock_timeout = DEFAULT")
+
+
+def _import_swap(cur, src: Source, f, name: str, stats: Dict[str, Any]) -> None:
+    table = src.table
+    staging = _q(_tmp_name(table))
+    indexes, constraints = _indexes(cur, table), _constraints(cur, table)
+    cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+    seq = cur.fetchone()[0]
+
+    t0 = time.perf_counter()
+    cur.execute(f"DROP TABLE IF EXISTS {staging}")
+    # 預設值沿用正式表的序列（nextval 綁的是序列 OID，換名後照常運作）
+    cur.execute(f"CREATE TABLE {staging} (LIKE {_q(table)} INCLUDING DEFAULTS INCLUDING GENERATED "
+                f"INCLUDING CONSTRAINTS INCLUDING STORAGE INCLUDING COMMENTS)")
+    stats["rows"] = _copy(cur, src, staging, f, name)
+    stats["copy_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    # 資料進去後才建索引：一次排序建完，比 COPY 時逐列維護快
+    t0 = time.perf_counter()
+    for cname, cdef in constraints:
+        cur.execute(f"ALTER TABLE {staging} ADD CONSTRAINT {_q(_tmp_name(cname))} {cdef}")
+    for iname, idef in indexes:
+        m = _INDEX_DEF.match(idef)
+        if not m:
+            raise RuntimeError(f"看不懂的索引定義：{idef}")
+        cur.execute(f"{m.group(1)} {_q(_tmp_name(iname))} ON {staging} " + idef[m.end():])
+    cur.execute(f"ANALYZE {staging}")
+    stats["index_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    t0 = time.perf_counter()
+    for attempt in range(1, SWAP_RETRIES + 1):
+        cur.execute("SAVEPOINT swap")
+        try:
+            _swap(cur, table, staging, indexes, constraints, seq)
+            break
+        except pg_errors.LockNotAvailable:
+            # 有長查詢佔著正式表：只退回 swap 這一步，staging 保留，稍後再試
+            cur.execute("ROLLBACK TO SAVEPOINT swap")
+            if attempt == SWAP_RETRIES:
+                raise
+            log.warning("%s 正在使用中，%d 秒後重試 swap（%d/%d）", table, attempt, attempt, SWAP_RETRIES)
+            time.sleep(attempt)
+    stats["swap_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    stats["indexes"] = [n for n, _ in constraints] + [n for n, _ in indexes]
+
+
+def _import_diff(cur, src: Source, f, name: str, stats: Dict[str, Any]) -> None:
+    table = _q(src.table)
+    data_cols = [c.name for c in src.columns] + [d.name for d in src.derived]
+    cols = data_cols + ["geom"]
+    key = ", ".join(_q(k) for k in src.key)
+
+    t0 = time.perf_counter()
+    cur.execute(f"CREATE TEMP TABLE _import_src (LIKE {table}) ON COMMIT DROP")
+    stats["rows"] = _copy(cur, src, "_import_src", f, name)
+    stats["copy_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    t0 = time.perf_counter()
+    # 每列的比對鍵：md5(自然鍵) + 同鍵中的序號（來源依檔案順序、正式表依 id）
+    keyed = (f"SELECT id, md5(ROW({key})::text) AS _k, "
+             f"row_number() OVER (PARTITION BY {key} ORDER BY id) AS _n FROM {{}}")
+    cur.execute("CREATE TEMP TABLE _import_src_k ON COMMIT DROP AS " + keyed.format("_import_src"))
+    cur.execute("CREATE TEMP TABLE _import_dst_k ON COMMIT DROP AS " + keyed.format(table))
+    cur.execute("ANALYZE _import_src_k; ANALYZE _import_dst_k")
+
+    cur.execute(f"""
+        DELETE FROM {table} t USING _import_dst_k d
+         WHERE t.id = d.id
+           AND NOT EXISTS (SELECT 1 FROM _import_src_k s WHERE s._k = d._k AND s._n = d._n)
+    """)
+    stats["deleted"] = cur.rowcount
+
+    # geom 由 lon/lat 推得，比對時不看它；衍生欄位要比（解析規則改了，重新匯入就會更新）
+    assign = ", ".join(f"{_q(c)} = s.{_q(c)}" for c in cols)
+    cur.execute(f"""
+        UPDATE {table} t SET {assign}
+          FROM _import_dst_k d
+          JOIN _import_src_k sk ON sk._k = d._k AND sk._n = d._n
+          JOIN _import_src s ON s.id = sk.id
+         WHERE t.id = d.id
+           AND ROW({", ".join("t." + _q(c) for c in data_cols)})
+               IS DISTINCT FROM ROW({", ".join("s." + _q(c) for c in data_cols)})
+    """)
+    stats["updated"] = cur.rowcount
+
+    col_list = ", ".join(_q(c) for c in cols)
+    cur.execute(f"""
+        INSERT INTO {table} ({col_list})
+        SELECT {", ".join("s." + _q(c) for c in cols)}
+          FROM _import_src s JOIN _import_src_k sk ON sk.id = s.id
+         WHERE NOT EXISTS (SELECT 1 FROM _import_dst_k d WHERE d._k = sk._k AND d._n = sk._n)
+         ORDER BY s.id
+    """)
+    stats["inserted"] = cur.rowcount
+    stats["unchanged"] = stats["rows"] - stats["updated"] - stats["inserted"]
+    stats["merge_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    if stats["deleted"] or stats["updated"] or stats["inserted"]:
+        cur.execute(f"ANALYZE {table}")
+
+
+def run_import(conn, src: Source, f, mode: str = "swap", name: str = "<csv>") -> Dict[str, Any]:
+    """
+    conn 為 psycopg2 連線（engine.raw_connection() 或 psycopg2.connect），f 為 open_csv 回傳的文字串流。
+    成功時 commit 並回傳統計；任何錯誤都 rollback 後往外丟。
+    """
+    if mode not in ("swap", "diff"):
+        raise ValueError(f"unknown mode: {mode}")
+    stats: Dict[str, Any] = {"table": src.table, "mode": mode, "source": name}
+    started = time.perf_counter()
+    cur = conn.cursor()
+    try:
+        lock_table(cur, src.table)
+        if mode == "swap":
+            _import_swap(cur, src, f, name, stats)
+        else:
+            _import_diff(cur, src, f, name, stats)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    stats["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return stats
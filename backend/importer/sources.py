@@ -0,0 +1,96 @@
+# backend/importer/sources.py
+"""
+可匯入的資料來源：CSV 中文標題 → 資料表欄位與型別轉換。
+
+轉換規則沿用 scripts/import_*.sh：
+  - 空字串 → NULL
+  - 經緯度轉 double；geom 由 (lon, lat) 建立（任一缺值則為 NULL）
+  - 納涼點的設施欄位：'Y'（不分大小寫）為 true，其餘為 false
+  - 納涼點的開放時間另解析成 open_week / open_hours_parsed（見 importer/open_hours.py）
+"""
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from importer.open_hours import open_hours_parsed, open_week
+
+
+def text_or_none(v: str) -> Optional[str]:
+    return v if v != "" else None
+
+
+def float_or_none(v: str) -> Optional[float]:
+    return float(v) if v.strip() != "" else None
+
+
+def yes_flag(v: str) -> bool:
+    return v.strip().upper() == "Y"
+
+
+class Column(NamedTuple):
+    name: str                       # 資料表欄位
+    header: str                     # CSV 標題
+    convert: Callable[[str], object]
+
+
+class Derived(NamedTuple):
+    name: str                       # 資料表欄位
+    source: str                     # 由哪個 Column（轉型後的值）推得
+    convert: Callable[[object], object]
+
+
+class Source(NamedTuple):
+    table: str
+    default_csv: str                # 相對於 repo 根目錄
+    columns: Tuple[Column, ...]
+    key: Tuple[str, ...]            # diff 模式比對列用的自然鍵（同鍵多筆時再依檔案順序配對）
+    derived: Tuple[Derived, ...] = ()
+
+
+AED = Source(
+    table="aed_sites",
+    default_csv="data/aed/taipei.csv",
+    columns=(
+        Column("name", "場所名稱", text_or_none),
+        Column("address", "場所地址", text_or_none),
+        Column("area_code", "區域代碼", text_or_none),
+        Column("lat", "緯度", float_or_none),
+        Column("lon", "經度", float_or_none),
+        Column("category", "場所分類", text_or_none),
+        Column("type", "場所類型", text_or_none),
+        Column("place", "AED放置地點", text_or_none),
+        Column("description", "AED地點描述", text_or_none),
+    ),
+    key=("name", "address", "place"),
+)
+
+COOLING_SITES = Source(
+    table="cooling_sites",
+    default_csv="data/cooling_sites/taipei.csv",
+    columns=(
+        Column("location_type", "設施地點（戶外或室內）", text_or_none),
+        Column("name", "名稱", text_or_none),
+        Column("district_name", "行政區", text_or_none),
+        Column("address", "地址", text_or_none),
+        Column("lon", "經度", float_or_none),
+        Column("lat", "緯度", float_or_none),
+        Column("phone", "市話", text_or_none),
+        Column("ext", "分機", text_or_none),
+        Column("mobile", "手機", text_or_none),
+        Column("other_contact", "其他聯絡方式", text_or_none),
+        Column("open_hours", "開放時間", text_or_none),
+        Column("fan", "電風扇", yes_flag),
+        Column("ac", "冷氣", yes_flag),
+        Column("toilet", "廁所", yes_flag),
+        Column("seating", "座位", yes_flag),
+        Column("drinking", "飲水設施（例如：飲水機；直飲台；奉茶點等）", yes_flag),
+        Column("accessible_seat", "無障礙座位", yes_flag),
+        Column("features", "其他特色及亮點", text_or_none),
+        Column("notes", "備註", text_or_none),
+    ),
+    key=("name", "address"),
+    derived=(
+        Derived("open_week", "open_hours", open_week),
+        Derived("open_hours_parsed", "open_hours", open_hours_parsed),
+    ),
+)
+
+SOURCES = {"aed": AED, "cooling_sites": COOLING_SITES}
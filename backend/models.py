@@ -4,9 +4,10 @@ from typing import Any, Optional
 from datetime import datetime
 
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import Integer, Text, Float, DateTime, Double,Numeric
+from sqlalchemy import Integer, SmallInteger, Text, Float, REAL, DateTime, Double, FetchedValue
 from sqlalchemy.sql import func
-from geoalchemy2 import Geometry
+from sqlalchemy.dialects.postgresql import INT4MULTIRANGE
+from geoalchemy2 import Geography, Geometry
 
 class Base(DeclarativeBase):
     pass
@@ -18,6 +19,28 @@ class TaipeiDistrict(Base):
     district_name: Mapped[str] = mapped_column(Text, nullable=False)
     geom: Mapped[str] = mapped_column(Geometry(geometry_type="MULTIPOLYGON", srid=4326))
 
+class TaipeiDistrictPart(Base):
+    """ST_Subdivide 後的行政區小塊（見 db/09_district_derived.sql）"""
+    __tablename__ = "taipei_district_parts"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    district_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    city_name: Mapped[Optional[str]] = mapped_column(Text)
+    district_name: Mapped[str] = mapped_column(Text, nullable=False)
+    geom: Mapped[Any] = mapped_column(Geometry(geometry_type="POLYGON", srid=4326), nullable=False)
+    geog: Mapped[Any] = mapped_column(Geography(geometry_type="POLYGON", srid=4326), nullable=False)
+
+class TaipeiDistrictBoundary(Base):
+    """地圖用簡化邊界（每個 tier 一份）"""
+    __tablename__ = "taipei_district_boundaries"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    tier: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    district_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    city_name: Mapped[Optional[str]] = mapped_column(Text)
+    district_name: Mapped[str] = mapped_column(Text, nullable=False)
+    tolerance_deg: Mapped[float] = mapped_column(Double, nullable=False)
+    n_points: Mapped[int] = mapped_column(Integer, nullable=False)
+    geojson: Mapped[str] = mapped_column(Text, nullable=False)
+
 class CoolingSite(Base):
     __tablename__ = "cooling_sites"
 
@@ -42,6 +65,10 @@ class CoolingSite(Base):
     features: Mapped[str] = mapped_column(Text)                      # 其他特色及亮點
     notes: Mapped[str] = mapped_column(Text)                         # 備註
     geom: Mapped[str] = mapped_column(Geometry(geometry_type="POINT", srid=4326))  # 由 lon/lat 建
+    amenities: Mapped[int] = mapped_column(SmallInteger, FetchedValue())  # 設施位元遮罩（generated，見 db/10）
+    # 開放時間的週分鐘區間（見 db/11）；只在 SQL 條件中使用，deferred 避免一般查詢載入
+    open_week: Mapped[Optional[Any]] = mapped_column(INT4MULTIRANGE, deferred=True)
+    open_hours_parsed: Mapped[bool] = mapped_column()                # open_hours 是否解析成功
 
 class DeviceToken(Base):
     __tablename__ = "device_tokens"
@@ -50,6 +77,8 @@ class DeviceToken(Base):
     user_id: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     platform: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     fcm_token: Mapped[str] = mapped_column(Text, unique=True, nullable=False)
+    last_district: Mapped[Optional[str]] = mapped_column(Text, nullable=True)          # 最近一次回報位置的行政區
+    district_updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
@@ -74,17 +103,53 @@ class AedSite(Base):
     geom: Mapped[Optional[Any]] = mapped_column(Geometry(geometry_type="POINT", srid=4326))
 
 
-class AqiCache(Base):
-    __tablename__ = "aqi_cache"
+class AqiGridCell(Base):
+    """CAMS 格點快取（依 run_time 分區，見 db/06_create_aqi_cache.sql）"""
+    __tablename__ = "aqi_grid_cache"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    slot_ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
-    lat: Mapped[float] = mapped_column(Float, nullable=False)
-    lon: Mapped[float] = mapped_column(Float, nullable=False)
-    lat_bucket: Mapped[float] = mapped_column(Numeric(10, 3), nullable=False)
-    lon_bucket: Mapped[float] = mapped_column(Numeric(10, 3), nullable=False)
-    grid_lat: Mapped[float | None] = mapped_column(Float)
-    grid_lon: Mapped[float | None] = mapped_column(Float)
-    pm25_ugm3: Mapped[float] = mapped_column(Float, nullable=False)
-    cams_reference_time: Mapped[str | None] = mapped_column(Text)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    run_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    lead_hour: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    cell_i: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    cell_j: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    grid_lat: Mapped[float] = mapped_column(Float, nullable=False)
+    grid_lon: Mapped[float] = mapped_column(Float, nullable=False)
+    pm25_ugm3: Mapped[float] = mapped_column(REAL, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+
+class HeatForecast(Base):
+    """CWA 熱傷害指數（M-A0085-001），見 db/07_create_cwa_forecasts.sql"""
+    __tablename__ = "heat_forecasts"
+
+    district: Mapped[str] = mapped_column(Text, primary_key=True)
+    issue_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    heat_injury_index: Mapped[Optional[str]] = mapped_column(Text)
+    heat_injury_warning: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class TempdiffForecast(Base):
+    """CWA 溫差提醒指數（F-A0085-005）"""
+    __tablename__ = "tempdiff_forecasts"
+
+    district: Mapped[str] = mapped_column(Text, primary_key=True)
+    issue_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    start_time: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    end_time: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    temperature_difference_index: Mapped[Optional[str]] = mapped_column(Text)
+    temperature_difference_warning: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class CwaForecastSync(Base):
+    __tablename__ = "cwa_forecast_sync"
+
+    dataset: Mapped[str] = mapped_column(Text, primary_key=True)
+    issue_key: Mapped[Optional[str]] = mapped_column(Text)
+    window_start: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    rows_changed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    checked_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -1,18 +1,21 @@
 # backend/routes/aed_sites.py
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from werkzeug.exceptions import BadRequest
 from db import SessionLocal
-from services.aed_service import get_all_aeds_geojson, get_nearest_aed_geojson
+from services.aed_service import all_aeds_geojson_body, get_nearest_aed_geojson
+from services.json_codec import dumps
+from services.geojson_snapshot import get_store
+from routes.http_cache import snapshot_response
 
 bp = Blueprint("aed_sites", __name__)
 
 @bp.get("/aeds")
 def get_all_aeds():
-    """取得所有 AED 位置 (GeoJSON)"""
+    """取得所有 AED 位置 (GeoJSON；預先編碼的快照，支援 ETag/304 與 gzip/br)"""
     s = SessionLocal()
     try:
-        data = get_all_aeds_geojson(s)
-        return jsonify(data), 200
+        snap = get_store("aed_sites").get(s, "all", lambda: all_aeds_geojson_body(s))
+        return snapshot_response(snap, request)
     finally:
         s.close()
 
@@ -38,6 +41,6 @@ def get_nearest_aed():
         item = get_nearest_aed_geojson(s, lat=lat, lon=lon, limit=limit)
         if not item:
             return jsonify({"note": "no data"}), 200
-        return jsonify(item), 200
+        return Response(dumps(item), mimetype="application/json")
     finally:
         s.close()
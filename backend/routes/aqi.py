@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.exceptions import BadRequest
-from services.aqi_service import get_aqi_by_point_cached
+from services.aqi_service import get_aqi_by_point_cached, get_aqi_grid
 from db import SessionLocal
 
 bp = Blueprint("aqi", __name__)
@@ -20,3 +20,26 @@ def aqi_pm25():
         return jsonify(result), status
     finally:
         s.close()
+
+
+@bp.get("/aqi/grid")
+def aqi_grid():
+    """整片 CAMS 格點的 AQI（每個 lead 一個扁平陣列），給地圖畫 overlay"""
+    lead = request.args.get("lead")
+    try:
+        lead_hour = int(lead) if lead is not None else None
+    except Exception:
+        raise BadRequest("invalid lead (hours)")
+
+    s = SessionLocal()
+    try:
+        result = get_aqi_grid(s, lead_hour)
+    finally:
+        s.close()
+    if result is None:
+        return jsonify({"error": "CAMS data not ready yet"}), 503
+    if lead_hour is not None and not result["leads"]:
+        raise BadRequest("unknown lead hour")
+    resp = jsonify(result)
+    resp.headers["Cache-Control"] = "public, max-age=300"
+    return resp
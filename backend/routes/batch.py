@@ -0,0 +1,79 @@
+# backend/routes/batch.py
+from flask import Blueprint, request, jsonify
+from werkzeug.exceptions import BadRequest
+from db import SessionLocal
+from services.batch_spatial_service import batch_spatial, MAX_POINTS, MAX_K
+
+bp = Blueprint("batch", __name__)
+
+
+def _parse_points(raw):
+    """接受 [{"lat":..,"lon":..}, ...] 或 [[lat, lon], ...]"""
+    if not isinstance(raw, list) or not raw:
+        raise BadRequest("points[] required")
+    if len(raw) > MAX_POINTS:
+        raise BadRequest(f"too many points (max {MAX_POINTS})")
+    lats, lons = [], []
+    try:
+        for p in raw:
+            lat, lon = (p["lat"], p["lon"]) if isinstance(p, dict) else (p[0], p[1])
+            lats.append(float(lat))
+            lons.append(float(lon))
+    except Exception:
+        raise BadRequest("each point needs lat/lon")
+    return lats, lons
+
+
+def _parse_k(op, name):
+    if not op:
+        return 0
+    k = op.get("k", 1) if isinstance(op, dict) else 1
+    try:
+        k = int(k)
+        if k <= 0 or k > MAX_K:
+            raise ValueError()
+    except Exception:
+        raise BadRequest(f"invalid {name}.k (must be 1-{MAX_K})")
+    return k
+
+
+@bp.post("/batch/spatial")
+def batch_spatial_route():
+    """
+    一次查多個點。
+    body: {
+      "points": [{"lat":25.03,"lon":121.56}, ...] 或 [[25.03,121.56], ...],
+      "ops": {"district": true, "aed": {"k": 1}, "cooling": {"k": 1, "r": 1000}}
+    }
+    回傳 {"results": [...]}，順序與 points 相同。
+    """
+    js = request.get_json(silent=True) or {}
+    lats, lons = _parse_points(js.get("points"))
+    ops = js.get("ops") or {}
+    if not isinstance(ops, dict) or not ops:
+        raise BadRequest("ops required (district | aed | cooling)")
+
+    aed_k = _parse_k(ops.get("aed"), "aed")
+    cooling = ops.get("cooling")
+    cooling_k = _parse_k(cooling, "cooling")
+    radius_m = None
+    if isinstance(cooling, dict) and cooling.get("r") is not None:
+        try:
+            radius_m = float(cooling["r"])
+            if radius_m <= 0:
+                raise ValueError()
+        except Exception:
+            raise BadRequest("invalid cooling.r (radius meters)")
+
+    s = SessionLocal()
+    try:
+        results = batch_spatial(
+            s, lats, lons,
+            district=bool(ops.get("district")),
+            aed_k=aed_k,
+            cooling_k=cooling_k,
+            cooling_radius_m=radius_m,
+        )
+        return jsonify({"count": len(results), "results": results}), 200
+    finally:
+        s.close()
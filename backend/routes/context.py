@@ -0,0 +1,34 @@
+# backend/routes/context.py
+from flask import Blueprint, request, jsonify
+from werkzeug.exceptions import BadRequest
+from db import SessionLocal
+from services.context_service import get_context
+
+bp = Blueprint("context", __name__)
+
+@bp.get("/context")
+def context():
+    """首頁彙整：行政區 + 熱傷害 + 溫差 + PM2.5 + 最近 AED + 最近納涼地點（各區塊獨立 status）"""
+    try:
+        lat = float(request.args["lat"])
+        lon = float(request.args["lon"])
+    except Exception:
+        raise BadRequest("lat/lon required")
+
+    try:
+        aed_limit = int(request.args.get("aed_limit", 1))
+        site_limit = int(request.args.get("site_limit", 1))
+        r = request.args.get("r")
+        radius_m = float(r) if r is not None else 1000.0
+        if not (0 < aed_limit <= 100 and 0 < site_limit <= 100 and radius_m > 0):
+            raise ValueError()
+    except Exception:
+        raise BadRequest("invalid aed_limit/site_limit (1-100) or r")
+
+    session = SessionLocal()
+    try:
+        result = get_context(session, lat, lon, aed_limit=aed_limit,
+                             site_radius_m=radius_m, site_limit=site_limit)
+        return jsonify(result), 200
+    finally:
+        session.close()
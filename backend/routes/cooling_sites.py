@@ -1,31 +1,99 @@
 # backend/routes/cooling_sites.py
-from flask import Blueprint, request, Response
+from flask import Blueprint, request, Response, stream_with_context
 from werkzeug.exceptions import BadRequest
-import json
 from db import SessionLocal
 from services.cooling_sites_service import (
-    list_cooling_sites_geojson,
+    cooling_sites_page_body,
+    iter_cooling_sites_geojson,
     nearest_cooling_site_geojson,
+    decode_cursor,
+    parse_amenities,
+    parse_open_at,
+    AMENITY_BITS,
 )
+from services.geojson_snapshot import get_store
+from services.json_codec import dumps
+from routes.http_cache import snapshot_response
 
 bp = Blueprint("cooling_sites", __name__)
 
+MAX_PAGE = 10000
+DEFAULT_PAGE = 600
+# 只有這幾種「整包」請求走快照；其他分頁參數由呼叫端決定，組合無上限，一律串流
+SNAPSHOT_LIMITS = (DEFAULT_PAGE, 1000)
+
+def _parse_amenities() -> int:
+    try:
+        return parse_amenities(request.args.get("amenities"))
+    except ValueError as e:
+        raise BadRequest(f"unknown amenity: {e} (available: {', '.join(AMENITY_BITS)})")
+
+def _parse_open_at():
+    """open_now=true 或 open_at=<ISO 8601>（無時區視為台北時間）→ 週分鐘；都沒給為 None"""
+    try:
+        return parse_open_at(request.args.get("open_now"), request.args.get("open_at"))
+    except ValueError:
+        raise BadRequest("invalid open_now/open_at (open_now=true or open_at=ISO 8601, e.g. 2025-07-01T14:30)")
+
+def _parse_bbox(raw: str):
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(x) for x in raw.split(","))
+        if not (min_lon < max_lon and min_lat < max_lat):
+            raise ValueError()
+    except Exception:
+        raise BadRequest("invalid bbox (min_lon,min_lat,max_lon,max_lat)")
+    return (min_lon, min_lat, max_lon, max_lat)
+
 @bp.get("/sites")
 def get_sites():
+    """
+    分頁列出納涼地點。
+    - cursor：上一頁回傳的 next（keyset，依 id 遞增）；offset 仍保留相容
+    - bbox=min_lon,min_lat,max_lon,max_lat：只取視窗內（走 GiST 索引）
+    - amenities=ac,toilet,...：只取設施全都有的（fan/ac/toilet/seating/drinking/accessible_seat）
+    - open_now=true / open_at=<ISO 8601>：只取該時刻（台北時間）開放的；開放時間無法解析的不列入
+    無任何篩選、offset=0 且 limit 為預設值或 1000 的請求走預建快照；其餘以串流輸出。
+    """
     try:
-        limit = int(request.args.get("limit", 600))
+        limit = int(request.args.get("limit", DEFAULT_PAGE))
         offset = int(request.args.get("offset", 0))
-        if limit <= 0 or limit > 1000 or offset < 0:
+        if limit <= 0 or limit > MAX_PAGE or offset < 0:
             raise ValueError()
     except Exception:
         raise BadRequest("invalid limit/offset")
 
-    session = SessionLocal()
+    cursor = request.args.get("cursor")
     try:
-        fc = list_cooling_sites_geojson(session, limit=limit, offset=offset)
-        return Response(json.dumps(fc, ensure_ascii=False), mimetype="application/geo+json")
-    finally:
+        after_id = decode_cursor(cursor) if cursor else None
+    except Exception:
+        raise BadRequest("invalid cursor")
+    bbox = _parse_bbox(request.args["bbox"]) if request.args.get("bbox") else None
+    amenities = _parse_amenities()
+    open_minute = _parse_open_at()
+
+    session = SessionLocal()
+    if (after_id is None and bbox is None and open_minute is None and not amenities
+            and offset == 0 and limit in SNAPSHOT_LIMITS):
+        try:
+            snap = get_store("cooling_sites", "application/geo+json").get(
+                session, limit, lambda: cooling_sites_page_body(session, limit=limit),
+            )
+            return snapshot_response(snap, request)
+        finally:
+            session.close()
+
+    if offset and (after_id is not None or bbox is not None):
         session.close()
+        raise BadRequest("offset cannot be combined with cursor/bbox")
+
+    def generate():
+        try:
+            yield from iter_cooling_sites_geojson(session, limit=limit, after_id=after_id, bbox=bbox,
+                                                  amenities=amenities, open_minute=open_minute, offset=offset)
+        finally:
+            session.close()
+
+    return Response(stream_with_context(generate()), mimetype="application/geo+json")
 
 @bp.get("/sites/nearest")
 def get_nearest_site():
@@ -49,10 +117,13 @@ def get_nearest_site():
             raise ValueError()
     except Exception:
         raise BadRequest("invalid limit (must be 1-100)")
+    amenities = _parse_amenities()
+    open_minute = _parse_open_at()
 
     session = SessionLocal()
     try:
-        fc = nearest_cooling_site_geojson(session, lat=lat, lon=lon, radius_m=radius_m, limit=limit)
-        return Response(json.dumps(fc, ensure_ascii=False), mimetype="application/geo+json")
+        fc = nearest_cooling_site_geojson(session, lat=lat, lon=lon, radius_m=radius_m, limit=limit,
+                                          amenities=amenities, open_minute=open_minute)
+        return Response(dumps(fc), mimetype="application/geo+json")
     finally:
         session.close()
@@ -1,11 +1,31 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.exceptions import BadRequest
-from sqlalchemy import select
 from db import SessionLocal
-from models import DeviceToken
+from services import device_service
+from services.district_service import get_district_by_point
 
 bp = Blueprint("devices", __name__)
 
+
+def _opt_str(v, name):
+    if v is not None and not isinstance(v, str):
+        raise BadRequest(f"{name} must be a string")
+    return v
+
+
+def _district(s, d, prefix=""):
+    """district 直接給，或給 lat/lon 由行政區索引判斷；都沒有回 None（保留原本的）"""
+    if d.get("district") is not None:
+        return _opt_str(d.get("district"), f"{prefix}district").strip() or None
+    if d.get("lat") is None and d.get("lon") is None:
+        return None
+    try:
+        lat, lon = float(d["lat"]), float(d["lon"])
+    except Exception:
+        raise BadRequest(f"{prefix}lat/lon must be numbers")
+    return get_district_by_point(s, lat, lon)
+
+
 @bp.post("/devices/register")
 def register_device():
     js = request.get_json(silent=True) or {}
@@ -17,14 +37,39 @@ def register_device():
 
     s = SessionLocal()
     try:
-        # upsert 簡版：存在就更新 user/platform；不存在就新增
-        existing = s.execute(select(DeviceToken).where(DeviceToken.fcm_token == token)).scalar_one_or_none()
-        if existing:
-            existing.user_id = user_id
-            existing.platform = platform
-        else:
-            s.add(DeviceToken(fcm_token=token, user_id=user_id, platform=platform))
-        s.commit()
+        district = _district(s, js)
+        # 單一 INSERT ... ON CONFLICT：存在就更新 user/platform，不存在就新增
+        device_service.register_device(s, token, user_id, platform, district)
         return jsonify({"ok": True})
     finally:
         s.close()
+
+
+@bp.post("/devices/register:batch")
+def register_devices_batch():
+    """
+    大量註冊（搬遷、重新同步用）。
+    body: {"devices": [{"fcm_token": "...", "user_id": "...", "platform": "android",
+                        "district": "大安區" 或 "lat": .., "lon": ..（可省略）}, ...]}
+    回傳 {"ok": true, "received": n, "inserted": x, "updated": y}
+    """
+    js = request.get_json(silent=True) or {}
+    items = js.get("devices")
+    if not isinstance(items, list) or not items:
+        raise BadRequest("devices[] required")
+    if len(items) > device_service.MAX_BATCH:
+        raise BadRequest(f"too many devices (max {device_service.MAX_BATCH})")
+
+    s = SessionLocal()
+    try:
+        devices = []
+        for i, d in enumerate(items):
+            token = d.get("fcm_token") if isinstance(d, dict) else None
+            if not token or not isinstance(token, str):
+                raise BadRequest(f"devices[{i}].fcm_token required")
+            devices.append((token, _opt_str(d.get("user_id"), f"devices[{i}].user_id"),
+                            _opt_str(d.get("platform"), f"devices[{i}].platform"),
+                            _district(s, d, f"devices[{i}].")))
+        return jsonify({"ok": True, **device_service.register_devices(s, devices)})
+    finally:
+        s.close()
@@ -2,7 +2,9 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.exceptions import BadRequest
 from db import SessionLocal
+from services.district_boundaries import boundaries_snapshot
 from services.district_service import resolve_district
+from routes.http_cache import snapshot_response
 
 bp = Blueprint("districts", __name__)
 
@@ -28,3 +30,23 @@ def which_district():
             session.close()
         except Exception:
             pass
+
+
+@bp.get("/districts/boundaries")
+def district_boundaries():
+    """
+    行政區邊界 GeoJSON，依地圖 zoom 回傳對應簡化程度（預設 12）。
+    內容在匯入時算好，回應帶 ETag，可 gzip / br。
+    """
+    try:
+        zoom = int(request.args.get("zoom", 12))
+        if not 0 <= zoom <= 24:
+            raise ValueError()
+    except Exception:
+        raise BadRequest("zoom must be an integer 0..24")
+
+    session = SessionLocal()
+    try:
+        return snapshot_response(boundaries_snapshot(session, zoom), request)
+    finally:
+        session.close()
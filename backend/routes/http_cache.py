@@ -0,0 +1,45 @@
+# backend/routes/http_cache.py
+"""把預先編碼好的快照寫成 HTTP 回應（ETag / 304 / Content-Encoding 協商）。"""
+from flask import Response
+
+from services.geojson_snapshot import Snapshot
+
+
+def _accepts(req, coding: str) -> bool:
+    for part in (req.headers.get("Accept-Encoding") or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() == coding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def _etag_matches(req, etag: str) -> bool:
+    inm = req.headers.get("If-None-Match")
+    if not inm:
+        return False
+    if inm.strip() == "*":
+        return True
+    return etag in {t.strip().removeprefix("W/").strip('"') for t in inm.split(",")}
+
+
+def snapshot_response(snap: Snapshot, req, cache_control: str = "public, no-cache") -> Response:
+    reps = snap.reps        # 先取一次：背景重壓換掉 reps 時，本次回應的 bytes 與 ETag 仍成對
+    if "br" in reps and _accepts(req, "br"):
+        coding = "br"
+    elif _accepts(req, "gzip"):
+        coding = "gzip"
+    else:
+        coding = "identity"
+    body, tag = reps[coding]
+
+    # 每種編碼是不同的表示，各自一個強 ETag；只有協商出的這一種相符才回 304
+    if _etag_matches(req, tag):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype=snap.mimetype)
+        if coding != "identity":
+            resp.headers["Content-Encoding"] = coding
+    resp.headers["ETag"] = f'"{tag}"'
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = cache_control
+    return resp
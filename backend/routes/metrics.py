@@ -0,0 +1,10 @@
+# backend/routes/metrics.py
+from flask import Blueprint, Response
+from services.metrics import CONTENT_TYPE_LATEST, render
+
+bp = Blueprint("metrics", __name__)
+
+@bp.get("/metrics")
+def metrics():
+    """Prometheus 文字格式"""
+    return Response(render(), content_type=CONTENT_TYPE_LATEST)
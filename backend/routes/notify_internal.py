@@ -1,12 +1,13 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.exceptions import BadRequest, Unauthorized
+from werkzeug.exceptions import BadRequest, NotFound, Unauthorized
 from sqlalchemy import select
 import os, json
 from db import SessionLocal
 from models import DeviceToken
 from services.push_service_rest import (
-    send_to_token, send_to_topic, send_multicast
+    send_to_token, send_to_topic, send_multicast, validate_message
 )
+from services.push_fanout import get_job, start_district_fanout
 
 bp = Blueprint("notify_internal", __name__)
 
@@ -26,11 +27,15 @@ def internal_notify():
     js = request.get_json(silent=True) or {}
     title = js.get("title") or "通知"
     body = js.get("body") or ""
-    data = js.get("data") or {}
+    try:
+        data = validate_message(title, body, js.get("data"))
+    except ValueError as e:
+        raise BadRequest(str(e))
     token = js.get("token")
     topic = js.get("topic")
     user_id = js.get("user_id")
     tokens = js.get("tokens")  # 可傳陣列
+    district = js.get("district")  # 行政區推播（背景 job）
 
     if topic:
         return jsonify(send_to_topic(topic, title, body, data))
@@ -41,17 +46,31 @@ def internal_notify():
     if tokens and isinstance(tokens, list):
         return jsonify(send_multicast(tokens, title, body, data))
 
+    if district:
+        # 送給最近位置在該行政區的所有裝置；立即回 202，進度查 /internal/notify/jobs/<job_id>
+        job = start_district_fanout(district, title, body, data)
+        return jsonify(job), 202
+
     if user_id:
         # 發送給某個 user_id 所有裝置
         s = SessionLocal()
         try:
-            ts = [t.fcm_token for t in s.execute(
-                select(DeviceToken).where(DeviceToken.user_id == user_id)
-            ).scalars().all()]
+            ts = s.execute(
+                select(DeviceToken.fcm_token).where(DeviceToken.user_id == user_id)
+            ).scalars().all()
         finally:
             s.close()
         if not ts:
             return jsonify({"success": False, "reason": "no tokens for user"}), 404
         return jsonify(send_multicast(ts, title, body, data))
 
-    raise BadRequest("need one of: token | tokens[] | topic | user_id")
+    raise BadRequest("need one of: token | tokens[] | topic | district | user_id")
+
+
+@bp.get("/internal/notify/jobs/<job_id>")
+def notify_job(job_id):
+    _check_auth(request)
+    job = get_job(job_id)
+    if job is None:
+        raise NotFound("job not found (jobs are kept in memory of the process that started them)")
+    return jsonify(job)
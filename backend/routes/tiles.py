@@ -0,0 +1,32 @@
+# backend/routes/tiles.py
+import os
+
+from flask import Blueprint, request
+from werkzeug.exceptions import BadRequest, NotFound
+
+from db import SessionLocal
+from routes.http_cache import snapshot_response
+from services.vector_tiles import LAYERS, TileOutOfRange, get_tile
+
+bp = Blueprint("tiles", __name__)
+
+# 可放 CDN；資料重新匯入後最久 TILE_MAX_AGE 秒內會換成新圖磚（ETag 也會變）
+TILE_MAX_AGE = int(os.getenv("TILE_MAX_AGE", "300"))
+
+
+@bp.get("/tiles/<layer>/<int:z>/<int:x>/<int:y>.mvt")
+def vector_tile(layer: str, z: int, x: int, y: int):
+    """
+    向量圖磚（application/vnd.mapbox-vector-tile，支援 gzip、ETag/304）。
+    layer：sites（納涼點）/ aeds / districts；點圖層在低 zoom 回傳聚合點（point_count）。
+    """
+    if layer not in LAYERS:
+        raise NotFound(f"unknown layer: {layer} (available: {', '.join(LAYERS)})")
+    s = SessionLocal()
+    try:
+        tile = get_tile(s, layer, z, x, y)
+    except TileOutOfRange as e:
+        raise BadRequest(str(e))
+    finally:
+        s.close()
+    return snapshot_response(tile, request, cache_control=f"public, max-age={TILE_MAX_AGE}")
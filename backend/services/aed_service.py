@@ -1,14 +1,23 @@
 # backend/services/aed_service.py
 from typing import Any, Dict, List, Optional
 import json
+import logging
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
+from sqlalchemy import Text, and_, cast, func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from models import AedSite
+from services import json_codec
+from services.json_codec import dumps
+from services.nearest_query import nearest_rows
+from services.point_index import NEAREST_BACKEND, PointIndex, get_point_index
+
+log = logging.getLogger(__name__)
 
 
 def get_all_aeds_geojson(session: Session) -> Dict[str, Any]:
     """取得所有 AED 位置 (GeoJSON FeatureCollection)"""
-    rows = session.execute(select(AedSite)).scalars().all()
+    # 依 id 排序：與 GEOJSON_BUILD=db 的 json_agg 同順序，快照內容（ETag）也不隨 heap 順序變動
+    rows = session.execute(select(AedSite).order_by(AedSite.id)).scalars().all()
     features = []
     for r in rows:
         if r.lon and r.lat:
@@ -28,26 +37,69 @@ def get_all_aeds_geojson(session: Session) -> Dict[str, Any]:
     return {"type": "FeatureCollection", "features": features}
 
 
+def _k(name: str):
+    return literal_column(f"'{name}'")
+
+
+_AED_PROPERTIES = ("id", "name", "address", "category", "type", "place", "description")
+
+
+def all_aeds_geojson_body(session: Session) -> bytes:
+    """
+    /aeds 快照用的已編碼 FeatureCollection（內容同 get_all_aeds_geojson）。
+    GEOJSON_BUILD=db：PostGIS 以 json_agg 組好 features 文字，Python 不解析。
+    """
+    if json_codec.GEOJSON_BUILD != "db":
+        return dumps(get_all_aeds_geojson(session))
+    m = AedSite
+    feature = func.json_build_object(
+        _k("type"), _k("Feature"),
+        _k("geometry"), func.json_build_object(_k("type"), _k("Point"),
+                                               _k("coordinates"), func.json_build_array(m.lon, m.lat)),
+        _k("properties"), func.json_build_object(*[x for c in _AED_PROPERTIES for x in (_k(c), getattr(m, c))]),
+    )
+    # 與 Python 版的 `if r.lon and r.lat` 相同：缺值或 0 都略過
+    q = select(cast(func.json_agg(aggregate_order_by(feature, m.id)), Text)).where(
+        and_(m.lon.isnot(None), m.lat.isnot(None), m.lon != 0, m.lat != 0)
+    )
+    features = session.execute(q).scalar()
+    return b'{"type":"FeatureCollection","features":' + (features or "[]").encode("utf-8") + b"}"
+
+
 def get_nearest_aed_geojson(session: Session, lat: float, lon: float, limit: int) -> Dict[str, Any]:
     """根據經緯度找出最近的 AED（回傳 GeoJSON FeatureCollection，features 由近到遠）。
 
     - `limit` 指定要取出的筆數（1..n）。
     - 若沒有資料，回傳空的 FeatureCollection。
+    - 預設用記憶體索引；索引無法載入時退回 PostGIS。
     """
-    pt = func.ST_SetSRID(func.ST_Point(lon, lat), 4326)
-
-    q = (
-        select(
-            AedSite,
-            func.ST_AsGeoJSON(AedSite.geom).label("geom_json"),
-            func.ST_Distance(func.Geography(AedSite.geom), func.Geography(pt)).label("distance_m"),
-        )
-        .where(AedSite.geom.isnot(None))
-        .order_by(func.ST_Distance(func.Geography(AedSite.geom), func.Geography(pt)))
-        .limit(limit)
-    )
+    if NEAREST_BACKEND != "postgis":
+        try:
+            idx = get_point_index(session, "aed_sites")
+            if len(idx):
+                return _nearest_aed_from_index(idx, lat, lon, limit)
+        except Exception:
+            log.exception("AED point index unavailable; falling back to PostGIS")
+            session.rollback()
+    return _nearest_aed_postgis(session, lat, lon, limit)
+
+
+def _nearest_aed_from_index(idx: PointIndex, lat: float, lon: float, limit: int) -> Dict[str, Any]:
+    pos, dist = idx.knn(lat, lon, limit)
+    features = []
+    for i, d in zip(pos.tolist(), dist.tolist()):
+        props = idx.row(i)
+        props["distance_m"] = d
+        features.append({
+            "type": "Feature",
+            "geometry": idx.point(i),
+            "properties": props,
+        })
+    return {"type": "FeatureCollection", "features": features}
+
 
-    rows = session.execute(q).all()
+def _nearest_aed_postgis(session: Session, lat: float, lon: float, limit: int) -> Dict[str, Any]:
+    rows = nearest_rows(session, AedSite, lat=lat, lon=lon, limit=limit)
     features: List[Dict[str, Any]] = []
     for row in rows:
         # row: (AedSite, geom_json, distance_m)
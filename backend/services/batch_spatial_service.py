@@ -0,0 +1,132 @@
+# backend/services/batch_spatial_service.py
+"""
+一次處理多個點的空間查詢（行政區 / 最近 AED / 最近納涼地點）。
+
+- 預設整批在記憶體索引上向量化計算（STRtree 批次 contains、cKDTree 批次 KNN）
+- 索引無法使用、或 DISTRICT_RESOLVER / NEAREST_BACKEND=postgis 時，行政區與最近點各用單一 PostGIS 查詢：
+  unnest(點陣列) + LATERAL
+- 結果依輸入順序回傳
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+
+from services.district_service import resolve_districts
+from services.nearest_query import CANDIDATE_MAX, initial_candidates, is_exact
+from services.point_index import NEAREST_BACKEND, get_point_index
+
+log = logging.getLogger(__name__)
+
+MAX_POINTS = 5000
+MAX_K = 20
+
+# 各圖層在批次結果中帶出的欄位（精簡版，完整屬性請用單點 API）
+_LAYERS = {
+    "aed": ("aed_sites", ["id", "name", "address"]),
+    "cooling": ("cooling_sites", ["id", "name", "district_name", "address"]),
+}
+
+# cand_bound_deg / cand_n：每個點候選中最遠的平面距離與候選數（判斷是否要加寬，見 nearest_query）
+_LATERAL_SQL = """
+SELECT u.ord - 1 AS i, t.id, {cols}, ST_Y(t.geom) AS lat, ST_X(t.geom) AS lon,
+       ST_Distance(t.geom::geography, ST_SetSRID(ST_Point(u.lon, u.lat), 4326)::geography) AS distance_m,
+       max(t.planar_deg) OVER w AS cand_bound_deg, count(*) OVER w AS cand_n
+FROM unnest(CAST(:lats AS double precision[]), CAST(:lons AS double precision[]))
+     WITH ORDINALITY AS u(lat, lon, ord)
+CROSS JOIN LATERAL (
+  SELECT *, geom <-> ST_SetSRID(ST_Point(u.lon, u.lat), 4326) AS planar_deg FROM {table}
+  WHERE geom IS NOT NULL
+  ORDER BY geom <-> ST_SetSRID(ST_Point(u.lon, u.lat), 4326)
+  LIMIT :n_cand
+) t
+WINDOW w AS (PARTITION BY u.ord)
+ORDER BY u.ord, distance_m
+"""
+
+
+def _nearest_memory(session, layer: str, lats, lons, k: int) -> Optional[List[List[Dict[str, Any]]]]:
+    table, cols = _LAYERS[layer]
+    try:
+        idx = get_point_index(session, table)
+    except Exception:
+        log.exception("%s point index unavailable; using PostGIS", table)
+        session.rollback()
+        return None
+    if not len(idx):
+        return None
+    pos, dist = idx.knn_many(lats, lons, k)
+    columns = [idx.columns[c] for c in cols]
+    out = []
+    for prow, drow in zip(pos.tolist(), dist.tolist()):
+        items = []
+        for i, d in zip(prow, drow):
+            if i < 0:
+                continue
+            item = {c: col[i] for c, col in zip(cols, columns)}
+            item.update(lat=float(idx.lats[i]), lon=float(idx.lons[i]), distance_m=d)
+            items.append(item)
+        out.append(items)
+    return out
+
+
+def _nearest_postgis(session, layer: str, lats, lons, k: int) -> List[List[Dict[str, Any]]]:
+    table, cols = _LAYERS[layer]
+    extra = [c for c in cols if c != "id"]
+    sql = text(_LATERAL_SQL.format(table=table, cols=", ".join(f"t.{c}" for c in extra)))
+    out: List[List[Dict[str, Any]]] = [[] for _ in lats]
+    pending = list(range(len(lats)))
+    n_cand = initial_candidates(k)
+    while pending:
+        rows = session.execute(sql, {"lats": [lats[p] for p in pending], "lons": [lons[p] for p in pending],
+                                     "n_cand": n_cand}).mappings()
+        bounds: Dict[int, Any] = {}
+        for r in rows:
+            p = pending[r["i"]]
+            bucket = out[p]
+            if len(bucket) < k:
+                bucket.append({
+                    "id": r["id"], **{c: r[c] for c in extra},
+                    "lat": r["lat"], "lon": r["lon"], "distance_m": float(r["distance_m"]),
+                })
+                bounds[p] = r
+        # 候選已涵蓋整表、或第 k 名在候選外的下界內 → 確定；其餘加寬重查（只查這些點）
+        again = [p for p, r in bounds.items()
+                 if len(out[p]) == k and r["cand_n"] == n_cand
+                 and not is_exact(float(lats[p]), out[p][-1]["distance_m"], float(r["cand_bound_deg"]))]
+        if not again or n_cand >= CANDIDATE_MAX:
+            break
+        for p in again:
+            out[p] = []
+        pending, n_cand = sorted(again), min(n_cand * 2, CANDIDATE_MAX)
+    return out
+
+
+def _nearest(session, layer: str, lats, lons, k: int) -> List[List[Dict[str, Any]]]:
+    res = _nearest_memory(session, layer, lats, lons, k) if NEAREST_BACKEND != "postgis" else None
+    return res if res is not None else _nearest_postgis(session, layer, lats, lons, k)
+
+
+def batch_spatial(session, lats: Sequence[float], lons: Sequence[float],
+                  district: bool = False,
+                  aed_k: int = 0,
+                  cooling_k: int = 0,
+                  cooling_radius_m: Optional[float] = None) -> List[Dict[str, Any]]:
+    """回傳與輸入等長的 list：每筆 {"i", "lat", "lon", ["district"], ["aed"], ["cooling"]}。"""
+    results: List[Dict[str, Any]] = [
+        {"i": i, "lat": lat, "lon": lon} for i, (lat, lon) in enumerate(zip(lats, lons))
+    ]
+    if district:
+        for r, d in zip(results, resolve_districts(session, lats, lons)):
+            r["district"] = d
+    if aed_k:
+        for r, items in zip(results, _nearest(session, "aed", lats, lons, aed_k)):
+            r["aed"] = items
+    if cooling_k:
+        for r, items in zip(results, _nearest(session, "cooling", lats, lons, cooling_k)):
+            # 與 /sites/nearest 相同：半徑內有就只回半徑內，否則回全域最近
+            if cooling_radius_m is not None:
+                within = [x for x in items if x["distance_m"] <= cooling_radius_m]
+                items = within or items
+            r["cooling"] = items
+    return results
@@ -0,0 +1,300 @@
+# backend/services/cams_prefetch.py
+"""
+CAMS PM2.5 背景預抓：每個模式 run 只下載一次，解碼後的格點留在記憶體。
+
+- 背景 thread 每 CAMS_PREFETCH_INTERVAL_SEC 秒醒來一次
+- 依 _iter_latest_refs 的順序（今天 12Z → 今天 00Z → 昨天…）找最新可用的 run；
+  遇到目前已載入的 run 就停，不重複下載
+- pm2p5 轉成 µg/m³ 後存成 NumPy 陣列 (lead, lat, lon)，查詢是 O(1) 的索引換算
+- 請求端只讀 current_grid()，永遠不會碰 cdsapi
+- 有設定 store（services.cams_store）時：啟動先從資料庫載回最新 run，下載到新 run 後寫回
+- 同一個 run 只下載一次：process 內以 Future 合併，跨 process 以 advisory lock 排隊，
+  沒搶到鎖的從資料庫讀 leader 寫入的結果
+"""
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import cdsapi
+import numpy as np
+import xarray as xr
+
+from services.metrics import upstream_timer
+
+log = logging.getLogger(__name__)
+
+DATASET = "cams-global-atmospheric-composition-forecasts"
+TAIPEI_AREA = [25.3, 121.3, 24.9, 121.7]
+LEAD_HOURS = [0, 3, 6, 9, 12, 15, 18, 21, 24]
+RUN_TIMES = ["00:00", "12:00"]
+
+PREFETCH_INTERVAL_SEC = float(os.getenv("CAMS_PREFETCH_INTERVAL_SEC", "900"))
+FETCH_WAIT_SEC = float(os.getenv("CAMS_FETCH_WAIT_SEC", "600"))   # 等別人下載同一個 run 的上限
+LOCK_POLL_SEC = 5.0
+
+_LEAD_DIMS = ("forecast_period", "step", "leadtime", "valid_time", "time")
+
+
+def _iter_latest_refs(now_utc: datetime) -> Iterable[Tuple[str, str]]:
+    today = now_utc.date()
+    yesterday = today - timedelta(days=1)
+    for d in (today, yesterday):
+        for t in reversed(RUN_TIMES):
+            yield (str(d), t)
+
+
+def _build_cds_client() -> cdsapi.Client:
+    url = os.getenv("CDS_API_URL", "https://ads.atmosphere.copernicus.eu/api")
+    key = os.getenv("CDS_API_KEY")  # <uid>:<api-key>
+    if key:
+        return cdsapi.Client(url=url, key=key, verify=1)
+    return cdsapi.Client(verify=1)
+
+
+def _to_ug_per_m3(da: xr.DataArray) -> xr.DataArray:
+    units = (da.attrs.get("units") or "").lower()
+    out = da
+    if "kg" in units:
+        out = da * 1e9
+        out.attrs["units"] = "µg m-3"
+    return out
+
+
+class CamsGrid:
+    """一個 CAMS run 的 PM2.5 規則格點（不可變；換 run 時整個替換）。"""
+
+    def __init__(self, reference_time: str, lats: np.ndarray, lons: np.ndarray,
+                 lead_hours: List[int], pm25: np.ndarray):
+        self.reference_time = reference_time          # 例如 "2025-11-09 12:00 UTC"
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.lead_hours = list(lead_hours)
+        self.pm25 = np.asarray(pm25, dtype=np.float32)   # (lead, lat, lon)
+        # 與舊版 /aqi/pm25 相同：各 lead 平均
+        self.pm25_mean = np.nanmean(self.pm25, axis=0) if self.pm25.ndim == 3 else self.pm25
+        self._lat0, self._dlat = self._axis(self.lats)
+        self._lon0, self._dlon = self._axis(self.lons)
+
+    @staticmethod
+    def _axis(values: np.ndarray) -> Tuple[float, float]:
+        if values.size < 2:
+            return float(values[0]), 0.0
+        return float(values[0]), float(values[1] - values[0])
+
+    @staticmethod
+    def _nearest(v: float, v0: float, dv: float, n: int) -> int:
+        if dv == 0.0:
+            return 0
+        i = int(round((v - v0) / dv))
+        return min(max(i, 0), n - 1)
+
+    def nearest_index(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (self._nearest(lat, self._lat0, self._dlat, self.lats.size),
+                self._nearest(lon, self._lon0, self._dlon, self.lons.size))
+
+    def lookup(self, lat: float, lon: float) -> Tuple[float, float, float]:
+        """回傳 (pm25_ugm3, grid_lat, grid_lon)"""
+        i, j = self.nearest_index(lat, lon)
+        return float(self.pm25_mean[i, j]), float(self.lats[i]), float(self.lons[j])
+
+
+def _lead_hours_of(da: xr.DataArray, dim: str) -> List[int]:
+    vals = da.coords[dim].values if dim in da.coords else None
+    if vals is None:
+        return LEAD_HOURS[: da.sizes[dim]]
+    if np.issubdtype(vals.dtype, np.timedelta64):
+        return [int(v / np.timedelta64(1, "h")) for v in vals]
+    if np.issubdtype(vals.dtype, np.datetime64):
+        return [int((v - vals[0]) / np.timedelta64(1, "h")) for v in vals]
+    return [int(v) for v in vals]
+
+
+def decode_grid(nc_path: str, reference_time: str) -> CamsGrid:
+    with xr.open_dataset(nc_path) as ds:
+        var = "pm2p5"
+        if var not in ds.variables:
+            raise RuntimeError(f"variable '{var}' not found; vars={list(ds.variables)}")
+        da = _to_ug_per_m3(ds[var])
+        lead_dim = next((d for d in _LEAD_DIMS if d in da.dims and da.sizes[d] > 1), None)
+        for dim in list(da.dims):
+            if dim not in ("latitude", "longitude", lead_dim):
+                da = da.mean(dim=dim)
+        if lead_dim is None:
+            da = da.expand_dims("lead")
+            lead_dim, leads = "lead", [0]
+        else:
+            leads = _lead_hours_of(da, lead_dim)
+        da = da.transpose(lead_dim, "latitude", "longitude")
+        return CamsGrid(
+            reference_time=reference_time,
+            lats=da["latitude"].values,
+            lons=da["longitude"].values,
+            lead_hours=leads,
+            pm25=da.values,
+        )
+
+
+def download_run(cli: cdsapi.Client, date_str: str, time_str: str, nc_path: str) -> None:
+    req = {
+        "date": date_str,
+        "type": "forecast",
+        "format": "netcdf",
+        "time": [time_str],
+        "leadtime_hour": LEAD_HOURS,
+        "variable": ["particulate_matter_2.5um"],
+        "area": TAIPEI_AREA,
+    }
+    cli.retrieve(DATASET, req).download(nc_path)
+
+
+class CamsPrefetcher:
+    def __init__(self, interval_sec: float = PREFETCH_INTERVAL_SEC, store=None):
+        self.interval_sec = interval_sec
+        self.store = store   # 需有 load_latest() / load_run(ref) / save(grid) / run_lock(ref)
+        self._grid: Optional[CamsGrid] = None
+        self._inflight: Dict[str, Future] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def grid(self) -> Optional[CamsGrid]:
+        return self._grid
+
+    def refresh_once(self) -> Optional[CamsGrid]:
+        """抓最新可用的 run；若最新的就是目前這份則不下載。"""
+        if self._grid is None and self.store is not None:
+            try:
+                self.adopt(self.store.load_latest())
+            except Exception:
+                log.exception("CAMS grid store: load failed")
+        current = self._grid.reference_time if self._grid else None
+        for date_str, time_str in _iter_latest_refs(datetime.now(timezone.utc)):
+            ref = f"{date_str} {time_str} UTC"
+            if ref == current:
+                break
+            try:
+                grid = self.fetch_run(date_str, time_str)
+            except Exception as e:
+                log.info("CAMS run %s not available: %s", ref, e)
+                continue
+            if grid is not None:
+                self._grid = grid
+                log.info("CAMS grid loaded: %s", ref)
+            break   # None = 等別人下載逾時，先沿用目前的格點
+        return self._grid
+
+    def fetch_run(self, date_str: str, time_str: str) -> Optional[CamsGrid]:
+        """
+        同一個 run 同時只有一個 retrieval：
+        - 同 process：_inflight 的 Future，後到的等 leader 的結果（或例外）
+        - 跨 process / replica：store.run_lock（Postgres advisory lock）
+        等超過 FETCH_WAIT_SEC 回傳 None，由呼叫端沿用最近的格點。
+        """
+        ref = f"{date_str} {time_str} UTC"
+        with self._lock:
+            fut = self._inflight.get(ref)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[ref] = Future()
+        if not leader:
+            try:
+                return fut.result(timeout=FETCH_WAIT_SEC)
+            except FutureTimeout:
+                return None
+        try:
+            grid = self._fetch_run_exclusive(date_str, time_str, ref)
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(grid)
+            return grid
+        finally:
+            with self._lock:
+                self._inflight.pop(ref, None)
+
+    def _fetch_run_exclusive(self, date_str: str, time_str: str, ref: str) -> Optional[CamsGrid]:
+        if self.store is None:
+            return self._download(date_str, time_str, ref)
+        deadline = time.monotonic() + FETCH_WAIT_SEC
+        while True:
+            with self.store.run_lock(ref) as acquired:
+                if acquired:
+                    # 拿到鎖時別的 process 可能剛寫完，先看資料庫
+                    grid = self.store.load_run(ref)
+                    if grid is not None:
+                        return grid
+                    grid = self._download(date_str, time_str, ref)
+                    try:
+                        self.store.save(grid)
+                    except Exception:
+                        log.exception("CAMS grid store: save failed")
+                    return grid
+            if time.monotonic() >= deadline:
+                log.info("CAMS run %s: still being fetched elsewhere, keeping current grid", ref)
+                return None
+            time.sleep(LOCK_POLL_SEC)
+
+    def _download(self, date_str: str, time_str: str, ref: str) -> CamsGrid:
+        with tempfile.TemporaryDirectory() as td:
+            nc_path = os.path.join(td, "cams_pm25_latest.nc")
+            with upstream_timer("cams") as t:
+                download_run(_build_cds_client(), date_str, time_str, nc_path)
+                t.status = 200
+            return decode_grid(nc_path, ref)
+
+    def load_file(self, nc_path: str, reference_time: str) -> CamsGrid:
+        """直接載入本機的 NetCDF（離線壓測 / 手動補資料用）。"""
+        self._grid = decode_grid(nc_path, reference_time)
+        log.info("CAMS grid loaded from %s: %s", nc_path, reference_time)
+        return self._grid
+
+    def adopt(self, grid: Optional[CamsGrid]) -> Optional[CamsGrid]:
+        """採用外部載入的格點（資料庫載回）；記憶體已有格點時保留原本的。"""
+        with self._lock:
+            if self._grid is None and grid is not None:
+                self._grid = grid
+                log.info("CAMS grid restored from store: %s", grid.reference_time)
+            return self._grid
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.refresh_once()
+            except Exception:
+                log.exception("CAMS prefetch failed")
+            self._wake.wait(self.interval_sec)
+            self._wake.clear()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name="cams-prefetch")
+                self._thread.start()
+
+    def trigger(self) -> None:
+        """叫醒背景 thread 立刻檢查一次（不等待結果）。"""
+        self._wake.set()
+
+
+prefetcher = CamsPrefetcher()
+
+
+def current_grid() -> Optional[CamsGrid]:
+    return prefetcher.grid
+
+
+def start_prefetcher() -> None:
+    if os.getenv("CAMS_PREFETCH", "1") != "0":
+        from db import SessionLocal, engine
+        from services.cams_store import CamsGridStore
+        prefetcher.store = CamsGridStore(SessionLocal, engine)
+        prefetcher.start()
@@ -0,0 +1,197 @@
+# backend/services/cams_store.py
+"""
+CAMS 格點的持久化（aqi_grid_cache）：每個 run × lead × 格點一列。
+
+- 預抓 thread 下載到新 run 時寫入一次（save），順便刪掉過期的分區（prune）
+- run_lock：跨 process / replica 的 advisory lock，同一個 run 只有一個 process 去下載
+- 啟動時先從資料庫載回最新 run（load_latest），同一個 run 不必重新下載
+- 請求端只有在記憶體沒有格點（剛啟動、預抓關閉）時才呼叫 hydrate；
+  載回的是整個 run，之後經緯度 → 格點的換算都在記憶體做
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional
+
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from models import AqiGridCell
+from services.cams_prefetch import CamsGrid, prefetcher
+
+log = logging.getLogger(__name__)
+
+TABLE = AqiGridCell.__tablename__
+REF_TIME_FORMAT = "%Y-%m-%d %H:%M UTC"
+RETENTION_DAYS = int(os.getenv("AQI_CACHE_RETENTION_DAYS", "7"))
+HYDRATE_RETRY_SEC = 30.0
+ADVISORY_LOCK_PREFIX = "cams-run:"
+
+
+def run_time_of(reference_time: str) -> datetime:
+    return datetime.strptime(reference_time, REF_TIME_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def _partition_name(day: datetime) -> str:
+    return f"{TABLE}_p{day:%Y%m%d}"
+
+
+def ensure_partition(session: Session, run_time: datetime) -> None:
+    """建立 run_time 所在 UTC 日的分區（已存在則略過）。"""
+    day = run_time.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    session.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {_partition_name(day)} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+    ))
+
+
+def save(session: Session, grid: CamsGrid) -> int:
+    """寫入整個 run；同一 run 重複寫入不會產生新列。回傳列數。"""
+    run_time = run_time_of(grid.reference_time)
+    ensure_partition(session, run_time)
+    rows = [
+        {
+            "run_time": run_time, "lead_hour": int(h), "cell_i": i, "cell_j": j,
+            "grid_lat": float(lat), "grid_lon": float(lon), "pm25_ugm3": float(grid.pm25[n, i, j]),
+        }
+        for n, h in enumerate(grid.lead_hours)
+        for i, lat in enumerate(grid.lats)
+        for j, lon in enumerate(grid.lons)
+    ]
+    session.execute(insert(AqiGridCell).on_conflict_do_nothing(), rows)
+    session.commit()
+    return len(rows)
+
+
+def prune(session: Session, retention_days: int = RETENTION_DAYS) -> List[str]:
+    """DROP 整個過期分區（不逐列 DELETE，不留 dead tuple）。回傳被刪的分區名。"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    children = session.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:t)"
+    ), {"t": TABLE}).scalars().all()
+    dropped = []
+    for name in children:
+        try:
+            day = datetime.strptime(name.rsplit("_p", 1)[-1], "%Y%m%d").replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue  # 不是本模組建立的分區
+        if day + timedelta(days=1) <= cutoff:
+            session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    session.commit()
+    if dropped:
+        log.info("aqi_grid_cache: dropped partitions %s", ", ".join(dropped))
+    return dropped
+
+
+def load_latest(session: Session) -> Optional[CamsGrid]:
+    """把最新的 run 組回 CamsGrid；沒有資料時回傳 None。"""
+    run_time = session.execute(select(AqiGridCell.run_time).order_by(AqiGridCell.run_time.desc()).limit(1)).scalar()
+    if run_time is None:
+        return None
+    return load_run(session, run_time)
+
+
+def load_run(session: Session, run_time: datetime) -> Optional[CamsGrid]:
+    rows = session.execute(
+        select(AqiGridCell.lead_hour, AqiGridCell.cell_i, AqiGridCell.cell_j,
+               AqiGridCell.grid_lat, AqiGridCell.grid_lon, AqiGridCell.pm25_ugm3)
+        .where(AqiGridCell.run_time == run_time)
+    ).all()
+    if not rows:
+        return None
+    leads = sorted({r.lead_hour for r in rows})
+    n_lat = max(r.cell_i for r in rows) + 1
+    n_lon = max(r.cell_j for r in rows) + 1
+    lead_index = {h: n for n, h in enumerate(leads)}
+    lats = np.full(n_lat, np.nan)
+    lons = np.full(n_lon, np.nan)
+    pm25 = np.full((len(leads), n_lat, n_lon), np.nan, dtype=np.float32)
+    for r in rows:
+        lats[r.cell_i] = r.grid_lat
+        lons[r.cell_j] = r.grid_lon
+        pm25[lead_index[r.lead_hour], r.cell_i, r.cell_j] = r.pm25_ugm3
+    return CamsGrid(run_time.astimezone(timezone.utc).strftime(REF_TIME_FORMAT), lats, lons, leads, pm25)
+
+
+class CamsGridStore:
+    """給 CamsPrefetcher 用：每次自己開 session（在背景 thread 裡跑）。"""
+
+    def __init__(self, session_factory, engine):
+        self.session_factory = session_factory
+        self.engine = engine
+
+    def load_latest(self) -> Optional[CamsGrid]:
+        s = self.session_factory()
+        try:
+            return load_latest(s)
+        finally:
+            s.close()
+
+    def load_run(self, reference_time: str) -> Optional[CamsGrid]:
+        s = self.session_factory()
+        try:
+            return load_run(s, run_time_of(reference_time))
+        finally:
+            s.close()
+
+    @contextmanager
+    def run_lock(self, reference_time: str) -> Iterator[bool]:
+        """
+        跨 process 的 per-run 互斥：pg_try_advisory_lock，不阻塞，回傳是否搶到。
+        session 層級的鎖綁在連線上，所以下載期間獨佔一條 AUTOCOMMIT 連線（不留 idle in transaction）。
+        """
+        key = f"{ADVISORY_LOCK_PREFIX}{reference_time}"
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            acquired = bool(conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:k))"), {"k": key}).scalar())
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    conn.execute(text("SELECT pg_advisory_unlock(hashtext(:k))"), {"k": key})
+
+    def save(self, grid: CamsGrid) -> None:
+        s = self.session_factory()
+        try:
+            n = save(s, grid)
+            prune(s)
+            log.info("aqi_grid_cache: stored %s (%d cells)", grid.reference_time, n)
+        finally:
+            s.close()
+
+
+_hydrate_lock = threading.Lock()
+_hydrate_failed_at = 0.0
+
+
+def hydrate(session: Session) -> Optional[CamsGrid]:
+    """
+    請求端：記憶體沒有格點時，從資料庫載回最新 run 並交給 prefetcher。
+    同時只有一個請求去查；查不到時 HYDRATE_RETRY_SEC 內不再查。
+    """
+    global _hydrate_failed_at
+    if prefetcher.grid is not None:
+        return prefetcher.grid
+    if time.monotonic() - _hydrate_failed_at < HYDRATE_RETRY_SEC:
+        return None
+    with _hydrate_lock:
+        if prefetcher.grid is not None:
+            return prefetcher.grid
+        try:
+            grid = load_latest(session)
+        except Exception:
+            session.rollback()
+            log.exception("aqi_grid_cache: hydrate failed")
+            grid = None
+        if grid is None:
+            _hydrate_failed_at = time.monotonic()
+            return None
+        return prefetcher.adopt(grid)
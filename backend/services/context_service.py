@@ -0,0 +1,136 @@
+# backend/services/context_service.py
+"""
+首頁用的彙整查詢：一個座標一次拿到行政區、熱傷害、溫差、PM2.5、最近 AED、最近納涼地點。
+
+- 行政區只判斷一次，交給熱傷害 / 溫差共用
+- 各區塊依上游分到各自的 thread pool（cwa / cams / db）同時跑，各自有逾時；
+  CWA 變慢只會塞滿 cwa 那一池，AED / 納涼地點照常
+- 每池排隊數有上限，滿了直接回 busy；逾時的區塊若還在排隊就取消，不再佔 worker
+- 某區塊逾時或失敗不影響其他區塊，回傳時標示各自的 status；例外細節只寫 log，回應只給錯誤代碼
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional
+
+from db import SessionLocal
+from services.aed_service import get_nearest_aed_geojson
+from services.aqi_service import get_aqi_by_point_cached
+from services.cooling_sites_service import nearest_cooling_site_geojson
+from services.district_service import resolve_district
+from services.heat_service import fetch_heat_forecast_for_town
+from services.tempdiff_service import fetch_tempdiff_forecast_for_town
+
+log = logging.getLogger(__name__)
+
+
+# 各區塊逾時（秒）
+SECTION_TIMEOUTS = {
+    "heat": float(os.getenv("CONTEXT_TIMEOUT_HEAT_SEC", "3")),
+    "tempdiff": float(os.getenv("CONTEXT_TIMEOUT_TEMPDIFF_SEC", "3")),
+    "aqi": float(os.getenv("CONTEXT_TIMEOUT_AQI_SEC", "2")),
+    "aeds": float(os.getenv("CONTEXT_TIMEOUT_AEDS_SEC", "2")),
+    "sites": float(os.getenv("CONTEXT_TIMEOUT_SITES_SEC", "2")),
+}
+
+# 區塊 → 上游；同一上游的區塊共用一池
+SECTION_LANES = {"heat": "cwa", "tempdiff": "cwa", "aqi": "cams", "aeds": "db", "sites": "db"}
+LANE_WORKERS = {
+    "cwa": int(os.getenv("CONTEXT_CWA_WORKERS", "8")),
+    "cams": int(os.getenv("CONTEXT_CAMS_WORKERS", "8")),
+    "db": int(os.getenv("CONTEXT_DB_WORKERS", "16")),
+}
+# 每池最多同時 workers × 此倍數個工作（執行中 + 排隊）
+CONTEXT_QUEUE_FACTOR = int(os.getenv("CONTEXT_QUEUE_FACTOR", "2"))
+
+
+class _Lane:
+    """有上限的 thread pool：超過 max_pending 不排隊，submit 回 None。"""
+
+    def __init__(self, name: str, workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"context-{name}")
+        self._slots = threading.BoundedSemaphore(workers * CONTEXT_QUEUE_FACTOR)
+
+    def submit(self, fn: Callable[[], Any]) -> Optional[Future]:
+        if not self._slots.acquire(blocking=False):
+            return None
+        fut = self._executor.submit(fn)
+        fut.add_done_callback(lambda _: self._slots.release())    # 取消也會觸發
+        return fut
+
+
+_lanes = {name: _Lane(name, n) for name, n in LANE_WORKERS.items()}
+
+
+def _with_session(fn: Callable[[Any], Any]) -> Callable[[], Any]:
+    """在 worker thread 內開自己的 session，用完歸還連線。"""
+    def run():
+        s = SessionLocal()
+        try:
+            return fn(s)
+        finally:
+            SessionLocal.remove()
+    return run
+
+
+def _is_empty(data: Any) -> bool:
+    if data is None:
+        return True
+    if isinstance(data, dict) and data.get("type") == "FeatureCollection":
+        return not data.get("features")
+    return False
+
+
+def get_context(session, lat: float, lon: float,
+                aed_limit: int = 1, site_radius_m: float = 1000.0, site_limit: int = 1) -> Dict[str, Any]:
+    district = resolve_district(session, lat, lon)
+    town: Optional[str] = district["district"] if district else None
+
+    tasks: Dict[str, Callable[[], Any]] = {
+        "aqi": _with_session(lambda s: get_aqi_by_point_cached(s, lat, lon)),
+        "aeds": _with_session(lambda s: get_nearest_aed_geojson(s, lat=lat, lon=lon, limit=aed_limit)),
+        "sites": _with_session(lambda s: nearest_cooling_site_geojson(
+            s, lat=lat, lon=lon, radius_m=site_radius_m, limit=site_limit)),
+    }
+    if town:
+        tasks["heat"] = _with_session(lambda s: fetch_heat_forecast_for_town(s, town))
+        tasks["tempdiff"] = _with_session(lambda s: fetch_tempdiff_forecast_for_town(s, town))
+
+    started = time.monotonic()
+    futures = {name: _lanes[SECTION_LANES[name]].submit(fn) for name, fn in tasks.items()}
+
+    sections: Dict[str, Dict[str, Any]] = {}
+    for name in SECTION_TIMEOUTS:
+        if name not in futures:
+            sections[name] = {"status": "empty", "reason": "district not resolved"}
+            continue
+        fut = futures[name]
+        if fut is None:
+            sections[name] = {"status": "busy"}
+            continue
+        remaining = max(0.0, SECTION_TIMEOUTS[name] - (time.monotonic() - started))
+        try:
+            data = fut.result(timeout=remaining)
+        except FutureTimeout:
+            fut.cancel()        # 還沒開始跑的就不跑了；已在跑的只能等它自己結束
+            sections[name] = {"status": "timeout", "timeout_sec": SECTION_TIMEOUTS[name]}
+            continue
+        except Exception:
+            log.exception("context section %s failed", name)
+            sections[name] = {"status": "error", "error": "internal_error"}
+            continue
+        if isinstance(data, dict) and "error" in data:
+            sections[name] = {"status": "error", "error": data["error"]}
+        elif _is_empty(data):
+            sections[name] = {"status": "empty"}
+        else:
+            sections[name] = {"status": "ok", "data": data}
+
+    return {
+        "input": {"lat": lat, "lon": lon},
+        "district": district,
+        "sections": sections,
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+    }
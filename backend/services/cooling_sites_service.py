@@ -1,8 +1,69 @@
-# backend/services/cooling_site_service.py
-from typing import List, Dict, Any
+# backend/services/cooling_sites_service.py
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import base64
 import json
-from sqlalchemy import select, func
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import Integer, Text, cast, literal, literal_column, select, func
+from sqlalchemy.dialects.postgresql import JSON, aggregate_order_by
 from models import CoolingSite
+from services import json_codec
+from services.json_codec import dumps, dumps_str
+from services.nearest_query import nearest_rows
+from services.point_index import NEAREST_BACKEND, PointIndex, get_point_index
+
+log = logging.getLogger(__name__)
+
+BBox = Tuple[float, float, float, float]  # (min_lon, min_lat, max_lon, max_lat)
+
+TW_TZ = timezone(timedelta(hours=8))
+
+# cooling_sites.amenities 的位元（db/10_cooling_sites_amenities.sql 的 generated column）
+AMENITY_BITS = {"fan": 1, "ac": 2, "toilet": 4, "seating": 8, "drinking": 16, "accessible_seat": 32}
+
+
+def parse_amenities(raw: Optional[str]) -> int:
+    """'ac,toilet' → 遮罩；未知名稱丟 ValueError。"""
+    mask = 0
+    for name in (raw or "").split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in AMENITY_BITS:
+            raise ValueError(name)
+        mask |= AMENITY_BITS[name]
+    return mask
+
+
+def _amenity_filter(mask: int):
+    """amenities 含有 mask 全部位元"""
+    return CoolingSite.amenities.op("&")(mask) == mask
+
+
+def minute_of_week(dt: datetime) -> int:
+    """台北時間的週分鐘（週一 00:00 = 0）；沒有時區的 dt 視為台北時間。"""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(TW_TZ)
+    return dt.weekday() * 1440 + dt.hour * 60 + dt.minute
+
+
+def parse_open_at(open_now: Optional[str], open_at: Optional[str]) -> Optional[int]:
+    """
+    open_now=true → 現在；open_at=ISO 8601（例如 2025-07-01T14:30、…+08:00）→ 該時刻。
+    回傳週分鐘，兩者都沒給回傳 None；格式錯誤丟 ValueError。
+    """
+    if open_at:
+        return minute_of_week(datetime.fromisoformat(open_at.strip().replace("Z", "+00:00")))
+    if open_now is None or open_now.lower() in ("", "0", "false", "no"):
+        return None
+    if open_now.lower() not in ("1", "true", "yes"):
+        raise ValueError(open_now)
+    return minute_of_week(datetime.now(TW_TZ))
+
+
+def _open_filter(minute: int):
+    """open_week 含有 minute（走 idx_cooling_sites_open_week）；open_hours 看不懂的列 open_week 為 NULL，不會選到"""
+    return CoolingSite.open_week.op("@>")(literal(minute, Integer))
 
 def _row_to_feature(row, include_distance: bool = False) -> Dict[str, Any]:
     """
@@ -45,59 +106,179 @@ def _row_to_feature(row, include_distance: bool = False) -> Dict[str, Any]:
         "properties": props,
     }
 
-def list_cooling_sites_geojson(session, limit: int = 600, offset: int = 0) -> Dict[str, Any]:
+STREAM_BATCH_ROWS = 500
+
+def encode_cursor(last_id: int) -> str:
+    """不透明的分頁游標（目前內容只是最後一筆 id）"""
+    raw = json.dumps({"after": int(last_id)}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    pad = "=" * (-len(cursor) % 4)
+    after = json.loads(base64.urlsafe_b64decode(cursor + pad))["after"]
+    if not isinstance(after, int) or after < 0:
+        raise ValueError("bad cursor")
+    return after
+
+def _sites_query(limit: int, after_id: Optional[int] = None, bbox: Optional[BBox] = None, offset: int = 0,
+                 amenities: int = 0, columns=None, open_minute: Optional[int] = None):
     q = (
-        select(
-            CoolingSite,
-            func.ST_AsGeoJSON(CoolingSite.geom).label("geom_json"),
-        )
+        select(*(columns or (CoolingSite, func.ST_AsGeoJSON(CoolingSite.geom).label("geom_json"))))
         .order_by(CoolingSite.id.asc())
         .limit(limit)
-        .offset(offset)
     )
-    rows = session.execute(q).all()
+    if after_id is not None:
+        q = q.where(CoolingSite.id > after_id)
+    if bbox is not None:
+        # && 走 idx_cooling_sites_geom（GiST）
+        q = q.where(CoolingSite.geom.op("&&")(func.ST_MakeEnvelope(*bbox, 4326)))
+    if amenities:
+        q = q.where(_amenity_filter(amenities))
+    if open_minute is not None:
+        q = q.where(_open_filter(open_minute))
+    if offset:
+        q = q.offset(offset)
+    return q
+
+def list_cooling_sites_geojson(session, limit: int = 600, offset: int = 0,
+                               after_id: Optional[int] = None, bbox: Optional[BBox] = None,
+                               amenities: int = 0, open_minute: Optional[int] = None) -> Dict[str, Any]:
+    # 多抓一筆判斷是否還有下一頁
+    rows = session.execute(_sites_query(limit + 1, after_id, bbox, offset, amenities,
+                                        open_minute=open_minute)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
     features = [_row_to_feature(r, include_distance=False) for r in rows]
-    return {"type": "FeatureCollection", "features": features}
+    return {
+        "type": "FeatureCollection",
+        "features": features,
+        "next": encode_cursor(rows[-1][0].id) if more else None,
+    }
 
-def nearest_cooling_site_geojson(session, lat: float, lon: float, radius_m: float = 1000.0, limit: int = 1) -> Dict[str, Any]:
-    pt = func.ST_SetSRID(func.ST_Point(lon, lat), 4326)
-
-    # 先在半徑內找最近（真實距離）
-    q_within = (
-        select(
-            CoolingSite,
-            func.ST_AsGeoJSON(CoolingSite.geom).label("geom_json"),
-            func.ST_Distance(func.Geography(CoolingSite.geom), func.Geography(pt)).label("distance_m"),
-        )
-        .where(
-            CoolingSite.geom.isnot(None),
-            func.ST_DWithin(func.Geography(CoolingSite.geom), func.Geography(pt), radius_m),
-        )
-        .order_by(func.ST_Distance(func.Geography(CoolingSite.geom), func.Geography(pt)))
-        .limit(limit)
+def _k(name: str):
+    return literal_column(f"'{name}'")
+
+# 與 _row_to_feature 相同的 properties 順序
+_PROPERTY_COLUMNS = (
+    "id", "location_type", "name", "district_name", "address", "lon", "lat",
+    "phone", "ext", "mobile", "other_contact", "open_hours",
+    "fan", "ac", "toilet", "seating", "drinking", "accessible_seat",
+    "features", "notes",
+)
+
+def _feature_json():
+    """PostGIS 端組好的 Feature（json），內容與 _row_to_feature 相同"""
+    props = func.json_build_object(*[x for c in _PROPERTY_COLUMNS for x in (_k(c), getattr(CoolingSite, c))])
+    return func.json_build_object(
+        _k("type"), _k("Feature"),
+        _k("id"), CoolingSite.id,
+        _k("geometry"), cast(func.ST_AsGeoJSON(CoolingSite.geom), JSON),
+        _k("properties"), props,
     )
-    res = session.execute(q_within).all()
-    if res:
-        # 將結果從遠到近排序
-        features = [_row_to_feature(r, include_distance=True) for r in reversed(res)]
-        return {"type": "FeatureCollection", "features": features}
-
-    # 半徑內沒有 → 退回全域最近（KNN）再計距離
-    q_knn = (
-        select(
-            CoolingSite,
-            func.ST_AsGeoJSON(CoolingSite.geom).label("geom_json"),
-            func.ST_Distance(func.Geography(CoolingSite.geom), func.Geography(pt)).label("distance_m"),
-        )
-        .where(CoolingSite.geom.isnot(None))
-        .order_by(CoolingSite.geom.op("<->")(pt))
-        .limit(limit)
+
+def _page_body(features: Optional[str], more: bool, last_id: Optional[int]) -> bytes:
+    nxt = encode_cursor(last_id) if more and last_id is not None else None
+    return (b'{"type":"FeatureCollection","features":' + (features or "[]").encode("utf-8")
+            + b',"next":' + dumps(nxt) + b"}")
+
+def cooling_sites_page_body(session, limit: int = 600, offset: int = 0, amenities: int = 0) -> bytes:
+    """
+    /sites 快照用的已編碼 FeatureCollection。
+    GEOJSON_BUILD=db：一個查詢由 json_agg 組好 features 文字，Python 只接上外框與 next。
+    """
+    if json_codec.GEOJSON_BUILD != "db":
+        return dumps(list_cooling_sites_geojson(session, limit=limit, offset=offset, amenities=amenities))
+    # 多抓一筆判斷是否還有下一頁；rn 在 LIMIT 之後才編號
+    page = _sites_query(limit + 1, offset=offset, amenities=amenities,
+                        columns=(CoolingSite.id.label("id"), _feature_json().label("f"))).subquery("page")
+    ranked = select(page.c.id, page.c.f, func.row_number().over(order_by=page.c.id).label("rn")).subquery("ranked")
+    in_page = ranked.c.rn <= limit
+    q = select(
+        cast(func.json_agg(aggregate_order_by(ranked.c.f, ranked.c.id)).filter(in_page), Text),
+        func.count(),
+        func.max(ranked.c.id).filter(in_page),
     )
-    res2 = session.execute(q_knn).all()
-    if res2:
-        # 將結果從遠到近排序
-        features = [_row_to_feature(r, include_distance=True) for r in reversed(res2)]
-        return {"type": "FeatureCollection", "features": features}
-
-    # 沒資料：回空集合（符合規格）
-    return {"type": "FeatureCollection", "features": []}
+    features, n, last_id = session.execute(q).one()
+    return _page_body(features, n > limit, last_id)
+
+def iter_cooling_sites_geojson(session, limit: int, after_id: Optional[int] = None,
+                               bbox: Optional[BBox] = None, amenities: int = 0,
+                               open_minute: Optional[int] = None, offset: int = 0) -> Iterator[str]:
+    """
+    串流版 FeatureCollection：server-side cursor（yield_per）一批批讀，
+    每讀到一列就輸出一個 feature，記憶體用量與 limit 無關。
+    GEOJSON_BUILD=db 時每列的 feature 文字由 PostGIS 產生，直接輸出。
+    """
+    db_build = json_codec.GEOJSON_BUILD == "db"
+    columns = (CoolingSite.id, cast(_feature_json(), Text)) if db_build else None
+    q = (_sites_query(limit + 1, after_id, bbox, offset, amenities=amenities, columns=columns,
+                      open_minute=open_minute)
+         .execution_options(yield_per=STREAM_BATCH_ROWS))
+    yield '{"type":"FeatureCollection","features":['
+    n, last_id, more = 0, None, False
+    for row in session.execute(q):
+        if n == limit:
+            more = True
+            break
+        if db_build:
+            last_id, feat = row
+        else:
+            last_id, feat = row[0].id, dumps_str(_row_to_feature(row, include_distance=False))
+        yield feat if n == 0 else "," + feat
+        n += 1
+    nxt = dumps_str(encode_cursor(last_id)) if more and last_id is not None else "null"
+    yield '],"next":' + nxt + '}'
+
+def nearest_cooling_site_geojson(session, lat: float, lon: float, radius_m: float = 1000.0, limit: int = 1,
+                                 amenities: int = 0, open_minute: Optional[int] = None) -> Dict[str, Any]:
+    """
+    預設用記憶體索引；索引無法載入時退回 PostGIS。
+    amenities（AMENITY_BITS 遮罩）與 open_minute（週分鐘，只取當下開放的）在搜尋時就套用：
+    記憶體版查符合條件的子樹 / 點，PostGIS 版在 KNN 索引掃描中過濾，
+    兩者都直接回傳符合條件的真正最近 limit 筆。
+    """
+    if NEAREST_BACKEND != "postgis":
+        try:
+            idx = get_point_index(session, "cooling_sites")
+            if len(idx):
+                return _nearest_from_index(idx, lat, lon, radius_m, limit, amenities, open_minute)
+        except Exception:
+            log.exception("cooling site point index unavailable; falling back to PostGIS")
+            session.rollback()
+    return _nearest_postgis(session, lat, lon, radius_m, limit, amenities, open_minute)
+
+def _nearest_from_index(idx: PointIndex, lat: float, lon: float, radius_m: float, limit: int,
+                        amenities: int = 0, open_minute: Optional[int] = None) -> Dict[str, Any]:
+    where = idx.open_at(open_minute) if open_minute is not None else None
+    pos, dist = idx.knn(lat, lon, limit, mask=amenities, where=where)
+    # 與 PostGIS 版相同：半徑內有的話只回半徑內，否則回全域最近
+    keep = dist <= radius_m
+    if keep.any():
+        pos, dist = pos[keep], dist[keep]
+    features = []
+    for i, d in zip(reversed(pos.tolist()), reversed(dist.tolist())):  # 從遠到近
+        props = idx.row(i)
+        props["distance_m"] = d
+        features.append({
+            "type": "Feature",
+            "id": props["id"],
+            "geometry": idx.point(i),
+            "properties": props,
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+def _nearest_postgis(session, lat: float, lon: float, radius_m: float = 1000.0, limit: int = 1,
+                     amenities: int = 0, open_minute: Optional[int] = None) -> Dict[str, Any]:
+    # 一次查出最近的 limit 筆（KNN 候選 + geography 距離重排）
+    where = [_amenity_filter(amenities)] if amenities else []
+    if open_minute is not None:
+        where.append(_open_filter(open_minute))
+    res = nearest_rows(session, CoolingSite, lat=lat, lon=lon, limit=limit, where=where)
+
+    # 半徑內有的話只回半徑內；沒有 → 退回全域最近
+    within = [r for r in res if r[2] is not None and float(r[2]) <= radius_m]
+    rows = within or res
+
+    # 將結果從遠到近排序；沒資料則回空集合（符合規格）
+    features = [_row_to_feature(r, include_distance=True) for r in reversed(rows)]
+    return {"type": "FeatureCollection", "features": features}
@@ -0,0 +1,69 @@
+# backend/services/device_service.py
+"""
+裝置 token 註冊：一律單一 INSERT ... ON CONFLICT (fcm_token) DO UPDATE。
+
+- 單筆：一次 round trip，同一 token 同時註冊也不會撞 unique 變成 500
+- 批次：unnest 陣列參數，幾千筆仍是一個 statement
+- 有帶位置時記下所在行政區（last_district），給行政區推播用
+"""
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+MAX_BATCH = int(os.getenv("DEVICE_REGISTER_MAX_BATCH", "10000"))
+
+# 沒帶行政區時保留原本的 last_district
+_ON_CONFLICT = """
+    ON CONFLICT (fcm_token) DO UPDATE
+       SET user_id = EXCLUDED.user_id,
+           platform = EXCLUDED.platform,
+           last_district = COALESCE(EXCLUDED.last_district, device_tokens.last_district),
+           district_updated_at = COALESCE(EXCLUDED.district_updated_at, device_tokens.district_updated_at),
+           updated_at = now()
+"""
+
+_UPSERT_ONE = text("""
+    INSERT INTO device_tokens (fcm_token, user_id, platform, last_district, district_updated_at)
+    VALUES (:token, :user_id, :platform, CAST(:district AS text),
+            CASE WHEN CAST(:district AS text) IS NULL THEN NULL ELSE now() END)
+""" + _ON_CONFLICT)
+
+# xmax = 0 表示這列是新插入的（被 ON CONFLICT 更新的列 xmax 為目前交易）
+_UPSERT_MANY = text("""
+    INSERT INTO device_tokens (fcm_token, user_id, platform, last_district, district_updated_at)
+    SELECT t, u, p, d, CASE WHEN d IS NULL THEN NULL ELSE now() END
+      FROM unnest(CAST(:tokens AS text[]), CAST(:user_ids AS text[]),
+                  CAST(:platforms AS text[]), CAST(:districts AS text[])) AS x(t, u, p, d)
+""" + _ON_CONFLICT + """
+    RETURNING (xmax = 0) AS inserted
+""")
+
+Device = Tuple[str, Optional[str], Optional[str], Optional[str]]   # (fcm_token, user_id, platform, district)
+
+
+def register_device(session: Session, token: str, user_id: Optional[str], platform: Optional[str],
+                    district: Optional[str] = None) -> None:
+    session.execute(_UPSERT_ONE, {"token": token, "user_id": user_id, "platform": platform, "district": district})
+    session.commit()
+
+
+def register_devices(session: Session, devices: List[Device]) -> Dict[str, Any]:
+    """
+    批次 upsert；同一批內重複的 token 以最後一筆為準
+    （同一個 INSERT ... ON CONFLICT 不能更新同一列兩次）。
+    """
+    latest: Dict[str, Device] = {}
+    for d in devices:
+        latest[d[0]] = d
+    rows = list(latest.values())
+    if not rows:
+        return {"received": len(devices), "inserted": 0, "updated": 0}
+    tokens, user_ids, platforms, districts = (list(col) for col in zip(*rows))
+    inserted = session.execute(
+        _UPSERT_MANY, {"tokens": tokens, "user_ids": user_ids, "platforms": platforms, "districts": districts}
+    ).scalars().all()
+    session.commit()
+    n_new = sum(1 for x in inserted if x)
+    return {"received": len(devices), "inserted": n_new, "updated": len(inserted) - n_new}
@@ -0,0 +1,63 @@
+# backend/services/district_boundaries.py
+"""
+地圖用的行政區邊界：依 zoom 選簡化程度，回傳預先算好的 FeatureCollection。
+
+- 簡化與 GeoJSON 都在匯入時算好（importer/districts.py），請求時只讀 12 列文字
+- 容差約為該 tier 最大 zoom 下 1 像素（台北緯度約 141,900 / 2^z 公尺）
+- 各區各自 ST_SimplifyPreserveTopology，低 tier 相鄰區界可能有細縫，地圖顯示無妨
+- 以 geojson_snapshot 快取（ETag / gzip / br），表重建後自動失效
+"""
+import json
+from typing import Any, Dict, NamedTuple, Optional
+
+from sqlalchemy import select
+
+from models import TaipeiDistrictBoundary
+from services.geojson_snapshot import Snapshot, get_store
+
+
+class Tier(NamedTuple):
+    tier: int
+    max_zoom: Optional[int]     # None = 以上全部
+    tolerance_deg: float
+    precision: int              # GeoJSON 座標小數位數
+
+
+TIERS = (
+    Tier(0, 11, 0.0007, 4),     # 全市總覽：~70m
+    Tier(1, 14, 0.0001, 5),     # 行政區：~10m
+    Tier(2, None, 0.00002, 6),  # 街廓：~2m
+)
+
+_store = get_store(TaipeiDistrictBoundary.__tablename__, "application/geo+json")
+
+
+def tier_for_zoom(zoom: int) -> Tier:
+    for t in TIERS:
+        if t.max_zoom is None or zoom <= t.max_zoom:
+            return t
+    return TIERS[-1]
+
+
+def _build(session, tier: Tier) -> Dict[str, Any]:
+    rows = session.execute(
+        select(TaipeiDistrictBoundary.district_id, TaipeiDistrictBoundary.city_name,
+               TaipeiDistrictBoundary.district_name, TaipeiDistrictBoundary.geojson)
+        .where(TaipeiDistrictBoundary.tier == tier.tier)
+        .order_by(TaipeiDistrictBoundary.district_id)
+    ).all()
+    return {
+        "type": "FeatureCollection",
+        "tier": tier.tier,
+        "tolerance_deg": tier.tolerance_deg,
+        "features": [
+            {"type": "Feature", "id": r.district_id, "geometry": json.loads(r.geojson),
+             "properties": {"city": r.city_name, "district": r.district_name}}
+            for r in rows
+        ],
+    }
+
+
+def boundaries_snapshot(session, zoom: int) -> Snapshot:
+    tier = tier_for_zoom(zoom)
+    return _store.get(session, tier.tier, lambda: _build(session, tier))
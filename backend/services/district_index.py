@@ -0,0 +1,155 @@
+# backend/services/district_index.py
+"""
+行政區判斷的記憶體索引（取代每次請求打 3 次 PostGIS）。
+
+- 啟動後第一次查詢時，把 taipei_districts 的多邊形一次載入
+- 以 shapely STRtree 做 bbox 篩選 + prepared geometry 做 contains
+- 判斷順序與 SQL 版相同：contains → 50m 容錯 → 最近（knn）
+- 每 DISTRICT_INDEX_CHECK_SEC 秒檢查一次表指紋，表被重新匯入就重建
+"""
+import math
+import os
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely import wkb
+from shapely.geometry import Point
+from shapely.ops import nearest_points
+from sqlalchemy import select, func
+
+from models import TaipeiDistrict
+from services.metrics import cache_counter
+from services.table_version import table_fingerprint, Fingerprint
+
+NEAR_TOLERANCE_M = 50.0
+EARTH_RADIUS_M = 6371008.8
+M_PER_DEG_LAT = 111320.0
+
+CHECK_INTERVAL_SEC = float(os.getenv("DISTRICT_INDEX_CHECK_SEC", "60"))
+
+
+def _haversine_m(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class DistrictIndex:
+    """不可變的行政區索引；重建時整個換掉，讀取端不需要鎖。"""
+
+    def __init__(self, rows: List[Tuple[str, str, object]], fingerprint: Optional[Fingerprint]):
+        self.cities = [r[0] for r in rows]
+        self.districts = [r[1] for r in rows]
+        self.geoms = [r[2] for r in rows]
+        for g in self.geoms:
+            shapely.prepare(g)
+        self.tree = shapely.STRtree(self.geoms)
+        self.fingerprint = fingerprint
+
+    def __len__(self) -> int:
+        return len(self.geoms)
+
+    def _hit(self, i: int, method: str) -> dict:
+        return {"city": self.cities[i], "district": self.districts[i], "method": method}
+
+    def resolve(self, lat: float, lon: float) -> Optional[dict]:
+        if not self.geoms:
+            return None
+        pt = Point(lon, lat)
+
+        # 1) 嚴格包含（bbox 候選 → prepared contains）
+        for i in self.tree.query(pt):
+            if self.geoms[i].contains(pt):
+                return self._hit(int(i), "contains")
+
+        # 2) 邊界容錯：50m 換算成度數的外框取候選，再以球面距離排序
+        dlat = NEAR_TOLERANCE_M / M_PER_DEG_LAT
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        box = shapely.box(lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+        best, best_d = None, None
+        for i in self.tree.query(box):
+            q = nearest_points(self.geoms[i], pt)[0]
+            d = _haversine_m(lon, lat, q.x, q.y)
+            if d <= NEAR_TOLERANCE_M and (best_d is None or d < best_d):
+                best, best_d = int(i), d
+        if best is not None:
+            return self._hit(best, "nearest<50m")
+
+        # 3) 最近（與 PostGIS `<->` 相同，以度為單位的平面距離）
+        i = self.tree.nearest(pt)
+        if i is None:
+            return None
+        return self._hit(int(i), "knn")
+
+    def resolve_many(self, lats: Sequence[float], lons: Sequence[float]) -> List[Optional[dict]]:
+        """批次版：contains 以 STRtree 一次查完，沒命中的點再逐一走容錯/KNN。"""
+        n = len(lats)
+        out: List[Optional[dict]] = [None] * n
+        if not self.geoms or n == 0:
+            return out
+        pts = shapely.points(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        src, dst = self.tree.query(pts, predicate="within")
+        for p, g in zip(src.tolist(), dst.tolist()):
+            if out[p] is None:
+                out[p] = self._hit(g, "contains")
+        for p in range(n):
+            if out[p] is None:
+                out[p] = self.resolve(float(lats[p]), float(lons[p]))
+        return out
+
+
+_index: Optional[DistrictIndex] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+_hits = cache_counter("district_index", "hit")
+_reloads = cache_counter("district_index", "reload")
+
+
+def _load(session, fingerprint: Optional[Fingerprint]) -> DistrictIndex:
+    q = select(
+        TaipeiDistrict.city_name,
+        TaipeiDistrict.district_name,
+        func.ST_AsBinary(TaipeiDistrict.geom),
+    ).where(TaipeiDistrict.geom.isnot(None))
+    rows = [(c, d, wkb.loads(bytes(g))) for c, d, g in session.execute(q).all()]
+    return DistrictIndex(rows, fingerprint)
+
+
+def get_index(session) -> DistrictIndex:
+    """取得目前的索引；第一次呼叫或超過檢查間隔時才會碰資料庫。"""
+    global _index, _checked_at
+    idx = _index
+    if idx is not None and time.monotonic() - _checked_at < CHECK_INTERVAL_SEC:
+        _hits.inc()
+        return idx
+
+    with _lock:
+        if _index is not None and time.monotonic() - _checked_at < CHECK_INTERVAL_SEC:
+            return _index
+        fp = table_fingerprint(session, TaipeiDistrict.__tablename__)
+        if _index is None or _index.fingerprint != fp:
+            _reloads.inc()
+            _index = _load(session, fp)
+        _checked_at = time.monotonic()
+        return _index
+
+
+def peek() -> Optional[DistrictIndex]:
+    """不碰資料庫：索引已載入且仍在檢查間隔內才回傳，否則 None（給 async 路徑判斷是否要換 thread 重載）。"""
+    idx = _index
+    if idx is not None and time.monotonic() - _checked_at < CHECK_INTERVAL_SEC:
+        return idx
+    return None
+
+
+def invalidate() -> None:
+    """強制下次查詢重新檢查並載入（例如匯入腳本跑完後）。"""
+    global _checked_at, _index
+    with _lock:
+        _index = None
+        _checked_at = 0.0
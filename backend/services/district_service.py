@@ -1,25 +1,171 @@
 # backend/services/district_service.py
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional, Sequence
+
 from sqlalchemy import select, func, text
-from models import TaipeiDistrict
+from db import SessionLocal
+from models import TaipeiDistrict, TaipeiDistrictPart
+from services import district_index
+from services.table_version import table_fingerprint
+
+log = logging.getLogger(__name__)
+
+# memory（預設）：記憶體 STRtree；postgis：每次查詢都打資料庫
+DISTRICT_RESOLVER = os.getenv("DISTRICT_RESOLVER", "memory").lower()
+# 小塊表是否還對得上 taipei_districts：每隔幾秒才重查一次
+PARTS_CHECK_SEC = float(os.getenv("DISTRICT_PARTS_CHECK_SEC", "30"))
+
+_parts_checked_at = 0.0
+_parts_ok = False
+
 
 def resolve_district(session, lat: float, lon: float) -> dict | None:
     """
     回傳：
       {"city": ..., "district": ..., "method": "..."} 或 None
-    查詢邏輯：
-      1) ST_Contains
-      2) 50m 內最近（geography 距離）
-      3) KNN (<->) 最近
+    查詢邏輯（兩種模式皆同）：
+      1) contains
+      2) 50m 內最近（球面距離）
+      3) KNN 最近
+    記憶體索引載入失敗或為空時，自動退回 PostGIS。
+    """
+    if DISTRICT_RESOLVER != "postgis":
+        try:
+            idx = district_index.get_index(session)
+            if len(idx):
+                return idx.resolve(lat, lon)
+        except Exception:
+            log.exception("district index unavailable; falling back to PostGIS")
+            session.rollback()
+    return _resolve_district_postgis(session, lat, lon)
+
+
+def resolve_districts(session, lats: Sequence[float], lons: Sequence[float]) -> List[Optional[dict]]:
+    """
+    批次版 resolve_district（與輸入等長）：同一個 DISTRICT_RESOLVER 開關；
+    PostGIS 模式（或記憶體索引不可用）時一次 unnest + LATERAL 查完，不逐點來回。
+    """
+    if DISTRICT_RESOLVER != "postgis":
+        try:
+            idx = district_index.get_index(session)
+            if len(idx):
+                return idx.resolve_many(lats, lons)
+        except Exception:
+            log.exception("district index unavailable; falling back to PostGIS")
+            session.rollback()
+    return _resolve_districts_postgis(session, lats, lons)
+
+
+def get_district_by_point(session, lat: float, lon: float) -> Optional[str]:
+    """只回傳行政區名稱（給熱傷害、溫差等服務共用）。"""
+    hit = resolve_district(session, lat, lon)
+    return hit["district"] if hit else None
+
+
+async def aget_district_by_point(session_factory, lat: float, lon: float) -> Optional[str]:
+    """
+    async 版（ASGI 模式）：
+    - 記憶體索引已就緒 → 直接在 event loop 上判斷（微秒級）
+    - 索引需要（重新）載入 → 丟到 thread 用同步 session 載入（每 DISTRICT_INDEX_CHECK_SEC 最多一次；
+      索引的鎖是 threading.Lock，不能在 event loop 上等）
+    - DISTRICT_RESOLVER=postgis → 以 AsyncSession 跑原本的三段查詢
     """
+    if DISTRICT_RESOLVER != "postgis":
+        idx = district_index.peek()
+        if idx is None:
+            return await asyncio.to_thread(_get_district_in_thread, lat, lon)
+        if len(idx):
+            hit = idx.resolve(lat, lon)
+            return hit["district"] if hit else None
+    async with session_factory() as s:
+        hit = await s.run_sync(_resolve_district_postgis, lat, lon)
+    return hit["district"] if hit else None
+
+
+def _get_district_in_thread(lat: float, lon: float) -> Optional[str]:
+    s = SessionLocal()
+    try:
+        return get_district_by_point(s, lat, lon)
+    finally:
+        SessionLocal.remove()
+
+
+def _resolve_district_postgis(session, lat: float, lon: float) -> dict | None:
+    """
+    PostGIS 三段查詢（fallback 模式）。
+    小塊表（ST_Subdivide 小塊 + 預存 geography，每次只測幾十個頂點）可用時先走它；
+    表不存在、或建表時記下的 taipei_districts 指紋已過期（SHP 重匯後沒重建）時只用整塊多邊形。
+    """
+    hit = None
+    if _parts_usable(session):
+        hit = _resolve_on(session, TaipeiDistrictPart, TaipeiDistrictPart.geom, TaipeiDistrictPart.geog, lat, lon)
+    if hit is None:
+        hit = _resolve_on(session, TaipeiDistrict, TaipeiDistrict.geom,
+                          func.Geography(TaipeiDistrict.geom), lat, lon)
+    return hit
+
+
+def _parts_usable(session) -> bool:
+    """taipei_district_parts 存在，且 db/13 記下的來源指紋與 taipei_districts 目前一致。"""
+    global _parts_checked_at, _parts_ok
+    if time.monotonic() - _parts_checked_at < PARTS_CHECK_SEC:
+        return _parts_ok
+    ok = False
+    if (session.execute(text("SELECT to_regclass('taipei_district_parts')")).scalar() is not None
+            and session.execute(text("SELECT to_regclass('taipei_district_derived_source')")).scalar() is not None):
+        built = session.execute(text(
+            "SELECT source_oid, source_rows, source_xmin FROM taipei_district_derived_source"
+        )).first()
+        current = table_fingerprint(session, "taipei_districts")
+        ok = built is not None and tuple(int(v) for v in built) == current
+        if not ok:
+            log.warning("taipei_district_parts is stale (built from %s, now %s); "
+                        "run `python -m importer districts`", built and tuple(built), current)
+    _parts_ok, _parts_checked_at = ok, time.monotonic()
+    return ok
+
+
+# 每個點同 _resolve_on 的三段：contains → 50m 內最近 → KNN；UNION ALL + LIMIT 1 依序執行，前一段有結果就不跑後面
+_LATERAL_SQL = """
+SELECT u.ord - 1 AS i, d.city_name, d.district_name, d.method
+FROM unnest(CAST(:lats AS double precision[]), CAST(:lons AS double precision[]))
+     WITH ORDINALITY AS u(lat, lon, ord)
+CROSS JOIN LATERAL (SELECT ST_SetSRID(ST_Point(u.lon, u.lat), 4326) AS pt) p
+CROSS JOIN LATERAL (
+  (SELECT city_name, district_name, 'contains' AS method FROM {table}
+    WHERE ST_Contains(geom, p.pt) LIMIT 1)
+  UNION ALL
+  (SELECT city_name, district_name, 'nearest<50m' FROM {table}
+    WHERE ST_DWithin({geog}, p.pt::geography, 50.0) ORDER BY ST_Distance({geog}, p.pt::geography) LIMIT 1)
+  UNION ALL
+  (SELECT city_name, district_name, 'knn' FROM {table} ORDER BY geom <-> p.pt LIMIT 1)
+  LIMIT 1
+) d
+"""
+
+
+def _resolve_districts_postgis(session, lats: Sequence[float], lons: Sequence[float]) -> List[Optional[dict]]:
+    if _parts_usable(session):
+        sql = _LATERAL_SQL.format(table=TaipeiDistrictPart.__tablename__, geog="geog")
+    else:
+        sql = _LATERAL_SQL.format(table=TaipeiDistrict.__tablename__, geog="geom::geography")
+    out: List[Optional[dict]] = [None] * len(lats)
+    rows = session.execute(text(sql), {"lats": list(lats), "lons": list(lons)}).mappings()
+    for r in rows:
+        out[r["i"]] = {"city": r["city_name"], "district": r["district_name"], "method": r["method"]}
+    return out
+
+
+def _resolve_on(session, model, geom, geog, lat: float, lon: float) -> dict | None:
+    pt = func.ST_SetSRID(func.ST_Point(lon, lat), 4326)
+
     # 1) 嚴格包含
     q_contains = (
-        select(TaipeiDistrict.city_name, TaipeiDistrict.district_name)
-        .where(
-            func.ST_Contains(
-                TaipeiDistrict.geom,
-                func.ST_SetSRID(func.ST_Point(lon, lat), 4326)
-            )
-        )
+        select(model.city_name, model.district_name)
+        .where(func.ST_Contains(geom, pt))
         .limit(1)
     )
     hit = session.execute(q_contains).first()
@@ -28,20 +174,9 @@ def resolve_district(session, lat: float, lon: float) -> dict | None:
 
     # 2) 邊界容錯（50m 內最近）
     q_near = (
-        select(TaipeiDistrict.city_name, TaipeiDistrict.district_name)
-        .where(
-            func.ST_DWithin(
-                func.Geography(TaipeiDistrict.geom),
-                func.Geography(func.ST_SetSRID(func.ST_Point(lon, lat), 4326)),
-                50.0
-            )
-        )
-        .order_by(
-            func.ST_Distance(
-                func.Geography(TaipeiDistrict.geom),
-                func.Geography(func.ST_SetSRID(func.ST_Point(lon, lat), 4326))
-            )
-        )
+        select(model.city_name, model.district_name)
+        .where(func.ST_DWithin(geog, func.Geography(pt), 50.0))
+        .order_by(func.ST_Distance(geog, func.Geography(pt)))
         .limit(1)
     )
     near = session.execute(q_near).first()
@@ -50,10 +185,8 @@ def resolve_district(session, lat: float, lon: float) -> dict | None:
 
     # 3) KNN 最近（使用 ORM 的 .op("<->")，避免文字參數冒號錯誤）
     q_knn = (
-        select(TaipeiDistrict.city_name, TaipeiDistrict.district_name)
-        .order_by(
-            TaipeiDistrict.geom.op("<->")(func.ST_SetSRID(func.ST_Point(lon, lat), 4326))
-        )
+        select(model.city_name, model.district_name)
+        .order_by(geom.op("<->")(pt))
         .limit(1)
     )
     nn = session.execute(q_knn).first()
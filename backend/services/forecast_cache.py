@@ -0,0 +1,229 @@
+# backend/services/forecast_cache.py
+"""
+CWA 縣市資料集的共用快取（熱傷害 M-A0085-001、溫差 F-A0085-005）。
+
+- 每個資料集每 CWA_CACHE_TTL_SEC 秒最多向上游抓一次整個臺北市
+- 兩次整包之間每 CWA_PROBE_SEC 秒只抓一個行政區（TownName 過濾，約 1/12 大小）比對最新 IssueTime；
+  有新的一批就提早抓整包，沒有就延長到下一次探測
+- 依 TownName 建好索引（forecast 已排序），所有行政區都從記憶體回
+- 同時多個 miss 只會有一個請求打上游，其他人等結果
+- 過期後先回舊資料，背景 thread 去更新
+- 新資料的 IssueTime 與舊的相同時，沿用舊索引（不重建）
+- get() 給 Flask（thread），aget() 給 ASGI 模式（coroutine）
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import requests
+
+from services.metrics import cache_counter, upstream_timer
+
+log = logging.getLogger(__name__)
+
+CWA_CACHE_TTL_SEC = float(os.getenv("CWA_CACHE_TTL_SEC", "600"))
+CWA_RETRY_SEC = float(os.getenv("CWA_RETRY_SEC", "30"))
+CWA_PROBE_SEC = float(os.getenv("CWA_PROBE_SEC", "120"))       # 0 = 不探測，只靠 TTL
+CWA_PROBE_TOWN = os.getenv("CWA_PROBE_TOWN", "中正區")
+# 壓測 / 本機假 CWA 用
+CWA_BASE_URL = os.getenv("CWA_BASE_URL", "https://opendata.cwa.gov.tw").rstrip("/")
+
+TownIndex = Dict[str, List[Dict[str, Any]]]
+# parse(payload) -> (issue_key, {town_name: forecasts})
+ParseFn = Callable[[Dict[str, Any]], Tuple[Optional[str], TownIndex]]
+
+
+def iter_county_towns(data: Dict[str, Any], county: str = "臺北市"):
+    """走訪 records.Locations[CountyName=county].Location[]，回傳 (TownName, Time[])。"""
+    records = (data or {}).get("records", {}) or {}
+    for loc in records.get("Locations", []) or []:
+        if (loc.get("CountyName") or "").strip() == county:
+            for sub in loc.get("Location", []) or []:
+                yield (sub.get("TownName") or "").strip(), sub.get("Time", []) or []
+
+
+def _latest_issue(forecasts: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+    return max((f["issue_time"] for f in forecasts or () if f.get("issue_time")), default=None)
+
+
+class CountyForecastCache:
+    def __init__(self, name: str, url: str, params: Dict[str, str], parse: ParseFn,
+                 ttl: float = CWA_CACHE_TTL_SEC, probe: float = CWA_PROBE_SEC):
+        self.name = name
+        self.url = url
+        self.params = params
+        self.parse = parse
+        self.ttl = ttl
+        self.probe = probe if 0 < probe < ttl else 0.0
+
+        self._lock = threading.Lock()
+        self._index: Optional[TownIndex] = None
+        self._issue_key: Optional[str] = None
+        self._expires_at = 0.0
+        self._full_expires_at = 0.0        # 超過就一定抓整包（探測只延長到這裡為止）
+        self._inflight: Optional[threading.Event] = None
+        self._error: Optional[BaseException] = None
+        self._afuture: Optional["asyncio.Future[None]"] = None
+        self._hits = cache_counter(f"cwa_{name}", "hit")
+        self._stale = cache_counter(f"cwa_{name}", "stale")
+        self._misses = cache_counter(f"cwa_{name}", "miss")
+
+    # ---- 上游 ----
+    def _request_params(self) -> Dict[str, str]:
+        api_key = os.getenv("CWA_API_KEY")
+        if not api_key:
+            raise RuntimeError("CWA_API_KEY not set")
+        return {"Authorization": api_key, **self.params}
+
+    def fetch(self) -> Tuple[Optional[str], TownIndex]:
+        """直接打上游並解析（不經快取；forecast_store 的 refresher 也用這個）。"""
+        return self.parse(self._get(self._request_params()))
+
+    def _get(self, params: Dict[str, str]) -> Dict[str, Any]:
+        with upstream_timer(f"cwa_{self.name}") as t:
+            r = requests.get(self.url, params=params, timeout=10)
+            t.status = r.status_code
+        r.raise_for_status()
+        return r.json() or {}
+
+    def _probe_unchanged(self) -> bool:
+        """只抓 CWA_PROBE_TOWN 一區；該區最新 IssueTime 與快取相同回傳 True。"""
+        with self._lock:
+            cached = _latest_issue(self._index.get(CWA_PROBE_TOWN)) if self._index is not None else None
+        if cached is None:
+            return False
+        _, index = self.parse(self._get({**self._request_params(), "TownName": CWA_PROBE_TOWN}))
+        return _latest_issue(index.get(CWA_PROBE_TOWN)) == cached
+
+    async def _afetch(self) -> Tuple[Optional[str], TownIndex]:
+        with upstream_timer(f"cwa_{self.name}") as t:
+            async with httpx.AsyncClient(timeout=10) as client:
+                r = await client.get(self.url, params=self._request_params())
+            t.status = r.status_code
+        r.raise_for_status()
+        return self.parse(r.json() or {})
+
+    def _store(self, issue_key: Optional[str], index: TownIndex) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._index is None or issue_key is None or issue_key != self._issue_key:
+                self._index, self._issue_key = index, issue_key
+            self._full_expires_at = now + self.ttl
+            self._expires_at = now + (self.probe or self.ttl)
+            self._error = None
+
+    def _extend(self) -> None:
+        with self._lock:
+            self._expires_at = min(self._full_expires_at, time.monotonic() + self.probe)
+
+    def _fail(self, e: BaseException) -> None:
+        log.warning("CWA %s refresh failed: %s", self.name, e)
+        with self._lock:
+            self._error = e
+            # 失敗後短暫退避，避免每個請求都再打一次上游
+            self._expires_at = time.monotonic() + min(self.ttl, CWA_RETRY_SEC)
+
+    def _finish(self, done: threading.Event) -> None:
+        with self._lock:
+            self._inflight = None
+        done.set()
+
+    def _refresh(self, done: threading.Event) -> None:
+        try:
+            if self.probe and time.monotonic() < self._full_expires_at and self._probe_unchanged():
+                self._extend()
+            else:
+                self._store(*self.fetch())
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._finish(done)
+
+    def _begin(self) -> Tuple[Optional[TownIndex], Optional[threading.Event], bool, Optional[TownIndex]]:
+        """回傳 (fresh, done, leader, stale)；fresh 非 None 時直接用。"""
+        with self._lock:
+            if self._index is not None and time.monotonic() < self._expires_at:
+                self._hits.inc()
+                return self._index, None, False, None
+            (self._stale if self._index is not None else self._misses).inc()
+            if self._index is None and self._error is not None and time.monotonic() < self._expires_at:
+                raise self._error
+            done = self._inflight
+            leader = done is None
+            if leader:
+                done = self._inflight = threading.Event()
+            return None, done, leader, self._index
+
+    def _start_background(self, done: threading.Event) -> None:
+        threading.Thread(target=self._refresh, args=(done,), daemon=True,
+                         name=f"cwa-refresh-{self.name}").start()
+
+    def _result(self) -> TownIndex:
+        with self._lock:
+            if self._index is not None:
+                return self._index
+            err = self._error
+        raise err or RuntimeError(f"CWA {self.name} not available")
+
+    # ---- 對外 ----
+    def get(self) -> TownIndex:
+        fresh, done, leader, stale = self._begin()
+        if fresh is not None:
+            return fresh
+
+        if stale is not None:
+            # 有舊資料：直接回，必要時由背景更新
+            if leader:
+                self._start_background(done)
+            return stale
+
+        # 冷啟動：第一個請求去抓，其餘等它
+        if leader:
+            self._refresh(done)
+        else:
+            done.wait(timeout=15)
+        return self._result()
+
+    async def aget(self) -> TownIndex:
+        """async 版（ASGI 模式）：冷啟動時以 httpx 抓取，等待者只佔 coroutine。"""
+        fresh, done, leader, stale = self._begin()
+        if fresh is not None:
+            return fresh
+
+        if stale is not None:
+            if leader:
+                self._start_background(done)
+            return stale
+
+        if leader:
+            self._afuture = asyncio.get_running_loop().create_future()
+            try:
+                self._store(*(await self._afetch()))
+            except Exception as e:
+                self._fail(e)
+            finally:
+                fut, self._afuture = self._afuture, None
+                self._finish(done)
+                fut.set_result(None)
+        elif self._afuture is not None:
+            await asyncio.wait_for(asyncio.shield(self._afuture), timeout=15)
+        else:
+            # 由同步端（thread）負責抓取中
+            await asyncio.get_running_loop().run_in_executor(None, done.wait, 15)
+        return self._result()
+
+    def get_town(self, town_name: str) -> Optional[List[Dict[str, Any]]]:
+        return self.get().get((town_name or "").strip())
+
+    async def aget_town(self, town_name: str) -> Optional[List[Dict[str, Any]]]:
+        return (await self.aget()).get((town_name or "").strip())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index = None
+            self._issue_key = None
+            self._expires_at = self._full_expires_at = 0.0
@@ -0,0 +1,191 @@
+# backend/services/forecast_store.py
+"""
+CWA 預報落地（heat_forecasts / tempdiff_forecasts）。
+
+- 背景 refresher 每 CWA_REFRESH_SEC 秒抓一次整個臺北市，只 upsert 新增或數值有變的列
+- 多個 replica：先以 cwa_forecast_sync.checked_at 搶這一輪（單句 upsert，搶到才打上游），
+  抓回來後才開交易、拿 advisory lock 比對 issue_key 並 upsert；等上游時不佔連線與鎖
+- 路由一次索引查詢：(district, issue_time >= 最新一批的起點)；舊列留著做分析
+- 表內沒有該區時（剛部署、refresher 關閉）由呼叫端退回 forecast_cache 的即時抓取
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import Text, bindparam, or_, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from models import CwaForecastSync
+from services.forecast_cache import CountyForecastCache, TownIndex
+
+log = logging.getLogger(__name__)
+
+CWA_REFRESH_SEC = float(os.getenv("CWA_REFRESH_SEC", "600"))
+
+# (town, forecast dict) -> 一列（None = 略過，例如時間解析失敗）
+ToRow = Callable[[str, Dict[str, Any]], Optional[Dict[str, Any]]]
+# 資料表的一列 -> API 回傳的 forecast dict
+FromRow = Callable[[Any], Dict[str, Any]]
+
+STORES: List["ForecastStore"] = []
+
+
+class ForecastStore:
+    def __init__(self, cache: CountyForecastCache, model, to_row: ToRow, from_row: FromRow):
+        self.name = cache.name
+        self.cache = cache
+        self.model = model
+        self.to_row = to_row
+        self.from_row = from_row
+        self._value_cols = [c.name for c in model.__table__.columns
+                            if c.name not in ("district", "issue_time", "created_at", "updated_at")]
+        self._sync = CwaForecastSync.__table__
+        STORES.append(self)
+        self._town_query = (
+            select(model)
+            .where(model.district == bindparam("district", type_=Text))
+            .where(model.issue_time >= select(self._sync.c.window_start)
+                   .where(self._sync.c.dataset == self.name).scalar_subquery())
+            .order_by(model.issue_time)
+        )
+
+    # ---- 讀 ----
+    def town(self, session: Session, town: str) -> Optional[List[Dict[str, Any]]]:
+        """該區最新一批預報；沒有資料或表還沒建（未套 07 SQL）時回傳 None。"""
+        try:
+            rows = session.execute(self._town_query, {"district": town}).scalars().all()
+        except SQLAlchemyError as e:
+            session.rollback()
+            log.warning("CWA %s store unavailable: %s", self.name, e)
+            return None
+        return [self.from_row(r) for r in rows] if rows else None
+
+    async def atown(self, session_factory, town: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            async with session_factory() as s:
+                rows = (await s.execute(self._town_query, {"district": town})).scalars().all()
+        except SQLAlchemyError as e:
+            log.warning("CWA %s store unavailable: %s", self.name, e)
+            return None
+        return [self.from_row(r) for r in rows] if rows else None
+
+    # ---- 寫 ----
+    def _rows(self, index: TownIndex) -> List[Dict[str, Any]]:
+        # 同一個 (district, issue_time) 在一個 INSERT ... ON CONFLICT 裡只能出現一次
+        out: Dict[Any, Dict[str, Any]] = {}
+        for town, forecasts in index.items():
+            for f in forecasts:
+                row = self.to_row(town, f)
+                if row is not None:
+                    out[(row["district"], row["issue_time"])] = row
+        return list(out.values())
+
+    def _upsert(self, session: Session, rows: List[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        t = self.model.__table__
+        stmt = insert(t).values(rows)
+        changed = [t.c[c].is_distinct_from(stmt.excluded[c]) for c in self._value_cols]
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[t.c.district, t.c.issue_time],
+            set_={**{c: stmt.excluded[c] for c in self._value_cols}, "updated_at": text("now()")},
+            where=or_(*changed),   # 數值沒變的列不寫（不產生新版本、不動 updated_at）
+        )
+        return session.execute(stmt).rowcount
+
+    def _claim(self, session: Session, now: datetime, min_interval: float) -> bool:
+        """checked_at 超過 min_interval 才改成 now 並回傳 True（多個 replica 同時搶只會有一個成功）。"""
+        s = insert(self._sync).values(dataset=self.name, checked_at=now, updated_at=now)
+        s = s.on_conflict_do_update(
+            index_elements=[self._sync.c.dataset],
+            set_={"checked_at": now},
+            where=self._sync.c.checked_at <= now - timedelta(seconds=min_interval * 0.9),
+        ).returning(self._sync.c.dataset)
+        claimed = session.execute(s).first() is not None
+        session.commit()
+        return claimed
+
+    def refresh(self, session: Session, min_interval: float = CWA_REFRESH_SEC) -> Optional[int]:
+        """
+        抓一次上游並寫入；回傳 upsert 的列數。
+        min_interval 內已有人搶過這一輪時回傳 None（不打上游）。
+        """
+        now = datetime.now(timezone.utc)
+        if not self._claim(session, now, min_interval):
+            return None
+
+        issue_key, index = self.cache.fetch()      # 不在交易內：上游慢也不佔連線、不擋別人
+
+        session.execute(text("SELECT pg_advisory_xact_lock(hashtext(:k))"), {"k": f"cwa-forecast:{self.name}"})
+        sync = session.get(CwaForecastSync, self.name, populate_existing=True)
+        if issue_key is not None and sync is not None and sync.issue_key == issue_key:
+            session.commit()                        # 同一批已由別人（或上一輪）寫過
+            return 0
+
+        rows = self._rows(index)
+        changed = self._upsert(session, rows)
+        window_start = min(r["issue_time"] for r in rows) if rows else (sync.window_start if sync else None)
+        set_ = {"issue_key": issue_key, "window_start": window_start}
+        if changed:
+            set_.update(rows_changed=changed, updated_at=now)
+        session.execute(self._sync.update().where(self._sync.c.dataset == self.name).values(**set_))
+        session.commit()
+        if changed:
+            log.info("CWA %s: upserted %d forecasts (issue %s)", self.name, changed, issue_key)
+        return changed
+
+
+class ForecastRefresher:
+    """背景 thread：依序 refresh 每個 store（各自開 session）。"""
+
+    def __init__(self, stores: List[ForecastStore], session_factory, interval_sec: float = CWA_REFRESH_SEC):
+        self.stores = stores
+        self.session_factory = session_factory
+        self.interval_sec = interval_sec
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def refresh_once(self) -> None:
+        for store in self.stores:
+            s = self.session_factory()
+            try:
+                store.refresh(s, self.interval_sec)
+            except Exception as e:
+                s.rollback()
+                log.warning("CWA %s store refresh failed: %s", store.name, e)
+            finally:
+                s.close()
+
+    def _run(self) -> None:
+        while True:
+            self.refresh_once()
+            self._wake.wait(self.interval_sec)
+            self._wake.clear()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name="cwa-refresh")
+                self._thread.start()
+
+    def trigger(self) -> None:
+        self._wake.set()
+
+
+_refresher: Optional[ForecastRefresher] = None
+
+
+def start_forecast_refresher() -> None:
+    """CWA_REFRESH=0 可關閉（此時路由照舊由 forecast_cache 即時抓）。"""
+    global _refresher
+    if os.getenv("CWA_REFRESH", "1") == "0":
+        return
+    if _refresher is None:
+        from db import SessionLocal
+        _refresher = ForecastRefresher(STORES, SessionLocal)
+    _refresher.start()
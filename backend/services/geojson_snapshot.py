@@ -0,0 +1,163 @@
+# backend/services/geojson_snapshot.py
+"""
+GeoJSON 快照：整包 FeatureCollection 只組一次，預先編碼成 bytes + gzip + brotli。
+
+- miss 時在請求路徑上只做快速壓縮（gzip 6 / brotli 5，數十毫秒內），
+  再交給背景 thread 以最高壓縮（gzip 9 / brotli 11）重壓後換上
+- 快照只給固定的幾個 key 用（例如 /sites 預設整包、/aeds、各 tier 邊界）；
+  呼叫端自訂的分頁參數不要進快照，否則每個新 key 都要付一次建置成本
+- 每種編碼各帶一個強 ETag（該編碼實際 bytes 的 sha1），重壓時 bytes 與 ETag 一起換
+- 每 SNAPSHOT_CHECK_SEC 秒檢查一次來源表指紋（見 table_version），變了才重建
+- 匯入腳本跑完後也可以呼叫 invalidate(table) 立即失效
+- build 可直接回傳已編碼的 bytes（例如 PostGIS 組好的 FeatureCollection），不再經過 dict
+"""
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
+
+from services.json_codec import dumps
+from services.metrics import cache_counter
+from services.table_version import table_fingerprint, Fingerprint
+
+try:
+    import brotli
+except ImportError:  # brotli 為選用；沒裝就只提供 gzip
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_CHECK_SEC = float(os.getenv("SNAPSHOT_CHECK_SEC", "30"))
+SNAPSHOT_MAX_KEYS = int(os.getenv("SNAPSHOT_MAX_KEYS", "32"))
+FAST_GZIP_LEVEL, FAST_BR_QUALITY = 6, 5
+BEST_GZIP_LEVEL, BEST_BR_QUALITY = 9, 11
+
+# 最高壓縮只在這裡做，一次一個，不佔請求 thread
+_recompressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot-compress")
+
+
+# Content-Encoding → (bytes, ETag)
+Representations = Dict[str, Tuple[bytes, str]]
+_SUFFIX = {"identity": "", "gzip": "-gz", "br": "-br"}
+
+
+def representations(body: bytes, gz: bytes, br: Optional[bytes] = None) -> Representations:
+    """各編碼的 bytes 與其強 ETag；ETag 由該編碼自己的 bytes 算出，不同壓縮等級不會共用。"""
+    reps = {"identity": body, "gzip": gz}
+    if br is not None:
+        reps["br"] = br
+    return {c: (b, hashlib.sha1(b).hexdigest() + _SUFFIX[c]) for c, b in reps.items()}
+
+
+class Snapshot:
+    __slots__ = ("body", "reps", "etag", "mimetype", "version")
+
+    def __init__(self, payload: Union[Dict[str, Any], bytes], mimetype: str, version: Optional[Fingerprint]):
+        self.body = payload if isinstance(payload, bytes) else dumps(payload)
+        self.reps = representations(
+            self.body,
+            gzip.compress(self.body, compresslevel=FAST_GZIP_LEVEL),
+            brotli.compress(self.body, quality=FAST_BR_QUALITY) if brotli else None,
+        )
+        self.etag = self.reps["identity"][1]
+        self.mimetype = mimetype
+        self.version = version
+
+    @property
+    def gzip(self) -> bytes:
+        return self.reps["gzip"][0]
+
+    @property
+    def br(self) -> Optional[bytes]:
+        rep = self.reps.get("br")
+        return rep[0] if rep else None
+
+    def recompress(self) -> None:
+        """以最高壓縮重壓；整個 reps 一次換掉，讀取端拿到的 bytes 與 ETag 一定成對。"""
+        self.reps = representations(
+            self.body,
+            gzip.compress(self.body, compresslevel=BEST_GZIP_LEVEL),
+            brotli.compress(self.body, quality=BEST_BR_QUALITY) if brotli else None,
+        )
+
+
+class SnapshotStore:
+    """單一來源表的快照集合（key 為呼叫端固定的幾種，例如 /sites 的 limit）；LRU 上限 SNAPSHOT_MAX_KEYS。"""
+
+    def __init__(self, table: str, mimetype: str = "application/json"):
+        self.table = table
+        self.mimetype = mimetype
+        self._snaps: "OrderedDict[Hashable, Snapshot]" = OrderedDict()
+        self._version: Optional[Fingerprint] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._hits = cache_counter(f"snapshot_{table}", "hit")
+        self._misses = cache_counter(f"snapshot_{table}", "miss")
+
+    def _check_version(self, session) -> Optional[Fingerprint]:
+        now = time.monotonic()
+        if self._checked_at and now - self._checked_at < SNAPSHOT_CHECK_SEC:
+            return self._version
+        fp = table_fingerprint(session, self.table)
+        with self._lock:
+            if fp != self._version:
+                self._snaps.clear()
+                self._version = fp
+            self._checked_at = now
+        return fp
+
+    def get(self, session, key: Hashable, build: Callable[[], Union[Dict[str, Any], bytes]]) -> Snapshot:
+        version = self._check_version(session)
+        with self._lock:
+            snap = self._snaps.get(key)
+            if snap is not None:
+                self._snaps.move_to_end(key)
+                self._hits.inc()
+                return snap
+        self._misses.inc()
+        # 在鎖外組資料；同時多人 miss 最壞是各自建一次，結果相同
+        snap = Snapshot(build(), self.mimetype, version)
+        with self._lock:
+            if snap.version == self._version:
+                self._snaps[key] = snap
+                while len(self._snaps) > SNAPSHOT_MAX_KEYS:
+                    self._snaps.popitem(last=False)
+                _recompressor.submit(self._recompress, key, snap)
+        return snap
+
+    def _recompress(self, key: Hashable, snap: Snapshot) -> None:
+        with self._lock:
+            if self._snaps.get(key) is not snap:
+                return      # 已被換掉或擠出
+        try:
+            snap.recompress()
+        except Exception:
+            log.exception("snapshot recompress failed: %s %r", self.table, key)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snaps.clear()
+            self._version = None
+            self._checked_at = 0.0
+
+
+_stores: Dict[str, SnapshotStore] = {}
+
+
+def get_store(table: str, mimetype: str = "application/json") -> SnapshotStore:
+    store = _stores.get(table)
+    if store is None:
+        store = _stores.setdefault(table, SnapshotStore(table, mimetype))
+    return store
+
+
+def invalidate(table: str) -> None:
+    """匯入 hook：清掉某張表的所有快照。"""
+    store = _stores.get(table)
+    if store is not None:
+        store.invalidate()
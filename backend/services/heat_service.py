@@ -1,78 +1,101 @@
 # backend/services/heat_service.py
-import os, requests
 from datetime import datetime, timezone, timedelta
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
-from models import TaipeiDistrict
+from models import HeatForecast
+from services.district_service import get_district_by_point
+from services.forecast_cache import CWA_BASE_URL, CountyForecastCache, iter_county_towns
+from services.forecast_store import ForecastStore
 
-CWA_API = "https://opendata.cwa.gov.tw/api/v1/rest/datastore/M-A0085-001"
-CWA_API_KEY = os.getenv("CWA_API_KEY")
+CWA_API = f"{CWA_BASE_URL}/api/v1/rest/datastore/M-A0085-001"
 TW_TZ = timezone(timedelta(hours=8))
 
 
-def get_district_by_point(session: Session, lat: float, lon: float) -> Optional[str]:
-    pt = func.ST_SetSRID(func.ST_Point(lon, lat), 4326)
-    q1 = select(TaipeiDistrict.district_name).where(func.ST_Contains(TaipeiDistrict.geom, pt)).limit(1)
-    hit = session.execute(q1).scalar_one_or_none()
-    if hit:
-        return hit
-    q2 = (
-        select(TaipeiDistrict.district_name)
-        .where(func.ST_DWithin(func.Geography(TaipeiDistrict.geom), func.Geography(pt), 50.0))
-        .order_by(func.ST_Distance(func.Geography(TaipeiDistrict.geom), func.Geography(pt)))
-        .limit(1)
-    )
-    near = session.execute(q2).scalar_one_or_none()
-    if near:
-        return near
-    q3 = select(TaipeiDistrict.district_name).order_by(TaipeiDistrict.geom.op("<->")(pt)).limit(1)
-    return session.execute(q3).scalar_one_or_none()
-
-
-def fetch_heat_forecast_for_town(town_name: str) -> Optional[Dict[str, Any]]:
-    """取得該行政區所有未來時間預報（已依 issue_time 排序）"""
-    if not CWA_API_KEY:
-        raise RuntimeError("CWA_API_KEY not set")
-
-    params = {"Authorization": CWA_API_KEY, "CountyName": "臺北市"}
-    resp = requests.get(CWA_API, params=params, timeout=10)
-    resp.raise_for_status()
-    data = resp.json()
-
-    records = data.get("records", {})
-    locations = records.get("Locations", [])
-    for loc in locations:
-        if loc.get("CountyName") == "臺北市":
-            for sub in loc.get("Location", []):
-                if sub.get("TownName") == town_name:
-                    result = []
-                    for t in sub.get("Time", []):
-                        we = t.get("WeatherElements", {}) or {}
-                        result.append({
-                            "issue_time": t.get("IssueTime"),
-                            "heat_injury_index": we.get("HeatInjuryIndex"),
-                            "heat_injury_warning": we.get("HeatInjuryWarning", "")
-                        })
-
-                    # ✅ 在這裡排序：由早到晚
-                    def _parse_time(x):
-                        try:
-                            return datetime.strptime(x["issue_time"], "%Y-%m-%d %H:%M:%S")
-                        except Exception:
-                            return datetime.max
-                    result.sort(key=_parse_time)
-
-                    return {
-                        "city": "臺北市",
-                        "district": town_name,
-                        "forecasts": result
-                    }
-    return None
+def _parse_time(x):
+    try:
+        return datetime.strptime(x["issue_time"], "%Y-%m-%d %H:%M:%S")
+    except Exception:
+        return datetime.max
+
+
+def _parse_county(data: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, List[Dict[str, Any]]]]:
+    """把整個臺北市資料集拆成 {TownName: forecasts}（已依 issue_time 由早到晚排序）"""
+    index: Dict[str, List[Dict[str, Any]]] = {}
+    issue_key = None
+    for town, times in iter_county_towns(data):
+        result = []
+        for t in times:
+            we = t.get("WeatherElements", {}) or {}
+            result.append({
+                "issue_time": t.get("IssueTime"),
+                "heat_injury_index": we.get("HeatInjuryIndex"),
+                "heat_injury_warning": we.get("HeatInjuryWarning", "")
+            })
+        result.sort(key=_parse_time)
+        index[town] = result
+        latest = max((f["issue_time"] for f in result if f["issue_time"]), default=None)
+        if latest and (issue_key is None or latest > issue_key):
+            issue_key = latest
+    return issue_key, index
+
+
+_cache = CountyForecastCache("heat", CWA_API, {"CountyName": "臺北市"}, _parse_county)
+
+
+def _to_row(town: str, f: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    t = _parse_time(f)
+    if t == datetime.max:
+        return None
+    return {
+        "district": town,
+        "issue_time": t.replace(tzinfo=TW_TZ),   # 上游是臺北時間、不帶時區
+        "heat_injury_index": f["heat_injury_index"],
+        "heat_injury_warning": f["heat_injury_warning"],
+    }
+
+
+def _from_row(r: HeatForecast) -> Dict[str, Any]:
+    return {
+        "issue_time": r.issue_time.astimezone(TW_TZ).strftime("%Y-%m-%d %H:%M:%S"),
+        "heat_injury_index": r.heat_injury_index,
+        "heat_injury_warning": r.heat_injury_warning,
+    }
+
+
+_store = ForecastStore(_cache, HeatForecast, _to_row, _from_row)
+
+
+def _town_payload(town_name: str, result: Optional[List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    if result is None:
+        return None
+    return {
+        "city": "臺北市",
+        "district": town_name,
+        "forecasts": result
+    }
+
+
+def fetch_heat_forecast_for_town(session: Session, town_name: str) -> Optional[Dict[str, Any]]:
+    """
+    取得該行政區最新一批預報（已依 issue_time 排序）。
+    先查 heat_forecasts；表內沒有該區時退回共用快取（即時抓 CWA）。
+    """
+    result = _store.town(session, town_name)
+    if result is None:
+        result = _cache.get_town(town_name)
+    return _town_payload(town_name, result)
+
+
+async def afetch_heat_forecast_for_town(session_factory, town_name: str) -> Optional[Dict[str, Any]]:
+    """async 版（ASGI 模式）"""
+    result = await _store.atown(session_factory, town_name)
+    if result is None:
+        result = await _cache.aget_town(town_name)
+    return _town_payload(town_name, result)
 
 
 def get_heat_forecast_by_point(session: Session, lat: float, lon: float) -> Optional[Dict[str, Any]]:
     district = get_district_by_point(session, lat, lon)
     if not district:
         return None
-    return fetch_heat_forecast_for_town(district)
+    return fetch_heat_forecast_for_town(session, district)
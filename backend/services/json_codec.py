@@ -0,0 +1,31 @@
+# backend/services/json_codec.py
+"""
+JSON 編碼：有 orjson 就用（比標準庫快數倍），沒有就退回 json.dumps。
+兩者輸出都是緊湊、非 ASCII 不跳脫的 UTF-8 bytes。
+
+GEOJSON_BUILD 決定 AED / 納涼地點的 FeatureCollection 在哪裡組：
+  db（預設）：PostGIS 以 json_build_object / json_agg 組好整包文字，Python 不解析直接輸出
+  python：逐列 ST_AsGeoJSON → json.loads → dict → 再編碼（舊做法，留作對照與 bench）
+兩者解析後內容相同（bench_geojson 的 same_output）；db 的文字含 json 型別的空白，未壓縮時約大 10%。
+選用 db 的依據見 bench/bench_geojson.py 的量測結果。
+"""
+import json
+import os
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson 為選用
+    orjson = None
+
+GEOJSON_BUILD = os.getenv("GEOJSON_BUILD", "db").lower()
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
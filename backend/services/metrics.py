@@ -0,0 +1,193 @@
+# backend/services/metrics.py
+"""
+Prometheus 指標（GET /metrics）。
+
+- http_request_duration_seconds{method,route,status}：Flask request hooks（ASGI 路由在 asgi.py 記）
+- db_statement_duration_seconds{caller,op}：SQLAlchemy engine 事件；caller 是發出查詢的 service 函式
+- db_pool_checkout_wait_seconds{pool}、db_pool_connections{pool,state}：連線池等待與使用量
+- upstream_request_duration_seconds{upstream,status}：CWA / CAMS（cdsapi）/ FCM
+- cache_requests_total{cache,result}：各記憶體快取的 hit / miss / stale / reload
+
+熱路徑只做 perf_counter 與預先綁好 label 的 observe/inc；caller 的判斷以 code object 快取。
+"""
+import sys
+import time
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, disable_created_metrics, generate_latest
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+disable_created_metrics()  # 不輸出 *_created，減少 scrape 體積
+
+_FAST_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+_SLOW_BUCKETS = (.01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ["method", "route", "status"], buckets=_FAST_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled")
+
+DB_DURATION = Histogram(
+    "db_statement_duration_seconds", "SQL statement latency by issuing service function",
+    ["caller", "op"], buckets=_FAST_BUCKETS,
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+    ["pool"], buckets=_FAST_BUCKETS,
+)
+
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds", "Outbound call latency (CWA / CAMS / FCM)",
+    ["upstream", "status"], buckets=_SLOW_BUCKETS,
+)
+
+CACHE_REQUESTS = Counter("cache_requests_total", "In-memory cache lookups", ["cache", "result"])
+
+
+def render() -> bytes:
+    return generate_latest(REGISTRY)
+
+
+# ---- HTTP ----
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    HTTP_DURATION.labels(method, route, str(status)).observe(seconds)
+
+
+# ---- 上游 ----
+class upstream_timer:
+    """
+    with upstream_timer("cwa_heat") as t:
+        r = requests.get(...)
+        t.status = r.status_code
+    沒設定 status（例如連線失敗丟例外）時記為 "error"。
+    """
+    __slots__ = ("upstream", "status", "_t0")
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+        self.status: object = "error"
+
+    def __enter__(self) -> "upstream_timer":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        UPSTREAM_DURATION.labels(self.upstream, str(self.status)).observe(time.perf_counter() - self._t0)
+
+
+# ---- 快取 ----
+def cache_counter(cache: str, result: str):
+    """回傳已綁好 label 的 counter（在模組或物件初始化時取一次，熱路徑直接 .inc()）。"""
+    return CACHE_REQUESTS.labels(cache, result)
+
+
+# ---- SQL ----
+_CALLER_PACKAGES = ("services.", "routes.", "bench.")
+_CALLER_MODULES = ("asgi",)
+_caller_cache: Dict[object, Optional[str]] = {}
+
+
+def _label_for(code, module: str) -> Optional[str]:
+    label = _caller_cache.get(code, False)
+    if label is False:
+        label = None
+        if module != __name__ and (module.startswith(_CALLER_PACKAGES) or module in _CALLER_MODULES):
+            label = f"{module.split('.', 1)[-1]}.{code.co_name}"
+        _caller_cache[code] = label
+    return label
+
+
+def _caller() -> str:
+    """由內往外找第一個 services/routes 的函式（最接近 SQL 的那一層）。"""
+    f = sys._getframe(2)
+    while f is not None:
+        label = _label_for(f.f_code, f.f_globals.get("__name__", ""))
+        if label is not None:
+            return label
+        f = f.f_back
+    return "other"
+
+
+def _op(statement: str) -> str:
+    head = statement.lstrip()[:8].upper()
+    for op in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+        if head.startswith(op):
+            return op
+    return "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_t0", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    t0 = conn.info["metrics_t0"].pop()
+    DB_DURATION.labels(_caller(), _op(statement)).observe(time.perf_counter() - t0)
+
+
+def _handle_error(ctx):
+    stack = ctx.connection.info.get("metrics_t0") if ctx.connection is not None else None
+    if stack:
+        stack.pop()
+
+
+_instrumented = False
+
+
+def instrument_sqlalchemy() -> None:
+    """掛在 Engine 類別上：同步與 async（asyncpg）engine 都會記到。"""
+    global _instrumented
+    if _instrumented:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _instrumented = True
+
+
+# ---- 連線池 ----
+class _TimedPool:
+    """_do_get 外包一層計時（含排隊與建立新連線）；pool 名稱取自 create_engine(pool_logging_name=...)。"""
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.labels(self._orig_logging_name or "default").observe(time.perf_counter() - t0)
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+class _PoolCollector:
+    def __init__(self):
+        self.engines: Dict[str, Engine] = {}
+
+    def collect(self):
+        g = GaugeMetricFamily("db_pool_connections", "Pool connections by state", labels=["pool", "state"])
+        for name, engine in self.engines.items():
+            pool = engine.pool  # dispose() 之後會換新的 pool，每次重新取
+            g.add_metric([name, "checked_out"], pool.checkedout())
+            g.add_metric([name, "idle"], pool.checkedin())
+            g.add_metric([name, "overflow"], max(0, pool.overflow()))
+            g.add_metric([name, "size"], pool.size())
+        yield g
+
+
+_pool_collector = _PoolCollector()
+REGISTRY.register(_pool_collector)
+
+
+def register_pool(engine, name: str) -> None:
+    """engine 可以是同步 Engine 或 AsyncEngine。"""
+    _pool_collector.engines[name] = getattr(engine, "sync_engine", engine)
@@ -0,0 +1,80 @@
+# backend/services/nearest_query.py
+"""
+AED、納涼地點共用的「最近點」查詢（一次 round trip，少數情況再加寬重查）。
+
+1) 以 geometry `<->` 取 KNN 候選（走 GiST 索引，不用整表 cast geography）
+2) 在候選內以 geography 距離（公尺）重新排序，取前 limit 筆
+
+`<->` 以經緯度平面距離（度）排序，與公尺排序不一致（台北的經度方向差約 1/cos(25°)≈1.1 倍），
+候選外的點平面距離都 ≥ 第 n_cand 名的平面距離 d，換成公尺至少 planar_bound_m(lat, d)。
+第 limit 名的公尺距離 ≤ 這個下界才保證是真正的前 limit 名；否則候選數加倍重查，
+直到成立、候選已涵蓋整表，或到 CANDIDATE_MAX 為止（此時結果為近似，極少發生）。
+"""
+import math
+from typing import Any, List, Optional
+
+from sqlalchemy import select, func
+
+CANDIDATE_FACTOR = 4
+CANDIDATE_MIN = 16
+CANDIDATE_MAX = 4096
+
+# 每度的最短公尺數：WGS84 子午線方向（赤道處 110574 m）比緯線方向（111320·cos φ）小，取前者再乘 cos φ
+_M_PER_DEG_MIN = 110574.0
+_BOUND_SAFETY = 0.995
+
+
+def initial_candidates(limit: int) -> int:
+    return max(limit * CANDIDATE_FACTOR, limit + CANDIDATE_MIN)
+
+
+def planar_bound_m(lat: float, planar_deg: float) -> float:
+    """與 (lat, ·) 平面距離 ≥ planar_deg 度的點，球面距離至少幾公尺（保守下界）。"""
+    worst_lat = min(89.0, abs(lat) + planar_deg)     # 候選外的點最多偏到這個緯度，經度方向最短
+    return planar_deg * _M_PER_DEG_MIN * math.cos(math.radians(worst_lat)) * _BOUND_SAFETY
+
+
+def is_exact(lat: float, kth_m: float, cand_bound_deg: float) -> bool:
+    """第 k 名（公尺）不超過候選外的下界 → 候選內的前 k 名就是全表的前 k 名。"""
+    return kth_m <= planar_bound_m(lat, cand_bound_deg)
+
+
+def nearest_query(model, lat: float, lon: float, limit: int, where: Optional[List[Any]] = None,
+                  n_cand: Optional[int] = None):
+    """
+    回傳 select(model, geom_json, distance_m, cand_bound_deg, cand_n)，依公尺距離由近到遠。
+    cand_bound_deg / cand_n：候選中最遠的平面距離與候選數（給 nearest_rows 判斷是否要加寬）。
+    """
+    pt = func.ST_SetSRID(func.ST_Point(lon, lat), 4326)
+    n_cand = n_cand or initial_candidates(limit)
+
+    planar = model.geom.op("<->")(pt)
+    cand = select(model.id, planar.label("planar_deg")).where(model.geom.isnot(None))
+    for cond in where or []:
+        cand = cand.where(cond)
+    cand = cand.order_by(planar).limit(n_cand).subquery("knn")
+
+    distance = func.ST_Distance(func.Geography(model.geom), func.Geography(pt))
+    return (
+        select(
+            model,
+            func.ST_AsGeoJSON(model.geom).label("geom_json"),
+            distance.label("distance_m"),
+            func.max(cand.c.planar_deg).over().label("cand_bound_deg"),   # window 在 LIMIT 之前算
+            func.count().over().label("cand_n"),
+        )
+        .join(cand, cand.c.id == model.id)
+        .order_by(distance)
+        .limit(limit)
+    )
+
+
+def nearest_rows(session, model, lat: float, lon: float, limit: int, where: Optional[List[Any]] = None):
+    """rows: (model, geom_json, distance_m, …)，由近到遠；保證是真正的前 limit 名（見模組說明）。"""
+    n_cand = initial_candidates(limit)
+    while True:
+        rows = session.execute(nearest_query(model, lat, lon, limit, where, n_cand)).all()
+        if (len(rows) < limit or rows[0].cand_n < n_cand or n_cand >= CANDIDATE_MAX
+                or is_exact(lat, float(rows[-1].distance_m), float(rows[0].cand_bound_deg))):
+            return rows
+        n_cand = min(n_cand * 2, CANDIDATE_MAX)
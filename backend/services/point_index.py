@@ -0,0 +1,259 @@
+# backend/services/point_index.py
+"""
+AED、納涼地點的記憶體最近點索引（全部約 3,500 點）。
+
+- 經緯度轉成單位球上的 3D 向量，以 cKDTree 查詢；弦長與大圓距離單調對應，
+  所以 k-nearest / 半徑查詢的排序是精確的（球面意義下）
+- distance_m 以台北緯度的高斯曲率半徑（≈6,364 km）換算大圓距離；
+  與 PostGIS geography（WGS84 橢球）相比，台北市範圍內誤差 ≤ 0.3%（每公里 ≤ 3 m）；
+  距離差在此範圍內的近似並列點，先後順序可能與 PostGIS 不同
+- 屬性以欄位陣列（column store）保存，回傳時才組 feature
+- 可帶位元遮罩（例如納涼點設施 amenities）：每種遮罩第一次查詢時挑出符合的點另建一棵子樹，
+  之後 knn / within 直接查子樹，條件再嚴格也一次就拿到真正最近的 k 筆
+- 可帶每點的週區間（納涼點 open_week）：open_at(分鐘) 回傳當下開放的布林陣列，
+  交給 knn / within 的 where；組合太多不建子樹，直接對符合的點算距離（點數少，仍是微秒級）
+- 每 POINT_INDEX_CHECK_SEC 秒檢查一次表指紋，表被重新匯入就重建
+"""
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+from sqlalchemy import Text, cast, func, literal, select
+
+from models import AedSite, CoolingSite
+from services.metrics import cache_counter
+from services.table_version import table_fingerprint, Fingerprint
+
+# 25°N 的高斯曲率半徑 sqrt(M·N)（WGS84）
+EARTH_RADIUS_M = 6364372.0
+DISTANCE_TOLERANCE = 0.003
+
+CHECK_INTERVAL_SEC = float(os.getenv("POINT_INDEX_CHECK_SEC", "60"))
+# memory（預設）：記憶體索引；postgis：每次查詢都打資料庫（nearest_query）
+NEAREST_BACKEND = os.getenv("NEAREST_BACKEND", "memory").lower()
+
+
+_RANGE = re.compile(r"\[(\d+),(\d+)\)")
+
+
+def _parse_multirange(raw: Optional[str]) -> List[Tuple[int, int]]:
+    """int4multirange 的文字輸出（例如 {[0,1440),[2880,4320)}）→ 區間串列；NULL → []"""
+    return [(int(a), int(b)) for a, b in _RANGE.findall(raw or "")]
+
+
+def _unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    phi = np.radians(lats)
+    lam = np.radians(lons)
+    cos_phi = np.cos(phi)
+    return np.column_stack((cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)))
+
+
+def _chord_to_m(chord: np.ndarray) -> np.ndarray:
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0))
+
+
+def _m_to_chord(meters: float) -> float:
+    return 2.0 * math.sin(min(meters / EARTH_RADIUS_M, math.pi) / 2.0)
+
+
+class PointIndex:
+    """不可變的點索引；重建時整個換掉。"""
+
+    def __init__(self, ids: Sequence[int], lats: Sequence[float], lons: Sequence[float],
+                 columns: Dict[str, List[Any]], fingerprint: Optional[Fingerprint] = None,
+                 bits: Optional[Sequence[int]] = None,
+                 intervals: Optional[Sequence[Sequence[Tuple[int, int]]]] = None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.columns = columns
+        self.fingerprint = fingerprint
+        self.bits = np.asarray(bits if bits is not None else np.zeros(len(self.ids)), dtype=np.int64)
+        self.tree = cKDTree(_unit_vectors(self.lats, self.lons)) if len(self.ids) else None
+        # mask -> (原始位置, 子樹)；最多 2^位元數 種，點數少，建一次就留著
+        self._subsets: Dict[int, Tuple[np.ndarray, Optional[cKDTree]]] = {}
+        # 區間攤平成三個陣列：所屬點位置、起、迄（[start, end)）
+        flat = [(i, a, b) for i, ivs in enumerate(intervals or ()) for a, b in ivs]
+        self._iv_pos = np.array([f[0] for f in flat], dtype=np.int64)
+        self._iv_start = np.array([f[1] for f in flat], dtype=np.int64)
+        self._iv_end = np.array([f[2] for f in flat], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return int(self.ids.size)
+
+    def _subset(self, mask: int) -> Tuple[np.ndarray, Optional[cKDTree]]:
+        sub = self._subsets.get(mask)
+        if sub is None:
+            pos = np.flatnonzero((self.bits & mask) == mask)
+            tree = cKDTree(self.tree.data[pos]) if pos.size else None
+            # 併發時最壞各建一次，結果相同
+            sub = self._subsets.setdefault(mask, (pos, tree))
+        return sub
+
+    def open_at(self, minute: int) -> np.ndarray:
+        """每個點在週分鐘 minute 是否落在自己的區間內（沒有區間的點一律 False）。"""
+        hit = (self._iv_start <= minute) & (minute < self._iv_end)
+        out = np.zeros(len(self), dtype=bool)
+        out[self._iv_pos[hit]] = True
+        return out
+
+    def _filtered(self, mask: int, where: np.ndarray) -> np.ndarray:
+        ok = where if not mask else where & ((self.bits & mask) == mask)
+        return np.flatnonzero(ok)
+
+    def knn(self, lat: float, lon: float, k: int, mask: int = 0,
+            where: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        回傳 (位置陣列, 距離公尺)，由近到遠；mask 非 0 時只看 bits 含有全部 mask 位元的點，
+        where（長度同點數的布林陣列）再限縮到 True 的點。
+        """
+        if self.tree is None or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        if where is not None:
+            pos = self._filtered(mask, where)
+            q = _unit_vectors(np.array([lat]), np.array([lon]))[0]
+            chord = np.linalg.norm(self.tree.data[pos] - q, axis=1)
+            order = np.argsort(chord, kind="stable")[:k]
+            return pos[order], _chord_to_m(chord[order])
+        tree, remap = self.tree, None
+        if mask:
+            remap, tree = self._subset(mask)
+            if tree is None:
+                return np.empty(0, dtype=np.int64), np.empty(0)
+        k = min(k, tree.n)
+        q = _unit_vectors(np.array([lat]), np.array([lon]))[0]
+        chord, pos = tree.query(q, k=k)
+        pos = np.atleast_1d(pos).astype(np.int64)
+        return (remap[pos] if remap is not None else pos), _chord_to_m(np.atleast_1d(chord))
+
+    def knn_many(self, lats: Sequence[float], lons: Sequence[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """批次 k-nearest：回傳 (n, k) 的位置與距離（公尺）；資料不足 k 筆時以 -1 / inf 補。"""
+        n = len(lats)
+        if self.tree is None or k <= 0:
+            return np.full((n, max(k, 0)), -1, dtype=np.int64), np.full((n, max(k, 0)), np.inf)
+        q = _unit_vectors(np.asarray(lats, dtype=float), np.asarray(lons, dtype=float))
+        chord, pos = self.tree.query(q, k=k)
+        chord = np.asarray(chord).reshape(n, k)
+        pos = np.asarray(pos).reshape(n, k).astype(np.int64)
+        missing = pos >= len(self)
+        pos[missing] = -1
+        dist = _chord_to_m(np.where(missing, 0.0, chord))
+        dist[missing] = np.inf
+        return pos, dist
+
+    def within(self, lat: float, lon: float, radius_m: float, mask: int = 0,
+               where: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """半徑內所有點，由近到遠。"""
+        if self.tree is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        if where is not None:
+            pos = self._filtered(mask, where)
+            q = _unit_vectors(np.array([lat]), np.array([lon]))[0]
+            chord = np.linalg.norm(self.tree.data[pos] - q, axis=1)
+            keep = chord <= _m_to_chord(radius_m)
+            pos, chord = pos[keep], chord[keep]
+            order = np.argsort(chord, kind="stable")
+            return pos[order], _chord_to_m(chord[order])
+        tree, remap = self.tree, None
+        if mask:
+            remap, tree = self._subset(mask)
+            if tree is None:
+                return np.empty(0, dtype=np.int64), np.empty(0)
+        q = _unit_vectors(np.array([lat]), np.array([lon]))[0]
+        pos = np.asarray(tree.query_ball_point(q, _m_to_chord(radius_m)), dtype=np.int64)
+        if pos.size == 0:
+            return pos, np.empty(0)
+        if remap is not None:
+            pos = remap[pos]
+        dist = _chord_to_m(np.linalg.norm(self.tree.data[pos] - q, axis=1))
+        order = np.argsort(dist, kind="stable")
+        return pos[order], dist[order]
+
+    def row(self, i: int) -> Dict[str, Any]:
+        return {name: col[i] for name, col in self.columns.items()}
+
+    def point(self, i: int) -> Dict[str, Any]:
+        return {"type": "Point", "coordinates": [float(self.lons[i]), float(self.lats[i])]}
+
+
+class _Source:
+    """某張表怎麼載入成 PointIndex。"""
+
+    def __init__(self, model, columns: Sequence[str], bits_column: Optional[str] = None,
+                 intervals_column: Optional[str] = None):
+        self.model = model
+        self.columns = list(columns)
+        self.bits_column = bits_column
+        self.intervals_column = intervals_column
+
+    def load(self, session, fingerprint: Optional[Fingerprint]) -> PointIndex:
+        m = self.model
+        bits = getattr(m, self.bits_column) if self.bits_column else literal(0)
+        # multirange 以文字取回自己解析（psycopg2 沒有對應的型別轉換）
+        intervals = cast(getattr(m, self.intervals_column), Text) if self.intervals_column else literal(None)
+        q = (
+            select(m.id, func.ST_Y(m.geom), func.ST_X(m.geom), bits, intervals,
+                   *[getattr(m, c) for c in self.columns])
+            .where(m.geom.isnot(None))
+            .order_by(m.id)
+        )
+        rows = session.execute(q).all()
+        cols = {c: [r[5 + n] for r in rows] for n, c in enumerate(self.columns)}
+        return PointIndex(
+            ids=[r[0] for r in rows],
+            lats=[r[1] for r in rows],
+            lons=[r[2] for r in rows],
+            columns={"id": [r[0] for r in rows], **cols},
+            fingerprint=fingerprint,
+            bits=[r[3] or 0 for r in rows],
+            intervals=[_parse_multirange(r[4]) for r in rows] if self.intervals_column else None,
+        )
+
+
+SOURCES: Dict[str, _Source] = {
+    "aed_sites": _Source(AedSite, ["name", "address", "category", "type", "place", "description"]),
+    "cooling_sites": _Source(CoolingSite, [
+        "location_type", "name", "district_name", "address", "lon", "lat",
+        "phone", "ext", "mobile", "other_contact", "open_hours",
+        "fan", "ac", "toilet", "seating", "drinking", "accessible_seat",
+        "features", "notes",
+    ], bits_column="amenities", intervals_column="open_week"),
+}
+
+_indexes: Dict[str, PointIndex] = {}
+_checked_at: Dict[str, float] = {}
+_lock = threading.Lock()
+_hits = {t: cache_counter(f"point_index_{t}", "hit") for t in SOURCES}
+_reloads = {t: cache_counter(f"point_index_{t}", "reload") for t in SOURCES}
+
+
+def get_point_index(session, table: str) -> PointIndex:
+    """取得某張表的索引；第一次或超過檢查間隔才碰資料庫。"""
+    idx = _indexes.get(table)
+    if idx is not None and time.monotonic() - _checked_at.get(table, 0.0) < CHECK_INTERVAL_SEC:
+        _hits[table].inc()
+        return idx
+
+    with _lock:
+        idx = _indexes.get(table)
+        if idx is not None and time.monotonic() - _checked_at.get(table, 0.0) < CHECK_INTERVAL_SEC:
+            return idx
+        fp = table_fingerprint(session, table)
+        if idx is None or idx.fingerprint != fp:
+            _reloads[table].inc()
+            idx = SOURCES[table].load(session, fp)
+            _indexes[table] = idx
+        _checked_at[table] = time.monotonic()
+        return idx
+
+
+def invalidate(table: Optional[str] = None) -> None:
+    with _lock:
+        for t in ([table] if table else list(_indexes)):
+            _indexes.pop(t, None)
+            _checked_at.pop(t, None)
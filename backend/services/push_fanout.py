@@ -0,0 +1,158 @@
+# backend/services/push_fanout.py
+"""
+行政區推播：送給 last_district = 指定行政區的所有裝置。
+
+- token 以 server-side cursor（yield_per）依 id 串流，每 FANOUT_BATCH_SIZE 筆送一批；
+  記憶體只跟批次大小有關，與該區裝置數無關
+- 每批經 push_service_rest.send_multicast 送出（共用連線池、限速、重試）
+- FCM 回 UNREGISTERED（或指向 token 的 INVALID_ARGUMENT）的 token 每批一次 DELETE ... = ANY(:tokens)
+- 一批中 INVALID_ARGUMENT 的比例達 FANOUT_ABORT_RATIO，多半是訊息本身有問題：
+  整個 job 中止（status=aborted），該批不刪任何 token
+- 429 / 5xx / 連線失敗等暫時性錯誤不算訊息問題：send_multicast 的重試用完後，
+  該批失敗的 token 再退避重送最多 FANOUT_TRANSIENT_RETRIES 輪；仍失敗的計入 transient_failures，token 保留
+- 在背景 thread 跑；進度用 job id 查（只存在本 process 記憶體，保留最近 FANOUT_KEEP_JOBS 筆）
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, text
+
+from db import SessionLocal, engine
+from models import DeviceToken
+from services.push_service_rest import (
+    is_dead_token_error, is_invalid_argument_error, is_transient_error, send_multicast, validate_message,
+)
+
+log = logging.getLogger(__name__)
+
+FANOUT_BATCH_SIZE = int(os.getenv("FANOUT_BATCH_SIZE", "500"))
+FANOUT_KEEP_JOBS = 100
+MAX_ERROR_SAMPLES = 20
+FANOUT_ABORT_RATIO = float(os.getenv("FANOUT_ABORT_RATIO", "0.5"))
+FANOUT_ABORT_MIN_BATCH = int(os.getenv("FANOUT_ABORT_MIN_BATCH", "5"))
+FANOUT_TRANSIENT_RETRIES = int(os.getenv("FANOUT_TRANSIENT_RETRIES", "2"))
+FANOUT_RETRY_BASE_SEC = float(os.getenv("FANOUT_RETRY_BASE_SEC", "5"))
+FANOUT_RETRY_MAX_SEC = float(os.getenv("FANOUT_RETRY_MAX_SEC", "60"))
+
+_jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _prune(tokens: List[str]) -> int:
+    if not tokens:
+        return 0
+    # 另開連線：串流中的 cursor 所在交易不能 commit
+    with engine.begin() as conn:
+        return conn.execute(text("DELETE FROM device_tokens WHERE fcm_token = ANY(CAST(:t AS text[]))"),
+                            {"t": tokens}).rowcount
+
+
+def _looks_like_payload_error(tokens: List[str], summary: Dict[str, Any]) -> bool:
+    if len(tokens) < FANOUT_ABORT_MIN_BATCH:
+        return False
+    suspect = sum(1 for e in summary["errors"] if is_invalid_argument_error(e.get("error")))
+    return suspect >= FANOUT_ABORT_RATIO * len(tokens)
+
+
+def _retry_transient(summary: Dict[str, Any], title: str, body: str, data: Optional[Dict[str, str]],
+                     job: Dict[str, Any]) -> Dict[str, Any]:
+    """暫時性錯誤的 token 退避後重送；回傳合併後的 summary。"""
+    errors, success = summary["errors"], summary["success_count"]
+    for attempt in range(FANOUT_TRANSIENT_RETRIES):
+        retry = [e["token"] for e in errors if is_transient_error(e.get("status"), e.get("error"))]
+        if not retry:
+            break
+        time.sleep(min(FANOUT_RETRY_MAX_SEC, FANOUT_RETRY_BASE_SEC * (2 ** attempt)))
+        job["retried"] += len(retry)
+        again = send_multicast(retry, title, body, data)
+        success += again["success_count"]
+        retried = set(retry)
+        errors = [e for e in errors if e["token"] not in retried] + again["errors"]
+    return {"success_count": success, "failure_count": len(errors), "errors": errors}
+
+
+def fanout_district(district: str, title: str, body: str, data: Optional[Dict[str, str]] = None,
+                    batch_size: int = FANOUT_BATCH_SIZE, job: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """同步執行整個 fan-out；job 會就地更新（給背景 thread / 查進度用）。"""
+    job = job if job is not None else _new_job(district)
+    stmt = (
+        select(DeviceToken.fcm_token)
+        .where(DeviceToken.last_district == district)
+        .order_by(DeviceToken.id)
+    )
+    s = SessionLocal()
+    try:
+        result = s.execute(stmt, execution_options={"yield_per": batch_size})
+        for rows in result.partitions():
+            tokens = [r[0] for r in rows]
+            summary = send_multicast(tokens, title, body, data)
+            job["batches"] += 1
+            job["sent"] += len(tokens)
+            if _looks_like_payload_error(tokens, summary):
+                job["success"] += summary["success_count"]
+                job["failure"] += summary["failure_count"]
+                room = max(0, MAX_ERROR_SAMPLES - len(job["error_samples"]))
+                job["error_samples"].extend(summary["errors"][:room])
+                job["status"] = "aborted"
+                job["error"] = "most of a batch failed with INVALID_ARGUMENT; aborted without pruning"
+                log.error("district fan-out %s aborted: %d/%d failed in batch %d",
+                          district, summary["failure_count"], len(tokens), job["batches"])
+                return job
+            summary = _retry_transient(summary, title, body, data, job)
+            job["success"] += summary["success_count"]
+            job["failure"] += summary["failure_count"]
+            job["transient_failures"] += sum(
+                1 for e in summary["errors"] if is_transient_error(e.get("status"), e.get("error")))
+            dead = [e["token"] for e in summary["errors"] if is_dead_token_error(e.get("error"))]
+            job["pruned"] += _prune(dead)
+            room = MAX_ERROR_SAMPLES - len(job["error_samples"])
+            if room > 0:
+                job["error_samples"].extend(e for e in summary["errors"][:room] if e["token"] not in dead)
+        job["status"] = "done"
+    except Exception as e:
+        log.exception("district fan-out %s failed", district)
+        job["status"] = "error"
+        job["error"] = str(e)
+    finally:
+        SessionLocal.remove()
+        job["finished_at"] = _now()
+    return job
+
+
+def _new_job(district: str) -> Dict[str, Any]:
+    return {
+        "job_id": uuid.uuid4().hex, "district": district, "status": "running",
+        "started_at": _now(), "finished_at": None,
+        "batches": 0, "sent": 0, "success": 0, "failure": 0, "pruned": 0,
+        "retried": 0, "transient_failures": 0, "error_samples": [],
+    }
+
+
+def start_district_fanout(district: str, title: str, body: str,
+                          data: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """開背景 thread 跑 fan-out，立刻回傳 job（之後以 get_job 查進度）。訊息不合格丟 ValueError，不建 job。"""
+    data = validate_message(title, body, data)
+    job = _new_job(district)
+    with _jobs_lock:
+        _jobs[job["job_id"]] = job
+        while len(_jobs) > FANOUT_KEEP_JOBS:
+            _jobs.popitem(last=False)
+    threading.Thread(target=fanout_district, args=(district, title, body, data),
+                     kwargs={"job": job}, daemon=True, name=f"fanout-{job['job_id'][:8]}").start()
+    return dict(job)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job is not None else None
@@ -1,16 +1,87 @@
 # backend/services/push_service_rest.py
-import os, json, time
+import os, json, time, random, threading, asyncio, ssl
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import Dict, Any, List, Optional, Tuple
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 
 from google.oauth2 import service_account
 from google.auth.transport.requests import Request
 from google.auth import default as google_auth_default
 
+from services.metrics import upstream_timer
+
 _FCM_SCOPE = ["https://www.googleapis.com/auth/firebase.messaging"]
 
+# 群發參數
+FCM_CONCURRENCY = int(os.getenv("FCM_CONCURRENCY", "16"))        # 同時送出的請求數 = 連線池大小
+# ASGI 模式全程序同時在途的 FCM 請求上限（單一群發仍受 FCM_CONCURRENCY 限制）
+FCM_ASYNC_CONNECTIONS = int(os.getenv("FCM_ASYNC_CONNECTIONS", "256"))
+FCM_MAX_RPS = float(os.getenv("FCM_MAX_RPS", "0"))               # 每秒上限；0 = 不限
+FCM_MAX_RETRIES = int(os.getenv("FCM_MAX_RETRIES", "4"))
+FCM_BACKOFF_BASE_SEC = float(os.getenv("FCM_BACKOFF_BASE_SEC", "0.5"))
+FCM_BACKOFF_MAX_SEC = float(os.getenv("FCM_BACKOFF_MAX_SEC", "30"))
+_RETRY_STATUS = {429, 500, 503}
+
+# 訊息限制（FCM：data 只能是字串對字串；整則訊息上限 4KB）
+FCM_MAX_TITLE_CHARS = 200
+FCM_MAX_BODY_CHARS = 1000
+FCM_MAX_PAYLOAD_BYTES = 4000
+_RESERVED_DATA_KEYS = {"from", "notification", "message_type"}
+_RESERVED_DATA_PREFIXES = ("google", "gcm")
+
 # 簡單的 token 快取
 _access_token: Tuple[str, float] | None = None  # (token, expires_at)
+_token_lock = threading.Lock()
+
+# 共用連線池（keep-alive；各 thread 共用同一個 Session）
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=FCM_CONCURRENCY))
+_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=FCM_CONCURRENCY))
+
+
+class _RateLimiter:
+    """token bucket：平均每秒最多 rate 個請求（允許 1 秒的突發）。"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    async def aacquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+
+_limiter = _RateLimiter(FCM_MAX_RPS)
 
 def _load_credentials():
     sa_json = os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON")
@@ -25,10 +96,29 @@ def _load_credentials():
         creds, _ = google_auth_default(scopes=_FCM_SCOPE)
     return creds
 
+def _peek_access_token() -> Optional[str]:
+    static = os.getenv("FCM_ACCESS_TOKEN")  # 本機假 FCM / 模擬器用
+    if static:
+        return static
+    if _access_token and _access_token[1] - 60 > time.time():  # 提前 60 秒更新
+        return _access_token[0]
+    return None
+
 def _get_access_token() -> str:
+    token = _peek_access_token()
+    if token:
+        return token
+    with _token_lock:
+        return _refresh_access_token()
+
+async def _aget_access_token() -> str:
+    # 換 token 會走 google-auth 的同步 HTTP，丟到 thread，不卡 event loop
+    return _peek_access_token() or await asyncio.to_thread(_get_access_token)
+
+def _refresh_access_token() -> str:
     global _access_token
     now = time.time()
-    if _access_token and _access_token[1] - 60 > now:  # 提前 60 秒更新
+    if _access_token and _access_token[1] - 60 > now:  # 其他 thread 已更新
         return _access_token[0]
     creds = _load_credentials()
     req = Request()
@@ -45,16 +135,54 @@ def _endpoint() -> str:
     project_id = os.getenv("FCM_PROJECT_ID")
     if not project_id:
         raise RuntimeError("FCM_PROJECT_ID not set")
-    return f"https://fcm.googleapis.com/v1/projects/{project_id}/messages:send"
+    base = os.getenv("FCM_BASE_URL", "https://fcm.googleapis.com").rstrip("/")
+    return f"{base}/v1/projects/{project_id}/messages:send"
+
+def _retry_after(r, attempt: int) -> float:
+    """優先採用 Retry-After（秒數或 HTTP-date），否則指數退避 + jitter。"""
+    ra = r.headers.get("Retry-After")
+    if ra:
+        try:
+            return min(FCM_BACKOFF_MAX_SEC, max(0.0, float(ra)))
+        except ValueError:
+            try:
+                dt = parsedate_to_datetime(ra)
+                return min(FCM_BACKOFF_MAX_SEC, max(0.0, (dt - datetime.now(timezone.utc)).total_seconds()))
+            except Exception:
+                pass
+    backoff = FCM_BACKOFF_BASE_SEC * (2 ** attempt)
+    return min(FCM_BACKOFF_MAX_SEC, backoff * (0.5 + random.random() / 2))
 
 def _do_send(payload: Dict[str, Any]) -> Dict[str, Any]:
-    token = _get_access_token()
-    r = requests.post(
-        _endpoint(),
-        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
-        json={"message": payload},
-        timeout=10,
-    )
+    endpoint = _endpoint()
+    attempt = 0
+    while True:
+        _limiter.acquire()
+        token = _get_access_token()
+        try:
+            with upstream_timer("fcm") as t:
+                r = _session.post(
+                    endpoint,
+                    headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+                    json={"message": payload},
+                    timeout=10,
+                )
+                t.status = r.status_code
+        except requests.RequestException as e:
+            if attempt >= FCM_MAX_RETRIES:
+                return {"success": False, "status": None, "error": {"raw": str(e)}}
+            time.sleep(min(FCM_BACKOFF_MAX_SEC, FCM_BACKOFF_BASE_SEC * (2 ** attempt)))
+            attempt += 1
+            continue
+        if r.status_code in _RETRY_STATUS and attempt < FCM_MAX_RETRIES:
+            time.sleep(_retry_after(r, attempt))
+            attempt += 1
+            continue
+        break
+    return _result(r)
+
+def _result(r) -> Dict[str, Any]:
+    """requests / httpx 的 Response 都適用"""
     if r.status_code == 200:
         return {"success": True, "message": r.json().get("name")}
     # 解析錯誤，回傳可讀資訊
@@ -64,30 +192,192 @@ def _do_send(payload: Dict[str, Any]) -> Dict[str, Any]:
         err = {"raw": r.text}
     return {"success": False, "status": r.status_code, "error": err}
 
+# ---- async（ASGI 模式）----
+# 單連線 httpx.AsyncClient 輪流借用，需要時才新建，最多 FCM_ASYNC_CONNECTIONS 個：
+# httpx 單一大連線池在數百條連線時，每次排程都要掃過全部連線（成本隨連線數平方成長）
+class _AsyncClientPool:
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self.created = 0
+        self._idle: "asyncio.Queue[httpx.AsyncClient]" = asyncio.Queue()
+        self._ssl_ctx = ssl.create_default_context()  # 共用，避免每個 client 各載一次 CA
+        self._limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+
+    async def get(self) -> httpx.AsyncClient:
+        if self._idle.empty() and self.created < self.size:
+            self.created += 1
+            return httpx.AsyncClient(http2=True, timeout=10, limits=self._limits, verify=self._ssl_ctx)
+        return await self._idle.get()
+
+    def put(self, client: httpx.AsyncClient) -> None:
+        self._idle.put_nowait(client)
+
+    async def aclose(self) -> None:
+        while not self._idle.empty():
+            await self._idle.get_nowait().aclose()
+
+
+_async_clients: Optional[_AsyncClientPool] = None
+
+def _get_async_clients() -> _AsyncClientPool:
+    global _async_clients
+    if _async_clients is None:
+        _async_clients = _AsyncClientPool(FCM_ASYNC_CONNECTIONS)
+    return _async_clients
+
+async def aclose() -> None:
+    global _async_clients
+    pool, _async_clients = _async_clients, None
+    if pool is not None:
+        await pool.aclose()
+
+async def _ado_send(payload: Dict[str, Any]) -> Dict[str, Any]:
+    endpoint = _endpoint()
+    clients = _get_async_clients()
+    attempt = 0
+    while True:
+        await _limiter.aacquire()
+        token = await _aget_access_token()
+        try:
+            client = await clients.get()
+            try:
+                with upstream_timer("fcm") as t:
+                    r = await client.post(
+                        endpoint,
+                        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+                        json={"message": payload},
+                    )
+                    t.status = r.status_code
+            finally:
+                clients.put(client)
+        except httpx.HTTPError as e:
+            if attempt >= FCM_MAX_RETRIES:
+                return {"success": False, "status": None, "error": {"raw": str(e)}}
+            await asyncio.sleep(min(FCM_BACKOFF_MAX_SEC, FCM_BACKOFF_BASE_SEC * (2 ** attempt)))
+            attempt += 1
+            continue
+        if r.status_code in _RETRY_STATUS and attempt < FCM_MAX_RETRIES:
+            await asyncio.sleep(_retry_after(r, attempt))
+            attempt += 1
+            continue
+        return _result(r)
+
 # ---- 封裝對外 API（與原路由相容） ----
 
-def send_to_token(token: str, title: str, body: str, data: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
-    payload = {
-        "token": token,
+def validate_message(title: Any, body: Any, data: Any) -> Dict[str, str]:
+    """
+    送出前檢查（格式錯的訊息 FCM 會對每個 token 都回 INVALID_ARGUMENT）；不合格丟 ValueError。
+    回傳整理後的 data（None → {}）。
+    """
+    if not isinstance(title, str) or not isinstance(body, str):
+        raise ValueError("title/body must be strings")
+    if len(title) > FCM_MAX_TITLE_CHARS:
+        raise ValueError(f"title too long (max {FCM_MAX_TITLE_CHARS} chars)")
+    if len(body) > FCM_MAX_BODY_CHARS:
+        raise ValueError(f"body too long (max {FCM_MAX_BODY_CHARS} chars)")
+    data = {} if data is None else data
+    if not isinstance(data, dict):
+        raise ValueError("data must be an object of string values")
+    for k, v in data.items():
+        if not isinstance(v, str):
+            raise ValueError(f"data.{k} must be a string")
+        if k in _RESERVED_DATA_KEYS or k.lower().startswith(_RESERVED_DATA_PREFIXES):
+            raise ValueError(f"data key {k!r} is reserved by FCM")
+    size = len(json.dumps({"notification": {"title": title, "body": body}, "data": data},
+                          ensure_ascii=False).encode("utf-8"))
+    if size > FCM_MAX_PAYLOAD_BYTES:
+        raise ValueError(f"message too large ({size} bytes, max {FCM_MAX_PAYLOAD_BYTES})")
+    return data
+
+def _payload(target: str, value: str, title: str, body: str, data: Optional[Dict[str, str]]) -> Dict[str, Any]:
+    return {
+        target: value,
         "notification": {"title": title, "body": body},
         "data": data or {},
     }
-    return _do_send(payload)
+
+def send_to_token(token: str, title: str, body: str, data: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return _do_send(_payload("token", token, title, body, data))
 
 def send_to_topic(topic: str, title: str, body: str, data: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
-    payload = {
-        "topic": topic,
-        "notification": {"title": title, "body": body},
-        "data": data or {},
-    }
-    return _do_send(payload)
+    return _do_send(_payload("topic", topic, title, body, data))
+
+async def asend_to_token(token: str, title: str, body: str, data: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return await _ado_send(_payload("token", token, title, body, data))
+
+async def asend_to_topic(topic: str, title: str, body: str, data: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return await _ado_send(_payload("topic", topic, title, body, data))
+
+def send_multicast(tokens: List[str], title: str, body: str, data: Optional[Dict[str, str]] = None,
+                   concurrency: Optional[int] = None) -> Dict[str, Any]:
+    # FCM v1 沒有單一「群發」JSON；這裡以固定大小的 thread pool 共用連線池平行送出
+    tokens = list(tokens)
+    workers = max(1, min(concurrency or FCM_CONCURRENCY, FCM_CONCURRENCY, len(tokens) or 1))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fcm") as ex:
+        results = list(ex.map(lambda t: send_to_token(t, title, body, data), tokens))
+    return _summarize(tokens, results)
+
+async def asend_multicast(tokens: List[str], title: str, body: str, data: Optional[Dict[str, str]] = None,
+                          concurrency: Optional[int] = None) -> Dict[str, Any]:
+    # 與 send_multicast 相同的結果格式；同時在途的請求數以 semaphore 限制
+    tokens = list(tokens)
+    sem = asyncio.Semaphore(max(1, min(concurrency or FCM_CONCURRENCY, FCM_CONCURRENCY)))
+
+    async def one(t: str) -> Dict[str, Any]:
+        async with sem:
+            return await asend_to_token(t, title, body, data)
+
+    results = await asyncio.gather(*(one(t) for t in tokens))
+    return _summarize(tokens, results)
+
+def _error_codes(e: Dict[str, Any]) -> List[str]:
+    codes = [d.get("errorCode") for d in e.get("details") or [] if isinstance(d, dict) and d.get("errorCode")]
+    return codes or [e.get("status")]
+
+def _blames_token(e: Dict[str, Any]) -> bool:
+    """INVALID_ARGUMENT 是否明確指向 token（而不是訊息內容）"""
+    for d in e.get("details") or []:
+        for v in (d.get("fieldViolations") or []) if isinstance(d, dict) else []:
+            if isinstance(v, dict) and v.get("field") == "message.token":
+                return True
+    return "registration token" in str(e.get("message") or "").lower()
+
+def is_invalid_argument_error(err: Any) -> bool:
+    """FCM 回 INVALID_ARGUMENT（訊息或 token 格式錯；同一則訊息重送也不會成功）"""
+    e = (err or {}).get("error") if isinstance(err, dict) else None
+    return isinstance(e, dict) and "INVALID_ARGUMENT" in _error_codes(e)
+
+_TRANSIENT_CODES = {"UNAVAILABLE", "INTERNAL", "QUOTA_EXCEEDED"}
+
+def is_transient_error(status: Optional[int], err: Any) -> bool:
+    """
+    重試用完仍失敗、但晚點再送可能成功的錯誤：
+    連線失敗（status 為 None）、429 / 5xx，或 FCM 的 UNAVAILABLE / INTERNAL / QUOTA_EXCEEDED
+    """
+    if status is None or status == 429 or status >= 500:
+        return True
+    e = (err or {}).get("error") if isinstance(err, dict) else None
+    return isinstance(e, dict) and bool(_TRANSIENT_CODES.intersection(_error_codes(e)))
+
+def is_dead_token_error(err: Any) -> bool:
+    """
+    err 為 _result() 的 "error"（FCM 回傳的 JSON）。這些 token 應從 device_tokens 刪掉：
+      - UNREGISTERED
+      - INVALID_ARGUMENT 且錯誤指向 token（fieldViolations 的 message.token 或訊息提到 registration token）；
+        訊息格式錯也會回 INVALID_ARGUMENT，那種不能刪
+    """
+    e = (err or {}).get("error") if isinstance(err, dict) else None
+    if not isinstance(e, dict):
+        return False
+    codes = _error_codes(e)
+    if "UNREGISTERED" in codes:
+        return True
+    return "INVALID_ARGUMENT" in codes and _blames_token(e)
 
-def send_multicast(tokens: List[str], title: str, body: str, data: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
-    # FCM v1 沒有單一「群發」JSON；這裡逐一送（也可自己做平行或批次）
+def _summarize(tokens: List[str], results: List[Dict[str, Any]]) -> Dict[str, Any]:
     ok, fail = 0, 0
     errors: List[Dict[str, Any]] = []
-    for t in tokens:
-        res = send_to_token(t, title, body, data)
+    for t, res in zip(tokens, results):
         if res.get("success"):
             ok += 1
         else:
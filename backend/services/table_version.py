@@ -0,0 +1,28 @@
+# backend/services/table_version.py
+"""
+資料表版本指紋：給記憶體內快取/索引判斷「來源表是否被重新匯入」。
+
+指紋 = (表 OID, 筆數, max(xmin))
+  - ogr2ogr -overwrite / DROP+CREATE → OID 改變
+  - TRUNCATE + INSERT / UPDATE / DELETE → 筆數或 xmin 改變
+不依賴任何欄位名稱。
+"""
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+
+Fingerprint = Tuple[int, int, int]
+
+
+def fingerprint_sql(table: str) -> str:
+    """算指紋的 SQL（一列：oid, 筆數, max(xmin)）；importer 以 psycopg2 cursor 直接用。"""
+    return f"SELECT '{table}'::regclass::oid, count(*), coalesce(max(xmin::text::bigint), 0) FROM {table}"
+
+
+def table_fingerprint(session, table: str) -> Optional[Fingerprint]:
+    """回傳資料表指紋；表不存在時回傳 None。`table` 只接受程式內固定的表名。"""
+    if session.execute(text("SELECT to_regclass(:t)"), {"t": table}).scalar() is None:
+        return None
+    row = session.execute(text(fingerprint_sql(table))).one()
+    return (int(row[0]), int(row[1]), int(row[2]))
+
@@ -1,15 +1,14 @@
 # backend/services/tempdiff_service.py
-import os
-import requests
 from datetime import datetime, timezone, timedelta
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
-from models import TaipeiDistrict
+from models import TempdiffForecast
+from services.district_service import get_district_by_point
+from services.forecast_cache import CWA_BASE_URL, CountyForecastCache, iter_county_towns
+from services.forecast_store import ForecastStore
 
-CWA_API = "https://opendata.cwa.gov.tw/api/v1/rest/datastore/F-A0085-005"
-CWA_API_KEY = os.getenv("CWA_API_KEY")
+CWA_API = f"{CWA_BASE_URL}/api/v1/rest/datastore/F-A0085-005"
 TW_TZ = timezone(timedelta(hours=8))
 
 def _normalize(s: str) -> str:
@@ -26,83 +25,101 @@ def _parse_iso8601(s: str) -> datetime:
         except Exception:
             return datetime.max.replace(tzinfo=TW_TZ)
 
-def get_district_by_point(session: Session, lat: float, lon: float) -> Optional[str]:
-    """用 PostGIS 判斷行政區（先 contains，再 50m 容錯，最後 KNN）。"""
-    pt = func.ST_SetSRID(func.ST_Point(lon, lat), 4326)
-
-    q1 = select(TaipeiDistrict.district_name).where(func.ST_Contains(TaipeiDistrict.geom, pt)).limit(1)
-    hit = session.execute(q1).scalar_one_or_none()
-    if hit:
-        return hit
-
-    q2 = (
-        select(TaipeiDistrict.district_name)
-        .where(func.ST_DWithin(func.Geography(TaipeiDistrict.geom), func.Geography(pt), 50.0))
-        .order_by(func.ST_Distance(func.Geography(TaipeiDistrict.geom), func.Geography(pt)))
-        .limit(1)
-    )
-    near = session.execute(q2).scalar_one_or_none()
-    if near:
-        return near
-
-    q3 = select(TaipeiDistrict.district_name).order_by(TaipeiDistrict.geom.op("<->")(pt)).limit(1)
-    return session.execute(q3).scalar_one_or_none()
-
-def fetch_tempdiff_forecast_for_town(town_name: str) -> Optional[Dict[str, Any]]:
+def _sort_key(x: Dict[str, Any]) -> datetime:
+    return _parse_iso8601(x["issue_time"]) if x.get("issue_time") else datetime.max.replace(tzinfo=TW_TZ)
+
+def _parse_county(data: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, List[Dict[str, Any]]]]:
+    """把整個臺北市資料集拆成 {TownName: forecasts}（依 IssueTime 排序）"""
+    index: Dict[str, List[Dict[str, Any]]] = {}
+    issue_key = None
+    for town, times in iter_county_towns(data):
+        out: List[Dict[str, Any]] = []
+        for t in times:
+            we = t.get("WeatherElements", {}) or {}
+            out.append({
+                "issue_time": t.get("IssueTime"),  # ISO8601(+08:00)
+                "start_time": t.get("StartTime"),  # 有些批次也會帶 Start/End
+                "end_time": t.get("EndTime"),
+                "temperature_difference_index": we.get("TemperatureDifferenceIndex"),
+                "temperature_difference_warning": we.get("TemperatureDifferenceWarning", "")
+            })
+        out.sort(key=_sort_key)
+        index[town] = out
+        latest = max((f["issue_time"] for f in out if f["issue_time"]), default=None)
+        if latest and (issue_key is None or latest > issue_key):
+            issue_key = latest
+    return issue_key, index
+
+_cache = CountyForecastCache("tempdiff", CWA_API, {"format": "JSON", "CountyName": "臺北市"}, _parse_county)
+
+_MAX_TIME = datetime.max.replace(tzinfo=TW_TZ)
+
+def _optional_time(s: Optional[str]) -> Optional[datetime]:
+    t = _parse_iso8601(s) if s else _MAX_TIME
+    return None if t == _MAX_TIME else t
+
+def _iso(t: Optional[datetime]) -> Optional[str]:
+    return t.astimezone(TW_TZ).isoformat() if t else None
+
+def _to_row(town: str, f: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    issue_time = _optional_time(f.get("issue_time"))
+    if issue_time is None:
+        return None
+    return {
+        "district": town,
+        "issue_time": issue_time,
+        "start_time": _optional_time(f.get("start_time")),
+        "end_time": _optional_time(f.get("end_time")),
+        "temperature_difference_index": f["temperature_difference_index"],
+        "temperature_difference_warning": f["temperature_difference_warning"],
+    }
+
+def _from_row(r: TempdiffForecast) -> Dict[str, Any]:
+    return {
+        "issue_time": _iso(r.issue_time),
+        "start_time": _iso(r.start_time),
+        "end_time": _iso(r.end_time),
+        "temperature_difference_index": r.temperature_difference_index,
+        "temperature_difference_warning": r.temperature_difference_warning,
+    }
+
+_store = ForecastStore(_cache, TempdiffForecast, _to_row, _from_row)
+
+def _town_payload(town_name: str, out: Optional[List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    if out is None:
+        return None
+    return {
+        "city": "臺北市",
+        "district": town_name,
+        "forecasts": out
+    }
+
+def fetch_tempdiff_forecast_for_town(session: Session, town_name: str) -> Optional[Dict[str, Any]]:
     """
-    取得「健康氣象溫差提醒指數」該行政區所有時段，並以 IssueTime 排序。
+    取得「健康氣象溫差提醒指數」該行政區最新一批時段，並以 IssueTime 排序。
+    先查 tempdiff_forecasts；表內沒有該區時退回共用快取（即時抓 CWA）。
     回傳:
     {
       city, district,
       forecasts: [{issue_time, start_time, end_time, temperature_difference_index, temperature_difference_warning}]
     }
     """
-    if not CWA_API_KEY:
-        raise RuntimeError("CWA_API_KEY is not set")
-
-    params = {
-        "Authorization": CWA_API_KEY,
-        "format": "JSON",
-        "CountyName": "臺北市",
-    }
-    r = requests.get(CWA_API, params=params, timeout=10)
-    r.raise_for_status()
-    data = r.json() or {}
-
-    records = data.get("records", {}) or {}
-    locations = records.get("Locations", []) or []
-    city_block = None
-    for loc in locations:
-        if _normalize(loc.get("CountyName")) == "臺北市":
-            city_block = loc
-            break
-    if not city_block:
-        return None
+    target = _normalize(town_name)
+    out = _store.town(session, target)
+    if out is None:
+        out = _cache.get_town(target)
+    return _town_payload(target, out)
 
+async def afetch_tempdiff_forecast_for_town(session_factory, town_name: str) -> Optional[Dict[str, Any]]:
+    """async 版（ASGI 模式）"""
     target = _normalize(town_name)
-    for item in city_block.get("Location", []) or []:
-        if _normalize(item.get("TownName")) == target:
-            out: List[Dict[str, Any]] = []
-            for t in item.get("Time", []) or []:
-                we = t.get("WeatherElements", {}) or {}
-                out.append({
-                    "issue_time": t.get("IssueTime"),  # ISO8601(+08:00)
-                    "start_time": t.get("StartTime"),  # 有些批次也會帶 Start/End
-                    "end_time": t.get("EndTime"),
-                    "temperature_difference_index": we.get("TemperatureDifferenceIndex"),
-                    "temperature_difference_warning": we.get("TemperatureDifferenceWarning", "")
-                })
-            # 依 IssueTime 排序
-            out.sort(key=lambda x: _parse_iso8601(x["issue_time"]) if x.get("issue_time") else datetime.max.replace(tzinfo=TW_TZ))
-            return {
-                "city": "臺北市",
-                "district": target,
-                "forecasts": out
-            }
-    return None
+    out = await _store.atown(session_factory, target)
+    if out is None:
+        out = await _cache.aget_town(target)
+    return _town_payload(target, out)
 
 def get_tempdiff_forecast_by_point(session: Session, lat: float, lon: float) -> Optional[Dict[str, Any]]:
     district = get_district_by_point(session, lat, lon)
     if not district:
         return None
-    return fetch_tempdiff_forecast_for_town(district)
+    return fetch_tempdiff_forecast_for_town(session, district)
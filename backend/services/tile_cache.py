@@ -0,0 +1,134 @@
+# backend/services/tile_cache.py
+"""
+向量圖磚快取：記憶體 LRU（依位元組數上限），可選擇把被擠出的圖磚寫到磁碟。
+
+- key 內含來源表版本，資料重新匯入後舊圖磚自然不會再被讀到；vector_tiles 另外會呼叫 drop_layer 釋放
+- 磁碟路徑 <TILE_CACHE_DIR>/<layer>/<version>/<z>/<x>/<y>.mvt.gz；換版本時刪掉該 layer 的舊版本目錄
+- 沒設 TILE_CACHE_DIR 就只用記憶體
+"""
+import gzip
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from services.geojson_snapshot import representations
+from services.metrics import cache_counter
+
+log = logging.getLogger(__name__)
+
+TILE_CACHE_MB = float(os.getenv("TILE_CACHE_MB", "64"))
+TILE_CACHE_DIR = os.getenv("TILE_CACHE_DIR") or None
+MVT_MIMETYPE = "application/vnd.mapbox-vector-tile"
+
+TileKey = Tuple[str, str, int, int, int]   # (layer, version, z, x, y)
+
+
+class Tile:
+    """與 geojson_snapshot.Snapshot 同介面，可直接交給 http_cache.snapshot_response。"""
+    __slots__ = ("body", "gzip", "br", "reps", "etag", "mimetype")
+
+    def __init__(self, body: bytes, gz: Optional[bytes] = None):
+        self.body = body
+        self.gzip = gz if gz is not None else gzip.compress(body, compresslevel=6)
+        self.br = None
+        self.reps = representations(body, self.gzip)
+        self.etag = self.reps["identity"][1]
+        self.mimetype = MVT_MIMETYPE
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.body) + len(self.gzip)
+
+
+class TileCache:
+    def __init__(self, max_bytes: int, spill_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self._tiles: "OrderedDict[TileKey, Tile]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = cache_counter("tiles", "hit")
+        self._disk_hits = cache_counter("tiles", "disk_hit")
+        self._misses = cache_counter("tiles", "miss")
+
+    def _path(self, key: TileKey) -> str:
+        layer, version, z, x, y = key
+        return os.path.join(self.spill_dir, layer, version, str(z), str(x), f"{y}.mvt.gz")
+
+    def get(self, key: TileKey) -> Optional[Tile]:
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                self._hits.inc()
+                return tile
+        if self.spill_dir:
+            try:
+                with open(self._path(key), "rb") as f:
+                    gz = f.read()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                log.warning("tile spill read failed: %s", key, exc_info=True)
+            else:
+                tile = Tile(gzip.decompress(gz), gz)
+                self._disk_hits.inc()
+                self.put(key, tile)
+                return tile
+        self._misses.inc()
+        return None
+
+    def put(self, key: TileKey, tile: Tile) -> None:
+        evicted: List[Tuple[TileKey, Tile]] = []
+        with self._lock:
+            old = self._tiles.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._tiles[key] = tile
+            self._bytes += tile.nbytes
+            while self._bytes > self.max_bytes and len(self._tiles) > 1:
+                k, t = self._tiles.popitem(last=False)
+                self._bytes -= t.nbytes
+                evicted.append((k, t))
+        # 磁碟 I/O 不佔鎖
+        if self.spill_dir:
+            for k, t in evicted:
+                self._spill(k, t)
+
+    def _spill(self, key: TileKey, tile: Tile) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(tile.gzip)
+            os.replace(tmp, path)
+        except OSError:
+            log.warning("tile spill write failed: %s", key, exc_info=True)
+
+    def drop_layer(self, layer: str, keep_version: Optional[str] = None) -> None:
+        """丟掉某 layer 除了 keep_version 以外的圖磚（記憶體與磁碟）。"""
+        with self._lock:
+            for k in [k for k in self._tiles if k[0] == layer and k[1] != keep_version]:
+                self._bytes -= self._tiles.pop(k).nbytes
+        if self.spill_dir:
+            root = os.path.join(self.spill_dir, layer)
+            try:
+                stale = [d for d in os.listdir(root) if d != keep_version]
+            except FileNotFoundError:
+                return
+            for d in stale:
+                shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"tiles": len(self._tiles), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "spill_dir": self.spill_dir}
+
+
+tile_cache = TileCache(int(TILE_CACHE_MB * 1024 * 1024), TILE_CACHE_DIR)
@@ -0,0 +1,147 @@
+# backend/services/vector_tiles.py
+"""
+Mapbox Vector Tile：/tiles/{layer}/{z}/{x}/{y}.mvt
+
+- 以 ST_TileEnvelope + ST_AsMVTGeom + ST_AsMVT 在 PostGIS 端產生，篩選走 geom 的 GiST 索引
+- 點圖層在 z < TILE_CLUSTER_BELOW_ZOOM 時做網格聚合：每 TILE_CLUSTER_PX 像素一格，
+  格線對齊全球圖磚格網，所以每格只落在一張圖磚內、相鄰圖磚不會重複計數；
+  聚合點屬性為 point_count（只有一筆時另帶 id）
+- 行政區圖層先依像素大小簡化再裁切
+- 結果放 tile_cache（key 含來源表指紋，每 TILE_CHECK_SEC 秒檢查一次；重新匯入後自動換版本）
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+
+from services.table_version import table_fingerprint
+from services.tile_cache import Tile, tile_cache
+
+EXTENT = 4096
+BUFFER = 64
+MAX_ZOOM = 22
+CLUSTER_BELOW_ZOOM = int(os.getenv("TILE_CLUSTER_BELOW_ZOOM", "15"))
+CLUSTER_PX = int(os.getenv("TILE_CLUSTER_PX", "64"))
+TILE_CHECK_SEC = float(os.getenv("TILE_CHECK_SEC", "30"))
+WEB_MERCATOR_WIDTH = 2 * 20037508.342789244
+
+
+class Layer(NamedTuple):
+    table: str
+    columns: str            # 非聚合時輸出的屬性欄位（SQL）
+    points: bool
+
+
+LAYERS: Dict[str, Layer] = {
+    "sites": Layer(
+        "cooling_sites",
+        "t.id, t.name, t.district_name, t.location_type, t.open_hours, "
+        "t.fan, t.ac, t.toilet, t.seating, t.drinking, t.accessible_seat",
+        True,
+    ),
+    "aeds": Layer("aed_sites", "t.id, t.name, t.address, t.place, t.category, t.type", True),
+    "districts": Layer("taipei_districts", "t.id, t.city_name, t.district_name", False),
+}
+
+_POINTS_SQL = """
+    WITH b AS (
+      SELECT ST_TileEnvelope(:z, :x, :y) AS env,
+             ST_Transform(ST_TileEnvelope(:z, :x, :y, margin => :margin), 4326) AS bbox
+    )
+    SELECT ST_AsMVT(q, :layer, :extent, 'geom', 'id') FROM (
+      SELECT {columns},
+             ST_AsMVTGeom(ST_Transform(t.geom, 3857), b.env, :extent, :buffer, true) AS geom
+        FROM {table} t, b
+       WHERE t.geom && b.bbox
+    ) q
+"""
+
+# 只取圖磚本身範圍內的點（不含 buffer），格子對齊圖磚邊界
+_CLUSTER_SQL = """
+    WITH b AS (
+      SELECT ST_TileEnvelope(:z, :x, :y) AS env
+    ), p AS (
+      SELECT t.id, ST_Transform(t.geom, 3857) AS g
+        FROM {table} t, b
+       WHERE t.geom && ST_Transform(b.env, 4326)
+    )
+    SELECT ST_AsMVT(q, :layer, :extent, 'geom') FROM (
+      SELECT count(*) AS point_count,
+             CASE WHEN count(*) = 1 THEN min(p.id) END AS id,
+             ST_AsMVTGeom(ST_Centroid(ST_Collect(p.g)), (SELECT env FROM b), :extent, 0, true) AS geom
+        FROM p
+       WHERE p.g && (SELECT env FROM b)
+       GROUP BY floor(ST_X(p.g) / :cell), floor(ST_Y(p.g) / :cell)
+    ) q
+"""
+
+_POLYGONS_SQL = """
+    WITH b AS (
+      SELECT ST_TileEnvelope(:z, :x, :y) AS env,
+             ST_Transform(ST_TileEnvelope(:z, :x, :y, margin => :margin), 4326) AS bbox
+    )
+    SELECT ST_AsMVT(q, :layer, :extent, 'geom', 'id') FROM (
+      SELECT {columns},
+             ST_AsMVTGeom(ST_SimplifyPreserveTopology(ST_Transform(t.geom, 3857), :px), b.env,
+                          :extent, :buffer, true) AS geom
+        FROM {table} t, b
+       WHERE t.geom && b.bbox
+    ) q
+    WHERE q.geom IS NOT NULL
+"""
+
+_versions: Dict[str, Tuple[float, Optional[str]]] = {}
+_versions_lock = threading.Lock()
+
+
+class TileOutOfRange(ValueError):
+    pass
+
+
+def _version(session, layer: str) -> str:
+    """來源表指紋的短雜湊；每 TILE_CHECK_SEC 秒才查一次資料庫，變了就丟掉該 layer 的舊圖磚。"""
+    checked_at, version = _versions.get(layer, (0.0, None))
+    now = time.monotonic()
+    if version is not None and now - checked_at < TILE_CHECK_SEC:
+        return version
+    fp = table_fingerprint(session, LAYERS[layer].table)
+    new = hashlib.sha1(repr(fp).encode()).hexdigest()[:12]
+    with _versions_lock:
+        _versions[layer] = (now, new)
+    if new != version:
+        tile_cache.drop_layer(layer, keep_version=new)
+    return new
+
+
+def _render(session, layer: str, z: int, x: int, y: int) -> bytes:
+    spec = LAYERS[layer]
+    tile_m = WEB_MERCATOR_WIDTH / (1 << z)
+    params = {"z": z, "x": x, "y": y, "layer": layer, "extent": EXTENT, "buffer": BUFFER,
+              "margin": BUFFER / EXTENT}
+    if spec.points and z < CLUSTER_BELOW_ZOOM:
+        sql = _CLUSTER_SQL
+        params["cell"] = tile_m / EXTENT * CLUSTER_PX
+    elif spec.points:
+        sql = _POINTS_SQL
+    else:
+        sql = _POLYGONS_SQL
+        params["px"] = tile_m / EXTENT
+    mvt = session.execute(text(sql.format(table=spec.table, columns=spec.columns)), params).scalar()
+    return bytes(mvt) if mvt else b""
+
+
+def get_tile(session, layer: str, z: int, x: int, y: int) -> Tile:
+    if layer not in LAYERS:
+        raise KeyError(layer)
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        raise TileOutOfRange(f"tile {z}/{x}/{y} out of range")
+    key = (layer, _version(session, layer), z, x, y)
+    tile = tile_cache.get(key)
+    if tile is None:
+        # 同一張圖磚同時 miss 最壞是各自算一次，結果相同
+        tile = Tile(_render(session, layer, z, x, y))
+        tile_cache.put(key, tile)
+    return tile
@@ -0,0 +1,33 @@
+# backend/tests/test_aed_service.py
+from services import aed_service, json_codec
+
+
+class _Session:
+    """只記下 SQL，回傳空結果。"""
+
+    def __init__(self):
+        self.sql = []
+
+    def execute(self, stmt):
+        self.sql.append(str(stmt))
+        return self
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return []
+
+    def scalar(self):
+        return None
+
+
+def test_python_and_db_builds_share_id_order(monkeypatch):
+    s = _Session()
+    monkeypatch.setattr(json_codec, "GEOJSON_BUILD", "python")
+    assert aed_service.all_aeds_geojson_body(s) == b'{"type":"FeatureCollection","features":[]}'
+    monkeypatch.setattr(json_codec, "GEOJSON_BUILD", "db")
+    assert aed_service.all_aeds_geojson_body(s) == b'{"type":"FeatureCollection","features":[]}'
+    python_sql, db_sql = s.sql
+    assert "ORDER BY aed_sites.id" in python_sql
+    assert "ORDER BY aed_sites.id" in db_sql
@@ -0,0 +1,78 @@
+# backend/tests/test_aqi_service.py
+import asyncio
+import json
+import warnings
+
+import numpy as np
+import pytest
+
+from services import aqi_service
+from services.aqi_service import AQI_NODATA, _grid_payload, _pm25_to_aqi_us_epa, pm25_to_aqi_array
+from services.cams_prefetch import CamsGrid
+
+
+@pytest.mark.parametrize("pm25,aqi,category", [
+    (0.0, 0, "Good"),
+    (12.0, 50, "Good"),
+    (12.05, 51, "Moderate"),          # 區間間隙歸到下一格
+    (35.4, 100, "Moderate"),
+    (600.0, 500, "Hazardous"),
+])
+def test_point_conversion(pm25, aqi, category):
+    assert _pm25_to_aqi_us_epa(pm25) == (aqi, category)
+
+
+def test_nan_is_no_data():
+    assert _pm25_to_aqi_us_epa(float("nan")) == (None, None)
+    aqi, cat = pm25_to_aqi_array([np.nan, 10.0])
+    assert aqi[0] == AQI_NODATA and cat[0] == AQI_NODATA
+
+
+def _grid(values):
+    pm25 = np.array([[values]], dtype=np.float32)      # (lead=1, lat=1, lon=n)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)    # 全 NaN 的 nanmean
+        return CamsGrid("2025-07-01 00:00 UTC", np.array([25.0]), np.arange(len(values)) * 0.4 + 121.0,
+                        [0], pm25)
+
+
+def test_grid_payload_nan_cell_is_valid_json():
+    out = _grid_payload(_grid([np.nan, 20.0]), 25.0, 121.0)
+    assert out["pm25_ugm3"] is None
+    assert out["aqi_pm25"] is None and out["aqi_category"] is None
+    json.loads(json.dumps(out, allow_nan=False))
+
+    out = _grid_payload(_grid([np.nan, 20.0]), 25.0, 121.4)
+    assert out["pm25_ugm3"] == 20.0 and out["aqi_category"] == "Moderate"
+
+
+# ---- /aqi/grid 與 /aqi/pm25 一樣會從 aqi_grid_cache 載回 ----
+
+@pytest.fixture()
+def cold_start(monkeypatch):
+    """記憶體沒有格點（剛啟動）；hydrate 回傳資料庫裡的最新 run。"""
+    grid = _grid([10.0, 20.0])
+    calls = []
+    monkeypatch.setattr(aqi_service, "current_grid", lambda: None)
+    monkeypatch.setattr(aqi_service.cams_store, "hydrate", lambda session: calls.append(session) or grid)
+    monkeypatch.setattr(aqi_service, "_hydrate_in_thread", lambda: calls.append("thread") or grid)
+    return calls
+
+
+def test_grid_hydrates_like_point(cold_start):
+    assert aqi_service.get_aqi_grid("session", lead_hour=0)["shape"] == [1, 2]
+    assert "error" not in aqi_service.get_aqi_by_point_cached("session", 25.0, 121.0)
+    assert cold_start == ["session", "session"]
+
+
+def test_async_grid_hydrates_like_point(cold_start):
+    out = asyncio.run(aqi_service.aget_aqi_grid(0))
+    assert out["leads"][0]["aqi"] == [42, 68]
+    assert "error" not in asyncio.run(aqi_service.aget_aqi_by_point_cached(25.0, 121.0))
+    assert cold_start == ["thread", "thread"]
+
+
+def test_grid_not_ready_without_cache(monkeypatch):
+    monkeypatch.setattr(aqi_service, "current_grid", lambda: None)
+    monkeypatch.setattr(aqi_service.cams_store, "hydrate", lambda session: None)
+    assert aqi_service.get_aqi_grid("session") is None
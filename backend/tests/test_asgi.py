@@ -0,0 +1,105 @@
+# backend/tests/test_asgi.py
+"""ASGI 版的 async 路由與 Flask 版回傳相同的狀態碼與內容。"""
+import pytest
+from flask import Flask
+from starlette.testclient import TestClient
+
+from routes import aqi as aqi_route
+from routes import notify_internal
+
+
+@pytest.fixture()
+def clients(monkeypatch):
+    monkeypatch.setenv("CAMS_PREFETCH", "0")
+    monkeypatch.setenv("CWA_REFRESH", "0")
+    import asgi
+    from app import create_app
+
+    flask_app = create_app()
+    monkeypatch.setattr(notify_internal, "INTERNAL_API_KEY", "k")
+
+    class _Session:
+        def close(self):
+            pass
+
+    monkeypatch.setattr(aqi_route, "SessionLocal", _Session)
+    with TestClient(asgi.create_asgi_app(flask_app)) as ac:
+        yield flask_app.test_client(), ac, asgi
+
+
+def _both(clients, method, path, **kw):
+    fc, ac, _ = clients
+    a = getattr(ac, method)(path, **kw)
+    f = getattr(fc, method)(path, **kw)
+    return (f.status_code, f.get_json()), (a.status_code, a.json())
+
+
+@pytest.mark.parametrize("path", ["/aqi/pm25", "/aqi/pm25?lat=x&lon=1", "/aqi/grid?lead=x",
+                                  "/heat/forecast", "/tempdiff/forecast?lat=25"])
+def test_bad_params_same_400(clients, path):
+    f, a = _both(clients, "get", path)
+    assert f == a and f[0] == 400
+
+
+def test_aqi_not_ready_same_503(clients, monkeypatch):
+    _, _, asgi = clients
+    err = {"error": "CAMS data not ready yet"}
+
+    async def aget_point(lat, lon):
+        return err
+
+    async def aget_grid(lead_hour):
+        return None
+
+    monkeypatch.setattr(aqi_route, "get_aqi_by_point_cached", lambda s, lat, lon: err)
+    monkeypatch.setattr(aqi_route, "get_aqi_grid", lambda s, lead_hour: None)
+    monkeypatch.setattr(asgi, "aget_aqi_by_point_cached", aget_point)
+    monkeypatch.setattr(asgi, "aget_aqi_grid", aget_grid)
+    for path in ("/aqi/pm25?lat=25&lon=121.5", "/aqi/grid"):
+        f, a = _both(clients, "get", path)
+        assert f == a == (503, err)
+
+
+def test_aqi_grid_unknown_lead_same_400(clients, monkeypatch):
+    _, _, asgi = clients
+    empty = {"leads": []}
+
+    async def aget_grid(lead_hour):
+        return empty
+
+    monkeypatch.setattr(aqi_route, "get_aqi_grid", lambda s, lead_hour: empty)
+    monkeypatch.setattr(asgi, "aget_aqi_grid", aget_grid)
+    f, a = _both(clients, "get", "/aqi/grid?lead=99")
+    assert f == a == (400, {"error": "unknown lead hour"})
+
+
+@pytest.mark.parametrize("headers,body,status", [
+    ({}, {"token": "t"}, 401),
+    ({"X-API-Key": "k"}, {"title": "t"}, 400),
+    ({"X-API-Key": "k"}, {"token": "t", "data": {"level": 3}}, 400),
+])
+def test_notify_errors_match(clients, headers, body, status):
+    fc, ac, _ = clients
+    f = fc.post("/internal/notify", headers=headers, json=body)
+    a = ac.post("/internal/notify", headers=headers, json=body)
+    assert f.status_code == a.status_code == status
+    assert f.content_type.split(";")[0] == a.headers["content-type"].split(";")[0]
+    assert f.get_data(as_text=True).strip() == a.text.strip()
+
+
+def test_notify_token_same_result(clients, monkeypatch):
+    _, _, asgi = clients
+    sent = {"success": True, "message": "projects/p/messages/1"}
+
+    async def asend(token, title, body, data):
+        return sent
+
+    monkeypatch.setattr(notify_internal, "send_to_token", lambda *a: sent)
+    monkeypatch.setattr(asgi.push_service_rest, "asend_to_token", asend)
+    f, a = _both(clients, "post", "/internal/notify", headers={"X-API-Key": "k"}, json={"token": "t"})
+    assert f == a == (200, sent)
+
+
+def test_other_routes_fall_through_to_flask(clients):
+    _, ac, _ = clients
+    assert ac.get("/health").json() == {"ok": True}
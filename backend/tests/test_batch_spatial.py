@@ -0,0 +1,58 @@
+# backend/tests/test_batch_spatial.py
+import pytest
+from flask import Flask
+
+from routes import batch
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    calls = []
+
+    class _Session:
+        def close(self):
+            pass
+
+    def fake_batch(s, lats, lons, **kw):
+        calls.append((lats, lons, kw))
+        return [{"i": i} for i in range(len(lats))]
+
+    monkeypatch.setattr(batch, "SessionLocal", _Session)
+    monkeypatch.setattr(batch, "batch_spatial", fake_batch)
+    app = Flask(__name__)
+    app.register_blueprint(batch.bp)
+    return app.test_client(), calls
+
+
+def test_points_in_both_shapes_keep_order(client):
+    c, calls = client
+    r = c.post("/batch/spatial", json={
+        "points": [{"lat": 25.03, "lon": 121.56}, [25.1, "121.5"]],
+        "ops": {"district": True, "aed": {"k": 3}, "cooling": {"k": 2, "r": 500}},
+    })
+    assert r.get_json() == {"count": 2, "results": [{"i": 0}, {"i": 1}]}
+    assert calls == [([25.03, 25.1], [121.56, 121.5],
+                      {"district": True, "aed_k": 3, "cooling_k": 2, "cooling_radius_m": 500.0})]
+
+
+def test_op_true_means_k1(client):
+    c, calls = client
+    c.post("/batch/spatial", json={"points": [[25, 121.5]], "ops": {"aed": True}})
+    assert calls[0][2] == {"district": False, "aed_k": 1, "cooling_k": 0, "cooling_radius_m": None}
+
+
+@pytest.mark.parametrize("body", [
+    {"ops": {"district": True}},
+    {"points": [], "ops": {"district": True}},
+    {"points": [[25.0]], "ops": {"district": True}},
+    {"points": [{"lat": "x", "lon": 121.5}], "ops": {"district": True}},
+    {"points": [[25, 121.5]]},
+    {"points": [[25, 121.5]], "ops": {"aed": {"k": 0}}},
+    {"points": [[25, 121.5]], "ops": {"aed": {"k": batch.MAX_K + 1}}},
+    {"points": [[25, 121.5]], "ops": {"cooling": {"r": -1}}},
+    {"points": [[25, 121.5]] * (batch.MAX_POINTS + 1), "ops": {"district": True}},
+])
+def test_bad_requests(client, body):
+    c, calls = client
+    assert c.post("/batch/spatial", json=body).status_code == 400
+    assert calls == []
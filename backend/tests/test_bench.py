@@ -0,0 +1,94 @@
+# backend/tests/test_bench.py
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from bench.compare import compare
+from bench.fakes import CANNED_REFERENCE_TIME, HEAT_DATASET, TAIPEI_TOWNS, FakeUpstreams, write_canned_netcdf
+from bench.stats import latency_summary, pct
+from bench.workload import TAIPEI_BBOX, random_points
+
+
+def test_pct_nearest_rank_unsorted():
+    values = [5.0, 1.0, 4.0, 2.0, 3.0]
+    assert pct(values, 0) == 1.0
+    assert pct(values, 50) == 3.0
+    assert pct(values, 100) == 5.0
+    assert pct([7.0], 99) == 7.0
+
+
+def test_latency_summary():
+    out = latency_summary([float(i) for i in range(1, 101)], 2.0)
+    assert out["throughput_rps"] == 50.0
+    assert out["p50_ms"] == 50.5 and out["p99_ms"] == 99.0 and out["max_ms"] == 100.0
+    assert latency_summary([], 0.0) == {"elapsed_sec": 0.0, "throughput_rps": 0.0}
+
+
+def _result(p95, rps, q=1.0, errors=0):
+    return {"p95_ms": p95, "throughput_rps": rps, "queries_per_request": q, "errors": errors}
+
+
+def test_compare_flags_regressions_only():
+    old = {"results": {"a": _result(10, 100), "b": _result(10, 100), "c": _result(1, 100), "gone": _result(1, 1)}}
+    new = {"results": {"a": _result(20, 70, q=2.0, errors=3), "b": _result(11, 95),
+                       "c": _result(2.5, 100), "new": _result(1, 1)}}
+    rows = {r["case"]: r for r in compare(old, new, threshold=0.2, min_ms=2.0)}
+    assert rows["a"]["status"] == "regression" and len(rows["a"]["reasons"]) == 4
+    assert rows["b"]["status"] == "ok"
+    assert rows["c"]["status"] == "ok"                  # 比例大但不到 min_ms
+    assert rows["gone"]["status"] == "removed" and rows["new"]["status"] == "added"
+
+
+def test_random_points_reproducible_inside_bbox():
+    pts = random_points(50, seed=3)
+    assert pts == random_points(50, seed=3) != random_points(50, seed=4)
+    min_lon, min_lat, max_lon, max_lat = TAIPEI_BBOX
+    assert all(min_lat <= lat <= max_lat and min_lon <= lon <= max_lon for lat, lon in pts)
+
+
+# ---- 假上游 ----
+
+@pytest.fixture()
+def fakes():
+    srv = FakeUpstreams(("127.0.0.1", 0)).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _call(url, body=None):
+    req = urllib.request.Request(url, data=json.dumps(body).encode() if body is not None else None,
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as r:
+            return r.status, json.loads(r.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_fake_cwa_and_town_filter(fakes):
+    url = f"{fakes.base_url}/api/v1/rest/datastore/{HEAT_DATASET}"
+    status, body = _call(url)
+    towns = body["records"]["Locations"][0]["Location"]
+    assert status == 200 and [t["TownName"] for t in towns] == TAIPEI_TOWNS
+    status, body = _call(url + "?TownName=" + urllib.request.quote("大安區"))
+    assert [t["TownName"] for t in body["records"]["Locations"][0]["Location"]] == ["大安區"]
+    assert fakes.stats() == {f"cwa:{HEAT_DATASET}": 2}
+
+
+def test_fake_fcm_bad_tokens_unregistered(fakes):
+    url = f"{fakes.base_url}/v1/projects/bench/messages:send"
+    assert _call(url, {"message": {"token": "ok1"}})[0] == 200
+    status, body = _call(url, {"message": {"token": "bad1"}})
+    assert status == 404 and body["error"]["details"][0]["errorCode"] == "UNREGISTERED"
+    assert _call(f"{fakes.base_url}/__fake/stats") == (200, {"fcm": 2})
+
+
+def test_canned_netcdf_decodes(tmp_path):
+    from services.cams_prefetch import LEAD_HOURS, decode_grid
+
+    grid = decode_grid(write_canned_netcdf(str(tmp_path / "cams.nc")), CANNED_REFERENCE_TIME)
+    assert grid.lead_hours == LEAD_HOURS
+    assert 5.0 <= grid.lookup(25.04, 121.56)[0] <= 60.0     # kg m-3 已換成 µg/m³
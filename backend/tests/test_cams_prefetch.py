@@ -0,0 +1,223 @@
+# backend/tests/test_cams_prefetch.py
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from services import cams_prefetch
+from services.cams_prefetch import CamsGrid, CamsPrefetcher, _iter_latest_refs, decode_grid
+
+LATS = np.array([25.3, 25.2, 25.1, 25.0, 24.9])       # CAMS 的緯度由北往南
+LONS = np.array([121.3, 121.4, 121.5, 121.6, 121.7])
+
+
+def _grid(ref="2025-07-01 12:00 UTC", value=10.0):
+    pm25 = np.full((2, LATS.size, LONS.size), value, dtype=np.float32)
+    pm25[1] += 2.0                                       # 兩個 lead 平均後 = value + 1
+    return CamsGrid(ref, LATS, LONS, [0, 3], pm25)
+
+
+def test_lookup_snaps_to_nearest_cell_and_clamps():
+    pm25 = np.arange(LATS.size * LONS.size, dtype=np.float32).reshape(1, LATS.size, LONS.size)
+    grid = CamsGrid("r", LATS, LONS, [0], pm25)
+    assert grid.nearest_index(25.04, 121.56) == (3, 3)
+    assert grid.lookup(25.04, 121.56) == (18.0, 25.0, 121.6)
+    assert grid.nearest_index(30.0, 100.0) == (0, 0)    # 範圍外夾到邊界
+    assert grid.nearest_index(0.0, 180.0) == (4, 4)
+
+
+def test_lookup_averages_leads():
+    assert _grid(value=10.0).lookup(25.0, 121.5)[0] == 11.0
+
+
+def test_decode_grid_converts_kg_to_ug(tmp_path):
+    steps = np.array([0, 3, 6], dtype="timedelta64[h]")
+    data = np.full((1, steps.size, LATS.size, LONS.size), 20e-9)
+    ds = xr.Dataset(
+        {"pm2p5": (("forecast_reference_time", "forecast_period", "latitude", "longitude"), data,
+                   {"units": "kg m**-3"})},
+        coords={"forecast_reference_time": [np.datetime64("2025-07-01T12:00")],
+                "forecast_period": steps, "latitude": LATS, "longitude": LONS},
+    )
+    path = tmp_path / "cams.nc"
+    ds.to_netcdf(path)
+
+    grid = decode_grid(str(path), "2025-07-01 12:00 UTC")
+    assert grid.lead_hours == [0, 3, 6]
+    assert grid.pm25.shape == (3, LATS.size, LONS.size)
+    assert grid.lookup(25.0, 121.5)[0] == pytest.approx(20.0)
+
+
+def test_latest_refs_order():
+    now = datetime(2025, 7, 2, 3, tzinfo=timezone.utc)
+    assert list(_iter_latest_refs(now)) == [
+        ("2025-07-02", "12:00"), ("2025-07-02", "00:00"),
+        ("2025-07-01", "12:00"), ("2025-07-01", "00:00"),
+    ]
+
+
+# ---- refresh_once：找最新可用的 run，已載入就不重抓 ----
+
+@pytest.fixture()
+def fixed_now(monkeypatch):
+    class _Dt(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2025, 7, 2, 3, tzinfo=timezone.utc)
+
+    monkeypatch.setattr(cams_prefetch, "datetime", _Dt)
+
+
+def test_refresh_falls_back_to_older_run(monkeypatch, fixed_now):
+    tried = []
+
+    def fake_download(self, date_str, time_str, ref):
+        tried.append(ref)
+        if time_str == "12:00":
+            raise RuntimeError("not yet published")
+        return _grid(ref)
+
+    monkeypatch.setattr(CamsPrefetcher, "_download", fake_download)
+    p = CamsPrefetcher()
+    assert p.refresh_once().reference_time == "2025-07-02 00:00 UTC"
+    assert tried == ["2025-07-02 12:00 UTC", "2025-07-02 00:00 UTC"]
+
+    tried.clear()
+    p.refresh_once()
+    assert tried == ["2025-07-02 12:00 UTC"]             # 碰到目前的 run 就停
+
+
+def test_load_file_replaces_current_grid(tmp_path, monkeypatch):
+    p = CamsPrefetcher()
+    monkeypatch.setattr(cams_prefetch, "decode_grid", lambda path, ref: _grid(ref))
+    assert p.load_file(str(tmp_path / "x.nc"), "2025-07-01 00:00 UTC") is p.grid
+    assert p.grid.reference_time == "2025-07-01 00:00 UTC"
+
+
+# ---- 同一個 run 只下載一次（process 內 Future、跨 process advisory lock）----
+
+class _Store:
+    """假 store：held=True 模擬別的 process 正拿著這個 run 的鎖。"""
+
+    def __init__(self, held=False):
+        self.held = held
+        self.runs = {}
+        self.saved = []
+
+    def load_latest(self):
+        return None
+
+    def load_run(self, ref):
+        return self.runs.get(ref)
+
+    def save(self, grid):
+        self.saved.append(grid.reference_time)
+        self.runs[grid.reference_time] = grid
+
+    @contextmanager
+    def run_lock(self, ref):
+        yield not self.held
+
+
+@pytest.fixture()
+def downloads(monkeypatch):
+    calls, gate = [], threading.Event()
+
+    def fake_download(self, date_str, time_str, ref):
+        calls.append(ref)
+        gate.wait(5)
+        return _grid(ref)
+
+    monkeypatch.setattr(CamsPrefetcher, "_download", fake_download)
+    monkeypatch.setattr(cams_prefetch, "LOCK_POLL_SEC", 0.01)
+    return calls, gate
+
+
+def test_concurrent_fetches_share_one_download(downloads):
+    calls, gate = downloads
+    p = CamsPrefetcher(store=_Store())
+    with ThreadPoolExecutor(8) as ex:
+        futs = [ex.submit(p.fetch_run, "2025-07-01", "12:00") for _ in range(8)]
+        while not calls:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        gate.set()
+        grids = [f.result(timeout=5) for f in futs]
+    assert calls == ["2025-07-01 12:00 UTC"]
+    assert all(g is grids[0] for g in grids)
+    assert p.store.saved == ["2025-07-01 12:00 UTC"]
+    assert p._inflight == {}
+
+
+def test_waiters_get_leader_exception(monkeypatch):
+    gate = threading.Event()
+
+    def boom(self, date_str, time_str, ref):
+        gate.wait(5)
+        raise RuntimeError("CDS down")
+
+    monkeypatch.setattr(CamsPrefetcher, "_download", boom)
+    p = CamsPrefetcher()
+    with ThreadPoolExecutor(4) as ex:
+        futs = [ex.submit(p.fetch_run, "2025-07-01", "12:00") for _ in range(4)]
+        time.sleep(0.05)
+        gate.set()
+        for f in futs:
+            with pytest.raises(RuntimeError, match="CDS down"):
+                f.result(timeout=5)
+    assert p._inflight == {}                            # 下次還能重試
+
+
+def test_peer_holding_lock_result_read_from_store(downloads):
+    calls, gate = downloads
+    gate.set()
+    store = _Store(held=True)
+    p = CamsPrefetcher(store=store)
+
+    def peer_finishes():
+        time.sleep(0.05)
+        store.runs["2025-07-01 12:00 UTC"] = _grid("2025-07-01 12:00 UTC")
+        store.held = False
+
+    t = threading.Thread(target=peer_finishes)
+    t.start()
+    grid = p.fetch_run("2025-07-01", "12:00")
+    t.join()
+    assert grid.reference_time == "2025-07-01 12:00 UTC"
+    assert calls == [] and store.saved == []
+
+
+def test_gives_up_after_wait(downloads, monkeypatch):
+    calls, _ = downloads
+    monkeypatch.setattr(cams_prefetch, "FETCH_WAIT_SEC", 0.0)
+    p = CamsPrefetcher(store=_Store(held=True))
+    assert p.fetch_run("2025-07-01", "12:00") is None
+    assert calls == []
+
+
+def test_run_lock_excludes_other_connections():
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL not set")
+    from sqlalchemy import create_engine
+
+    from services.cams_store import CamsGridStore
+
+    engine = create_engine(url)
+    store = CamsGridStore(None, engine)
+    try:
+        with store.run_lock("2025-07-01 12:00 UTC") as first:
+            with store.run_lock("2025-07-01 12:00 UTC") as second:
+                assert first and not second
+            with store.run_lock("2025-07-02 00:00 UTC") as other:
+                assert other                            # 不同 run 不互斥
+        with store.run_lock("2025-07-01 12:00 UTC") as again:
+            assert again                                # 離開後已釋放
+    finally:
+        engine.dispose()
@@ -0,0 +1,81 @@
+# backend/tests/test_cams_store.py
+import math
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from sqlalchemy import text
+
+from services import cams_store
+from services.cams_prefetch import CamsGrid
+
+DDL = os.path.join(os.path.dirname(__file__), "..", "..", "db", "06_create_aqi_cache.sql")
+
+
+def _grid(run_time):
+    pm25 = np.arange(2 * 2 * 3, dtype=np.float32).reshape(2, 2, 3)
+    pm25[1, 0, 0] = np.nan                                  # 缺值存 NaN
+    return CamsGrid(run_time.strftime(cams_store.REF_TIME_FORMAT), np.array([25.2, 25.0]),
+                    np.array([121.4, 121.5, 121.6]), [0, 3], pm25)
+
+
+def _partitions(session):
+    return set(session.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'aqi_grid_cache'::regclass"
+    )).scalars())
+
+
+@pytest.fixture()
+def session(pg_commit_session):
+    with open(DDL, encoding="utf-8") as f:
+        pg_commit_session.execute(text(f.read()))
+    return pg_commit_session
+
+
+def test_save_creates_day_partition_and_is_idempotent(session):
+    run = datetime(2025, 7, 1, 12, tzinfo=timezone.utc)
+    assert cams_store.save(session, _grid(run)) == 12
+    cams_store.save(session, _grid(run))
+    assert "aqi_grid_cache_p20250701" in _partitions(session)
+    assert session.execute(text("SELECT count(*) FROM aqi_grid_cache_p20250701")).scalar() == 12
+
+
+def test_load_latest_round_trip(session):
+    old = datetime(2025, 7, 1, 0, tzinfo=timezone.utc)
+    new = datetime(2025, 7, 1, 12, tzinfo=timezone.utc)
+    for run in (old, new):
+        cams_store.save(session, _grid(run))
+    grid = cams_store.load_latest(session)
+    src = _grid(new)
+    assert grid.reference_time == src.reference_time
+    assert grid.lead_hours == [0, 3]
+    np.testing.assert_array_equal(grid.lats, src.lats)
+    np.testing.assert_array_equal(grid.lons, src.lons)
+    np.testing.assert_array_equal(grid.pm25, src.pm25)      # NaN 位置也相同
+    assert math.isnan(grid.pm25[1, 0, 0])
+
+
+def test_load_latest_empty(session):
+    session.execute(text("DELETE FROM aqi_grid_cache"))
+    assert cams_store.load_latest(session) is None
+
+
+def test_prune_drops_only_expired_partitions(session):
+    now = datetime.now(timezone.utc)
+    expired = now - timedelta(days=cams_store.RETENTION_DAYS + 2)
+    kept = now - timedelta(days=cams_store.RETENTION_DAYS - 1)
+    for run in (expired, kept, now):
+        cams_store.ensure_partition(session, run)
+    session.execute(text(
+        "CREATE TABLE aqi_grid_cache_manual PARTITION OF aqi_grid_cache "
+        "FOR VALUES FROM ('2000-01-01') TO ('2000-01-02')"
+    ))
+
+    dropped = cams_store.prune(session)
+    assert dropped == [cams_store._partition_name(expired.replace(hour=0, minute=0, second=0, microsecond=0))]
+    left = _partitions(session)
+    assert f"aqi_grid_cache_p{kept:%Y%m%d}" in left
+    assert f"aqi_grid_cache_p{now:%Y%m%d}" in left
+    assert "aqi_grid_cache_manual" in left                 # 不是本模組建立的分區不動
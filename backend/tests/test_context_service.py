@@ -0,0 +1,70 @@
+# backend/tests/test_context_service.py
+import threading
+
+import pytest
+
+from services import context_service
+
+
+@pytest.fixture()
+def ctx(monkeypatch):
+    """上游全換成假的；heat / tempdiff 卡在 gate 上模擬 CWA 很慢。"""
+    gate = threading.Event()
+
+    class _Session:
+        @staticmethod
+        def remove():
+            pass
+
+        def __call__(self):
+            return None
+
+    def slow_cwa(s, town):
+        gate.wait(5)
+        return {"town": town}
+
+    monkeypatch.setattr(context_service, "SessionLocal", _Session())
+    monkeypatch.setattr(context_service, "resolve_district", lambda s, lat, lon: {"district": "大安區"})
+    monkeypatch.setattr(context_service, "fetch_heat_forecast_for_town", slow_cwa)
+    monkeypatch.setattr(context_service, "fetch_tempdiff_forecast_for_town", slow_cwa)
+    monkeypatch.setattr(context_service, "get_aqi_by_point_cached", lambda s, lat, lon: {"aqi": 42})
+    monkeypatch.setattr(context_service, "get_nearest_aed_geojson",
+                        lambda s, **kw: {"type": "FeatureCollection", "features": [{"id": 1}]})
+    monkeypatch.setattr(context_service, "nearest_cooling_site_geojson",
+                        lambda s, **kw: {"type": "FeatureCollection", "features": []})
+    monkeypatch.setitem(context_service.SECTION_TIMEOUTS, "heat", 0.05)
+    monkeypatch.setitem(context_service.SECTION_TIMEOUTS, "tempdiff", 0.05)
+    monkeypatch.setattr(context_service, "_lanes",
+                        {name: context_service._Lane(name, 1) for name in context_service.LANE_WORKERS})
+    yield
+    gate.set()
+
+
+def test_slow_cwa_does_not_starve_db_sections(ctx):
+    for _ in range(3):      # cwa 池（1 worker × 2）塞滿後直接回 busy，不排隊
+        out = context_service.get_context(None, 25.03, 121.54)["sections"]
+        assert out["aeds"]["status"] == "ok"
+        assert out["sites"]["status"] == "empty"
+        assert out["aqi"] == {"status": "ok", "data": {"aqi": 42}}
+    assert out["heat"]["status"] in ("timeout", "busy")
+    assert out["tempdiff"]["status"] == "busy"
+
+
+def test_section_error_hides_details(ctx, monkeypatch):
+    def boom(s, **kw):
+        raise RuntimeError('relation "aed_sites" does not exist')
+
+    monkeypatch.setattr(context_service, "get_nearest_aed_geojson", boom)
+    out = context_service.get_context(None, 25.03, 121.54)["sections"]
+    assert out["aeds"] == {"status": "error", "error": "internal_error"}
+
+
+def test_lane_rejects_when_full():
+    lane = context_service._Lane("t", 1)
+    gate = threading.Event()
+    futs = [lane.submit(gate.wait) for _ in range(context_service.CONTEXT_QUEUE_FACTOR)]
+    assert all(futs)
+    assert lane.submit(gate.wait) is None
+    assert futs[-1].cancel()            # 排隊中的可取消，名額隨即釋出
+    assert lane.submit(lambda: None) is not None
+    gate.set()
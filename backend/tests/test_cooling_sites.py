@@ -0,0 +1,166 @@
+# backend/tests/test_cooling_sites.py
+import json
+import os
+
+import pytest
+from flask import Flask
+from sqlalchemy.dialects import postgresql
+
+from routes import cooling_sites
+from services import cooling_sites_service, json_codec
+from services.cooling_sites_service import decode_cursor, encode_cursor, iter_cooling_sites_geojson
+
+
+def _sql(stmt):
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+class _Session:
+    """db build：每列 (id, feature 文字)；記下 SQL 與 yield_per。"""
+
+    def __init__(self, n):
+        self.rows = [(i, json.dumps({"type": "Feature", "id": i})) for i in range(1, n + 1)]
+        self.stmts = []
+
+    def execute(self, stmt):
+        self.stmts.append(stmt)
+        return iter(self.rows[:stmt._limit])
+
+
+# ---- keyset 游標 ----
+
+def test_cursor_round_trip_and_opaque():
+    c = encode_cursor(1234)
+    assert "1234" not in c and "=" not in c
+    assert decode_cursor(c) == 1234
+
+
+@pytest.mark.parametrize("raw", ["!!!", encode_cursor(1)[:-2], "eyJhZnRlciI6LTF9", "eyJhZnRlciI6IngifQ"])
+def test_bad_cursor_rejected(raw):                  # 亂碼、截斷、after=-1、after="x"
+    with pytest.raises(Exception):
+        decode_cursor(raw)
+
+
+def test_keyset_and_bbox_in_sql():
+    sql = _sql(cooling_sites_service._sites_query(11, after_id=42, bbox=(121.4, 25.0, 121.6, 25.1)))
+    assert "cooling_sites.id > " in sql
+    assert "cooling_sites.geom && ST_MakeEnvelope(" in sql
+    assert "ORDER BY cooling_sites.id ASC" in sql
+    assert "OFFSET" not in sql
+
+
+# ---- 串流輸出 ----
+
+@pytest.mark.parametrize("n,limit,has_next", [(10, 5, True), (5, 5, False), (0, 5, False)])
+def test_stream_is_valid_geojson_with_next(monkeypatch, n, limit, has_next):
+    monkeypatch.setattr(json_codec, "GEOJSON_BUILD", "db")
+    s = _Session(n)
+    body = json.loads("".join(iter_cooling_sites_geojson(s, limit=limit, after_id=3)))
+    assert [f["id"] for f in body["features"]] == list(range(1, min(n, limit) + 1))
+    assert body["next"] == (encode_cursor(limit) if has_next else None)
+    assert s.stmts[0].get_execution_options()["yield_per"] == cooling_sites_service.STREAM_BATCH_ROWS
+    assert s.stmts[0]._limit == limit + 1                    # 多抓一筆判斷下一頁
+
+
+# ---- /sites 參數 ----
+
+@pytest.fixture()
+def client(monkeypatch):
+    calls = []
+
+    class _Closable:
+        def close(self):
+            pass
+
+    def fake_iter(session, **kw):
+        calls.append(kw)
+        yield '{"type":"FeatureCollection","features":[],"next":null}'
+
+    monkeypatch.setattr(cooling_sites, "SessionLocal", _Closable)
+    monkeypatch.setattr(cooling_sites, "iter_cooling_sites_geojson", fake_iter)
+    app = Flask(__name__)
+    app.register_blueprint(cooling_sites.bp)
+    return app.test_client(), calls
+
+
+def test_sites_cursor_and_bbox_are_streamed(client):
+    c, calls = client
+    r = c.get(f"/sites?cursor={encode_cursor(99)}&bbox=121.4,25.0,121.6,25.1&limit=5000")
+    assert r.status_code == 200 and r.mimetype == "application/geo+json"
+    assert calls[0]["after_id"] == 99
+    assert calls[0]["bbox"] == (121.4, 25.0, 121.6, 25.1)
+    assert calls[0]["limit"] == 5000
+
+
+@pytest.mark.parametrize("query", [
+    "cursor=!!!",
+    "bbox=121.6,25.0,121.4,25.1",                  # min > max
+    "bbox=121.4,25.0",
+    f"limit={cooling_sites.MAX_PAGE + 1}",
+    "limit=0",
+    f"offset=10&cursor={encode_cursor(1)}",
+])
+def test_sites_bad_params(client, query):
+    c, calls = client
+    assert c.get(f"/sites?{query}").status_code == 400
+    assert calls == []
+
+
+# ---- 設施位元遮罩 ----
+
+def test_parse_amenities():
+    assert cooling_sites_service.parse_amenities("ac, toilet,,") == 2 | 4
+    assert cooling_sites_service.parse_amenities(None) == 0
+    with pytest.raises(ValueError):
+        cooling_sites_service.parse_amenities("ac,pool")
+
+
+def test_amenity_filter_sql():
+    sql = _sql(cooling_sites_service._sites_query(10, amenities=6))
+    assert "(cooling_sites.amenities & %(amenities_1)s::SMALLINT) = %(param_1)s::SMALLINT" in sql
+
+
+def test_amenity_bits_match_generated_column(pg_session):
+    """AMENITY_BITS 與 db/10 的 generated column 位元一致（暫存表同名，遮住正式表）。"""
+    from sqlalchemy import text
+
+    names = list(cooling_sites_service.AMENITY_BITS)
+    pg_session.execute(text("CREATE TEMP TABLE cooling_sites (id int, "
+                            + ", ".join(f"{n} boolean" for n in names) + ")"))
+    with open(os.path.join(os.path.dirname(__file__), "..", "..", "db", "10_cooling_sites_amenities.sql"),
+              encoding="utf-8") as f:
+        pg_session.connection().exec_driver_sql(f.read())   # 註解裡有 :mask，不經 text() 的 bind 解析
+    for i, n in enumerate(names):
+        pg_session.execute(text(f"INSERT INTO cooling_sites (id, {n}) VALUES (:i, true)"), {"i": i})
+    pg_session.execute(text("INSERT INTO cooling_sites (id) VALUES (-1)"))        # NULL 視為沒有
+    got = dict(pg_session.execute(text("SELECT id, amenities FROM cooling_sites")).all())
+    assert got == {-1: 0, **{i: cooling_sites_service.AMENITY_BITS[n] for i, n in enumerate(names)}}
+
+
+def test_nearest_from_index_applies_mask():
+    from services.point_index import PointIndex
+
+    # 由近到遠：只有冷氣、冷氣+廁所、冷氣+廁所
+    idx = PointIndex([1, 2, 3], [25.000, 25.001, 25.002], [121.5] * 3, {"id": [1, 2, 3]}, bits=[2, 6, 6])
+    fc = cooling_sites_service._nearest_from_index(idx, 25.0, 121.5, 1000, 2, amenities=2 | 4)
+    assert [f["id"] for f in fc["features"]] == [3, 2]           # 由遠到近，同 PostGIS 版
+    assert fc["features"][1]["properties"]["distance_m"] == pytest.approx(111, abs=1)
+
+
+def test_nearest_route_passes_amenities(monkeypatch):
+    calls = []
+
+    class _Closable:
+        def close(self):
+            pass
+
+    monkeypatch.setattr(cooling_sites, "SessionLocal", _Closable)
+    monkeypatch.setattr(cooling_sites, "nearest_cooling_site_geojson",
+                        lambda s, **kw: calls.append(kw) or {"type": "FeatureCollection", "features": []})
+    app = Flask(__name__)
+    app.register_blueprint(cooling_sites.bp)
+    c = app.test_client()
+    assert c.get("/sites/nearest?lat=25&lon=121.5&amenities=ac,drinking").status_code == 200
+    assert calls[0]["amenities"] == 2 | 16
+    r = c.get("/sites/nearest?lat=25&lon=121.5&amenities=pool")
+    assert r.status_code == 400 and len(calls) == 1
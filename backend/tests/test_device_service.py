@@ -0,0 +1,105 @@
+# backend/tests/test_device_service.py
+import os
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+from routes import devices as devices_route
+from services import device_service
+
+DB_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "db")
+
+
+@pytest.fixture()
+def session(pg_commit_session):
+    for name in ("04_create_device_tokens.sql", "08_device_tokens_district.sql"):
+        with open(os.path.join(DB_DIR, name), encoding="utf-8") as f:
+            pg_commit_session.execute(text(f.read()))
+    return pg_commit_session
+
+
+def _row(session, token):
+    return session.execute(text(
+        "SELECT user_id, platform, last_district, district_updated_at IS NOT NULL AS has_ts "
+        "FROM device_tokens WHERE fcm_token = :t"), {"t": token}).one()
+
+
+def test_register_upserts_and_keeps_district(session):
+    device_service.register_device(session, "test-a", "u1", "android", "大安區")
+    device_service.register_device(session, "test-a", "u2", "ios")          # 沒帶行政區：保留原本的
+    assert tuple(_row(session, "test-a")) == ("u2", "ios", "大安區", True)
+    assert session.execute(text("SELECT count(*) FROM device_tokens WHERE fcm_token = 'test-a'")).scalar() == 1
+
+
+def test_batch_counts_inserted_and_updated(session):
+    device_service.register_device(session, "test-b1", "u", "android")
+    out = device_service.register_devices(session, [
+        ("test-b1", "u", "ios", "信義區"),
+        ("test-b2", "v", "android", None),
+        ("test-b2", "w", "android", "中山區"),          # 同批重複：最後一筆為準
+    ])
+    assert out == {"received": 3, "inserted": 1, "updated": 1}
+    assert tuple(_row(session, "test-b1")) == ("u", "ios", "信義區", True)
+    assert tuple(_row(session, "test-b2")) == ("w", "android", "中山區", True)
+
+
+def test_batch_empty():
+    assert device_service.register_devices(None, []) == {"received": 0, "inserted": 0, "updated": 0}
+
+
+# ---- 路由驗證 ----
+
+@pytest.fixture()
+def client(monkeypatch):
+    calls = []
+
+    class _Session:
+        def close(self):
+            pass
+
+    monkeypatch.setattr(devices_route, "SessionLocal", _Session)
+    monkeypatch.setattr(devices_route, "get_district_by_point", lambda s, lat, lon: "大安區")
+    monkeypatch.setattr(device_service, "register_device", lambda s, *a: calls.append(a))
+    monkeypatch.setattr(device_service, "register_devices",
+                        lambda s, ds: calls.append(ds) or {"received": len(ds), "inserted": len(ds), "updated": 0})
+    app = Flask(__name__)
+    app.register_blueprint(devices_route.bp)
+    return app.test_client(), calls
+
+
+def test_register_resolves_district_from_point(client):
+    c, calls = client
+    assert c.post("/devices/register", json={"fcm_token": "t", "lat": 25.03, "lon": 121.54}).status_code == 200
+    assert calls == [("t", None, None, "大安區")]
+
+
+def test_batch_register(client):
+    c, calls = client
+    r = c.post("/devices/register:batch", json={"devices": [
+        {"fcm_token": "a", "platform": "ios", "district": " 信義區 "},
+        {"fcm_token": "b", "lat": "25.03", "lon": "121.54"},
+    ]})
+    assert r.get_json() == {"ok": True, "received": 2, "inserted": 2, "updated": 0}
+    assert calls == [[("a", None, "ios", "信義區"), ("b", None, None, "大安區")]]
+
+
+@pytest.mark.parametrize("body", [
+    {},
+    {"devices": []},
+    {"devices": [{"user_id": "u"}]},
+    {"devices": [{"fcm_token": 5}]},
+    {"devices": [{"fcm_token": "a", "platform": 1}]},
+    {"devices": [{"fcm_token": "a", "lat": "x", "lon": 121.5}]},
+])
+def test_batch_rejects_bad_items(client, body):
+    c, calls = client
+    assert c.post("/devices/register:batch", json=body).status_code == 400
+    assert calls == []
+
+
+def test_batch_size_limit(client, monkeypatch):
+    c, calls = client
+    monkeypatch.setattr(device_service, "MAX_BATCH", 2)
+    devices = [{"fcm_token": f"t{i}"} for i in range(3)]
+    assert c.post("/devices/register:batch", json={"devices": devices}).status_code == 400
@@ -0,0 +1,123 @@
+# backend/tests/test_district_service.py
+import pytest
+
+from models import TaipeiDistrict, TaipeiDistrictPart
+from services import district_service
+
+DISTRICTS_FP = (16384, 12, 900)
+
+
+class _Result:
+    def __init__(self, row):
+        self.row = row
+
+    def scalar(self):
+        return self.row[0] if self.row else None
+
+    def first(self):
+        return self.row
+
+    def one(self):
+        return self.row
+
+
+class _Session:
+    """只認 _parts_usable 會下的幾句 SQL。"""
+
+    def __init__(self, tables, built=None):
+        self.tables, self.built = tables, built
+
+    def execute(self, stmt, params=None):
+        sql = str(stmt)
+        if "to_regclass" in sql:
+            name = (params or {}).get("t") or sql.split("'")[1]
+            return _Result((name,) if name in self.tables else None)
+        if "FROM taipei_district_derived_source" in sql:
+            return _Result(self.built)
+        if "FROM taipei_districts" in sql:
+            return _Result(DISTRICTS_FP)
+        raise AssertionError(sql)
+
+
+@pytest.fixture()
+def used(monkeypatch):
+    calls = []
+
+    def fake_resolve_on(session, model, geom, geog, lat, lon):
+        calls.append(model)
+        return {"city": "臺北市", "district": "大安區", "method": "contains"}
+
+    monkeypatch.setattr(district_service, "_resolve_on", fake_resolve_on)
+    monkeypatch.setattr(district_service, "_parts_checked_at", 0.0)
+    monkeypatch.setattr(district_service, "PARTS_CHECK_SEC", 0.0)
+    return calls
+
+
+_ALL = {"taipei_districts", "taipei_district_parts", "taipei_district_derived_source"}
+
+
+@pytest.mark.parametrize("session", [
+    _Session({"taipei_districts"}),                                             # 還沒跑 db/11、db/13
+    _Session({"taipei_districts", "taipei_district_parts"}),                    # 有小塊表、沒有來源紀錄
+    _Session(_ALL, built=None),                                                 # 表在但從沒重建過
+    _Session(_ALL, built=(16384, 12, 800)),                                     # SHP 重匯後沒重建
+    _Session(_ALL, built=(99999, 12, 900)),                                     # -overwrite 換了 OID
+])
+def test_missing_or_stale_parts_use_whole_polygons(used, session):
+    assert district_service._resolve_district_postgis(session, 25.03, 121.54)["district"] == "大安區"
+    assert used == [TaipeiDistrict]
+
+
+def test_matching_fingerprint_uses_parts(used):
+    district_service._resolve_district_postgis(_Session(_ALL, built=DISTRICTS_FP), 25.03, 121.54)
+    assert used == [TaipeiDistrictPart]
+
+
+def test_check_is_cached(used, monkeypatch):
+    monkeypatch.setattr(district_service, "PARTS_CHECK_SEC", 60.0)
+    district_service._resolve_district_postgis(_Session(_ALL, built=DISTRICTS_FP), 25.03, 121.54)
+    district_service._resolve_district_postgis(_Session(set()), 25.03, 121.54)     # 60 秒內不重查
+    assert used == [TaipeiDistrictPart, TaipeiDistrictPart]
+
+
+# ---- 批次：同一個 DISTRICT_RESOLVER 開關，PostGIS 模式一次 LATERAL 查完 ----
+
+class _BatchSession(_Session):
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.lateral = []
+
+    def execute(self, stmt, params=None):
+        if "unnest" in str(stmt):
+            self.lateral.append((str(stmt), params))
+            rows = [{"i": i, "city_name": "臺北市", "district_name": "大安區", "method": "contains"}
+                    for i in range(len(params["lats"])) if params["lats"][i] < 26]
+            return type("R", (), {"mappings": lambda self: rows})()
+        return super().execute(stmt, params)
+
+
+@pytest.mark.parametrize("built,table", [(DISTRICTS_FP, "taipei_district_parts"), (None, "taipei_districts")])
+def test_batch_postgis_is_one_lateral_query(monkeypatch, built, table):
+    monkeypatch.setattr(district_service, "DISTRICT_RESOLVER", "postgis")
+    monkeypatch.setattr(district_service, "_parts_checked_at", 0.0)
+    monkeypatch.setattr(district_service, "PARTS_CHECK_SEC", 0.0)
+    monkeypatch.setattr(district_service.district_index, "get_index",
+                        lambda s: pytest.fail("memory index used in postgis mode"))
+    s = _BatchSession(_ALL, built=built)
+    out = district_service.resolve_districts(s, [25.03, 30.0, 25.05], [121.54, 121.5, 121.55])
+    assert [o and o["district"] for o in out] == ["大安區", None, "大安區"]
+    (sql, params), = s.lateral
+    assert f"FROM {table}" in sql and params["lons"] == [121.54, 121.5, 121.55]
+
+
+def test_batch_memory_uses_index(monkeypatch):
+    class _Idx:
+        def __len__(self):
+            return 12
+
+        def resolve_many(self, lats, lons):
+            return [{"district": "信義區"} for _ in lats]
+
+    monkeypatch.setattr(district_service, "DISTRICT_RESOLVER", "memory")
+    monkeypatch.setattr(district_service.district_index, "get_index", lambda s: _Idx())
+    assert district_service.resolve_districts(None, [25.0, 25.1], [121.5, 121.6]) == [{"district": "信義區"}] * 2
@@ -0,0 +1,165 @@
+# backend/tests/test_forecast_cache.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services import forecast_cache
+from services.forecast_cache import CWA_PROBE_TOWN, CountyForecastCache
+
+
+def _payload(issue):
+    towns = [{"TownName": t, "Time": [{"IssueTime": issue}]} for t in (CWA_PROBE_TOWN, "大安區")]
+    return {"records": {"Locations": [{"CountyName": "臺北市", "Location": towns}]}}
+
+
+def _parse(data):
+    index = {town: [{"issue_time": t["IssueTime"]} for t in times]
+             for town, times in forecast_cache.iter_county_towns(data)}
+    return max((f[0]["issue_time"] for f in index.values()), default=None), index
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture()
+def cwa(monkeypatch):
+    """假上游：calls 記錄每次請求是整包還是探測；issue 換值模擬新的一批。"""
+    clock = _Clock()
+    state = {"issue": "2025-07-01 08:00:00", "calls": []}
+    monkeypatch.setenv("CWA_API_KEY", "test")
+    monkeypatch.setattr(forecast_cache, "time", clock)
+
+    cache = CountyForecastCache("t", "http://cwa.test", {"CountyName": "臺北市"}, _parse, ttl=600, probe=60)
+
+    def fake_get(params):
+        state["calls"].append("probe" if "TownName" in params else "full")
+        return _payload(state["issue"])
+
+    monkeypatch.setattr(cache, "_get", fake_get)
+    monkeypatch.setattr(cache, "_start_background", cache._refresh)      # 背景更新改成同步，方便斷言
+    return cache, clock, state
+
+
+def test_probe_unchanged_extends_without_full_fetch(cwa):
+    cache, clock, state = cwa
+    first = cache.get()
+    clock.now += 61
+    assert cache.get() is first                 # 過了探測間隔：先回舊的，探測後沿用
+    assert state["calls"] == ["full", "probe"]
+    clock.now += 30
+    cache.get()
+    assert state["calls"] == ["full", "probe"]  # 延長到下一次探測
+
+
+def test_probe_sees_new_issue_and_fetches_full(cwa):
+    cache, clock, state = cwa
+    cache.get()
+    state["issue"] = "2025-07-01 11:00:00"
+    clock.now += 61
+    cache.get()
+    assert state["calls"] == ["full", "probe", "full"]
+    assert cache.get_town("大安區") == [{"issue_time": "2025-07-01 11:00:00"}]
+
+
+def test_full_fetch_after_ttl_skips_probe(cwa):
+    cache, clock, state = cwa
+    cache.get()
+    for _ in range(9):                          # 每 61 秒探測一次，一直沒變
+        clock.now += 61
+        cache.get()
+    clock.now += 61                             # 累計超過 ttl
+    cache.get()
+    assert state["calls"] == ["full"] + ["probe"] * 9 + ["full"]
+
+
+def test_probe_disabled_when_not_shorter_than_ttl():
+    cache = CountyForecastCache("t", "http://cwa.test", {}, _parse, ttl=60, probe=600)
+    assert cache.probe == 0
+
+
+# ---- 合併同時的 miss、過期先回舊資料 ----
+
+def _threaded_cache(monkeypatch, get):
+    monkeypatch.setenv("CWA_API_KEY", "test")
+    cache = CountyForecastCache("t", "http://cwa.test", {}, _parse, ttl=600, probe=0)
+    monkeypatch.setattr(cache, "_get", get)
+    return cache
+
+
+def test_concurrent_cold_misses_share_one_fetch(monkeypatch):
+    gate, calls = threading.Event(), []
+
+    def slow_get(params):
+        calls.append(1)
+        gate.wait(5)
+        return _payload("2025-07-01 08:00:00")
+
+    cache = _threaded_cache(monkeypatch, slow_get)
+    with ThreadPoolExecutor(8) as ex:
+        futs = [ex.submit(cache.get_town, "大安區") for _ in range(8)]
+        while not calls:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        gate.set()
+        results = [f.result(timeout=5) for f in futs]
+    assert calls == [1]
+    assert all(r == [{"issue_time": "2025-07-01 08:00:00"}] for r in results)
+
+
+def test_expired_serves_stale_while_refreshing(monkeypatch):
+    gate, issues = threading.Event(), iter(["2025-07-01 08:00:00", "2025-07-01 11:00:00"])
+
+    def get(params):
+        issue = next(issues)
+        if issue.endswith("11:00:00"):
+            gate.wait(5)
+        return _payload(issue)
+
+    cache = _threaded_cache(monkeypatch, get)
+    old = cache.get()
+    cache._expires_at = 0.0                             # 過期
+    assert cache.get() is old                           # 不等上游
+    done = cache._inflight
+    gate.set()
+    done.wait(5)
+    assert cache.get_town("大安區") == [{"issue_time": "2025-07-01 11:00:00"}]
+
+
+def test_failed_cold_fetch_backs_off(monkeypatch):
+    calls = []
+
+    def boom(params):
+        calls.append(1)
+        raise RuntimeError("CWA down")
+
+    cache = _threaded_cache(monkeypatch, boom)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            cache.get()
+    assert calls == [1]                                 # CWA_RETRY_SEC 內直接丟上次的錯
+
+
+def test_async_cold_misses_share_one_fetch(monkeypatch):
+    calls = []
+
+    async def afetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return _parse(_payload("2025-07-01 08:00:00"))
+
+    cache = _threaded_cache(monkeypatch, lambda params: pytest.fail("sync fetch"))
+    monkeypatch.setattr(cache, "_afetch", afetch)
+
+    async def run():
+        return await asyncio.gather(*(cache.aget_town("大安區") for _ in range(20)))
+
+    assert len(asyncio.run(run())) == 20
+    assert calls == [1]
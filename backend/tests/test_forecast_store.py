@@ -0,0 +1,79 @@
+# backend/tests/test_forecast_store.py
+import os
+
+import pytest
+from sqlalchemy import text
+
+from models import HeatForecast
+from services import heat_service
+from services.forecast_store import STORES, ForecastStore
+
+DDL = os.path.join(os.path.dirname(__file__), "..", "..", "db", "07_create_cwa_forecasts.sql")
+
+
+class _FakeCache:
+    """假 CWA：fetch 時記下當下 session 是否在交易中，並可在抓取期間模擬別的 replica 動作。"""
+    name = "test_heat"
+
+    def __init__(self, session, issue="2025-07-01 08:00:00"):
+        self.session = session
+        self.issue = issue
+        self.fetches = []
+        self.during_fetch = None
+
+    def fetch(self):
+        self.fetches.append(self.session.in_transaction())
+        if self.during_fetch:
+            self.during_fetch()
+        town = [{"issue_time": self.issue, "heat_injury_index": "30", "heat_injury_warning": ""}]
+        return self.issue, {"大安區": town, "信義區": town}
+
+
+@pytest.fixture()
+def store(pg_commit_session):
+    with open(DDL, encoding="utf-8") as f:
+        pg_commit_session.execute(text(f.read()))
+    cache = _FakeCache(pg_commit_session)
+    st = ForecastStore(cache, HeatForecast, heat_service._to_row, heat_service._from_row)
+    STORES.remove(st)
+    return st, cache, pg_commit_session
+
+
+def _rows(session):
+    return session.execute(text("SELECT count(*) FROM heat_forecasts WHERE district IN ('大安區', '信義區')")).scalar()
+
+
+def test_fetch_runs_outside_transaction(store):
+    st, cache, s = store
+    assert st.refresh(s, min_interval=600) == 2
+    assert cache.fetches == [False]
+    assert st.town(s, "大安區")[0]["heat_injury_index"] == "30"
+
+
+def test_recent_claim_skips_upstream(store):
+    st, cache, s = store
+    st.refresh(s, min_interval=600)
+    assert st.refresh(s, min_interval=600) is None
+    assert len(cache.fetches) == 1
+
+
+def test_same_issue_written_by_other_worker_is_skipped(store):
+    st, cache, s = store
+
+    def other_replica_wrote_it():
+        s.execute(text("UPDATE cwa_forecast_sync SET issue_key = :k WHERE dataset = :d"),
+                  {"k": cache.issue, "d": cache.name})
+        s.commit()
+
+    cache.during_fetch = other_replica_wrote_it
+    assert st.refresh(s, min_interval=600) == 0
+    assert _rows(s) == 0
+
+
+def test_new_issue_is_upserted(store):
+    st, cache, s = store
+    st.refresh(s, min_interval=0)
+    cache.issue = "2025-07-01 11:00:00"
+    assert st.refresh(s, min_interval=0) == 2
+    assert _rows(s) == 4
+    assert [f["issue_time"] for f in st.town(s, "大安區")] == ["2025-07-01 11:00:00"]
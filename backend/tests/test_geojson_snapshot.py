@@ -0,0 +1,151 @@
+# backend/tests/test_geojson_snapshot.py
+import gzip
+import json
+
+import pytest
+from flask import Flask
+
+from routes import cooling_sites
+from services import geojson_snapshot
+from services.geojson_snapshot import SnapshotStore
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+BODY = {"type": "FeatureCollection",
+        "features": [{"type": "Feature", "id": i, "properties": {"name": f"站點{i}"}} for i in range(300)]}
+
+
+@pytest.fixture(autouse=True)
+def _fixed_version(monkeypatch):
+    monkeypatch.setattr(geojson_snapshot, "table_fingerprint", lambda session, table: (1, 1, 1))
+
+
+def _drain():
+    geojson_snapshot._recompressor.submit(lambda: None).result(timeout=10)
+
+
+def test_miss_uses_fast_levels_then_recompresses(monkeypatch):
+    calls = []
+    real = gzip.compress
+    monkeypatch.setattr(geojson_snapshot.gzip, "compress",
+                        lambda b, compresslevel: calls.append(compresslevel) or real(b, compresslevel=compresslevel))
+    store = SnapshotStore("t")
+    snap = store.get(None, "all", lambda: BODY)
+    _drain()
+    assert calls == [geojson_snapshot.FAST_GZIP_LEVEL, geojson_snapshot.BEST_GZIP_LEVEL]
+    assert json.loads(gzip.decompress(snap.gzip)) == BODY
+    if brotli:
+        assert json.loads(brotli.decompress(snap.br)) == BODY
+    assert store.get(None, "all", lambda: pytest.fail("rebuilt")) is snap
+
+
+def test_evicted_snapshot_is_not_recompressed(monkeypatch):
+    store = SnapshotStore("t")
+    done = []
+    monkeypatch.setattr(geojson_snapshot.Snapshot, "recompress", lambda self: done.append(self))
+    snap = geojson_snapshot.Snapshot(BODY, "application/json", (1, 1, 1))
+    store._recompress("all", snap)          # 不在 store 裡（已被擠出或換掉）
+    assert done == []
+
+
+# ---- /sites：只有固定幾種請求進快照 ----
+
+class _Session:
+    def close(self):
+        pass
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    built, streamed = [], []
+    monkeypatch.setattr(cooling_sites, "SessionLocal", _Session)
+    monkeypatch.setattr(cooling_sites, "cooling_sites_page_body",
+                        lambda session, limit: built.append(limit) or json.dumps(BODY).encode())
+
+    def fake_iter(session, **kw):
+        streamed.append(kw)
+        yield '{"type":"FeatureCollection","features":[],"next":null}'
+
+    monkeypatch.setattr(cooling_sites, "iter_cooling_sites_geojson", fake_iter)
+    geojson_snapshot.invalidate("cooling_sites")
+    app = Flask(__name__)
+    app.register_blueprint(cooling_sites.bp)
+    yield app.test_client(), built, streamed
+    geojson_snapshot.invalidate("cooling_sites")
+
+
+def test_sites_default_and_full_page_use_snapshot(client):
+    c, built, streamed = client
+    for path in ("/sites", "/sites?limit=1000", "/sites", "/sites?limit=1000"):
+        assert c.get(path).status_code == 200
+    assert built == [cooling_sites.DEFAULT_PAGE, 1000]
+    assert streamed == []
+
+
+@pytest.mark.parametrize("path", [
+    "/sites?limit=999",
+    "/sites?offset=3",
+    "/sites?limit=1000&offset=500",
+    "/sites?amenities=ac",
+])
+def test_sites_other_pages_stream(client, path):
+    c, built, streamed = client
+    assert c.get(path).status_code == 200
+    assert built == []
+    assert len(streamed) == 1
+
+
+def test_sites_offset_with_bbox_rejected(client):
+    c, _, _ = client
+    assert c.get("/sites?offset=3&bbox=121.4,25.0,121.6,25.1").status_code == 400
+
+
+# ---- ETag：每種編碼、每份 bytes 各一個 ----
+
+def test_recompress_changes_etag_with_bytes():
+    snap = geojson_snapshot.Snapshot(BODY, "application/json", (1, 1, 1))
+    before = dict(snap.reps)
+    snap.recompress()
+    assert snap.reps["identity"] == before["identity"]
+    for coding in ("gzip", "br") if brotli else ("gzip",):
+        data, tag = snap.reps[coding]
+        if data != before[coding][0]:
+            assert tag != before[coding][1]
+
+
+def _snap_app():
+    from routes.http_cache import snapshot_response
+    from flask import request
+
+    snap = geojson_snapshot.Snapshot(BODY, "application/json", (1, 1, 1))
+    app = Flask(__name__)
+    app.add_url_rule("/s", "s", lambda: snapshot_response(snap, request))
+    return app.test_client(), snap
+
+
+def test_304_only_for_negotiated_encoding():
+    c, snap = _snap_app()
+    gz_tag = snap.reps["gzip"][1]
+    r = c.get("/s", headers={"Accept-Encoding": "gzip", "If-None-Match": f'"{gz_tag}"'})
+    assert r.status_code == 304 and r.headers["ETag"] == f'"{gz_tag}"'
+
+    r = c.get("/s", headers={"If-None-Match": f'"{gz_tag}"'})       # identity
+    assert r.status_code == 200 and r.headers["ETag"] == f'"{snap.etag}"'
+    assert r.get_data() == snap.body
+    if brotli:
+        r = c.get("/s", headers={"Accept-Encoding": "br", "If-None-Match": f'"{gz_tag}"'})
+        assert r.status_code == 200 and r.headers["Content-Encoding"] == "br"
+
+
+def test_etag_follows_recompress():
+    c, snap = _snap_app()
+    old = c.get("/s", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    snap.recompress()
+    r = c.get("/s", headers={"Accept-Encoding": "gzip", "If-None-Match": old})
+    assert r.headers["ETag"] == f'"{snap.reps["gzip"][1]}"'
+    assert (r.status_code == 304) == (r.headers["ETag"] == old)
+    if r.status_code == 200:
+        assert gzip.decompress(r.get_data()) == snap.body
@@ -0,0 +1,76 @@
+# backend/tests/test_importer_districts.py
+import pytest
+
+from importer.districts import rebuild_district_derived
+
+
+class _Cursor:
+    """記錄 SQL；fail_on 出現在 SQL 裡時丟例外（模擬欄位不存在等錯誤）。"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.sql = []
+        self.rowcount = 0
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        self.sql.append(sql)
+        if self.fail_on and self.fail_on in sql:
+            raise RuntimeError(f"column {self.fail_on} does not exist")
+        if "pg_try_advisory_xact_lock" in sql:
+            self._rows = [(True,)]
+        else:
+            self._rows = [(12, 15000)]
+
+    def fetchone(self):
+        return self._rows[0]
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class _Conn:
+    def __init__(self, cur):
+        self.cur = cur
+        self.committed = self.rolled_back = False
+
+    def cursor(self):
+        return self.cur
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+def _inserts(cur):
+    return [s for s in cur.sql if "INSERT INTO taipei_district_parts" in s
+            or "INSERT INTO taipei_district_boundaries" in s]
+
+
+def test_rebuild_keys_on_districts_id():
+    # taipei_districts.id 是唯一的主鍵名（import_shp_twd97.sh -lco FID=id；舊表由 db/12 改名）
+    cur = _Cursor()
+    conn = _Conn(cur)
+    stats = rebuild_district_derived(conn)
+    assert conn.committed and stats["districts"] == 12
+    assert len(_inserts(cur)) == 4 and all("d.id," in s for s in _inserts(cur))
+
+
+def test_rebuild_records_source_fingerprint():
+    cur = _Cursor()
+    rebuild_district_derived(_Conn(cur))
+    i = next(i for i, s in enumerate(cur.sql) if "taipei_district_derived_source" in s)
+    assert "'taipei_districts'::regclass::oid" in cur.sql[i - 1]      # 同一交易內先算指紋
+    assert i > max(cur.sql.index(s) for s in _inserts(cur))
+
+
+def test_rebuild_failure_rolls_back():
+    conn = _Conn(_Cursor(fail_on="INSERT INTO taipei_district_boundaries"))
+    with pytest.raises(RuntimeError):
+        rebuild_district_derived(conn)
+    assert conn.rolled_back and not conn.committed
@@ -0,0 +1,152 @@
+# backend/tests/test_importer_pipeline.py
+import io
+import os
+
+import pytest
+
+from importer.csv_stream import CopyStream, CsvError, detect_encoding, iter_rows, open_csv
+from importer.pipeline import ImportBusy, run_import
+from importer.sources import AED, Column, Source, float_or_none, text_or_none
+
+# 不需要 PostGIS：geom 欄位用 text 接 EWKT
+SRC = Source(
+    table="test_import_sites",
+    default_csv="",
+    columns=(
+        Column("name", "名稱", text_or_none),
+        Column("address", "地址", text_or_none),
+        Column("lat", "緯度", float_or_none),
+        Column("lon", "經度", float_or_none),
+    ),
+    key=("name", "address"),
+)
+
+HEADER = "名稱,地址,緯度,經度\n"
+
+
+def _csv(*rows):
+    return io.StringIO(HEADER + "".join(",".join(r) + "\n" for r in rows))
+
+
+# ---- CSV 串流 ----
+
+def test_detect_encoding():
+    assert detect_encoding("﻿名稱".encode("utf-8"), True) == "utf-8-sig"
+    assert detect_encoding("名稱".encode("utf-8"), True) == "utf-8"
+    assert detect_encoding("名稱,地址".encode("cp950"), True) == "cp950"
+    assert detect_encoding("名稱".encode("utf-8")[:-1], False) == "utf-8"     # 樣本切在字中間
+
+
+def test_open_csv_big5_file(tmp_path):
+    path = tmp_path / "aed.csv"
+    path.write_bytes((HEADER + "臺大醫院,中山南路7號,25.04,121.52\n").encode("cp950"))
+    f, enc = open_csv(str(path))
+    assert enc == "cp950"
+    assert list(iter_rows(SRC, f)) == [(1, ["臺大醫院", "中山南路7號", 25.04, 121.52])]
+
+
+def test_iter_rows_errors():
+    with pytest.raises(CsvError, match="缺少欄位"):
+        list(iter_rows(AED, _csv(("a", "b", "1", "2"))))
+    with pytest.raises(CsvError, match="第 3 行"):
+        list(iter_rows(SRC, _csv(("a", "b", "25", "121"), ("c", "d", "x", "121"))))
+
+
+def test_copy_stream_ids_geom_and_nulls():
+    stream = CopyStream(SRC, iter_rows(SRC, _csv(("a", "", "25.0", "121.5"), (",,,",), ("b", "x", "", "121.5"))))
+    assert stream.read() == "1,a,,25.0,121.5,SRID=4326;POINT(121.5 25.0)\n2,b,x,,121.5,\n"
+    assert stream.rows == 2 and stream.read() == ""
+
+
+# ---- swap / diff（會 commit：自己建一張測試表，結束時刪掉）----
+
+@pytest.fixture()
+def db():
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL not set")
+    from sqlalchemy import create_engine
+
+    engine = create_engine(url)
+    conn = engine.raw_connection()
+    cur = conn.cursor()
+    cur.execute("DROP TABLE IF EXISTS test_import_sites_new, test_import_sites")
+    cur.execute("CREATE TABLE test_import_sites (id SERIAL PRIMARY KEY, name TEXT, address TEXT, "
+                "lat DOUBLE PRECISION, lon DOUBLE PRECISION, geom TEXT)")
+    cur.execute("CREATE INDEX idx_test_import_sites_name ON test_import_sites (name)")
+    conn.commit()
+    yield engine, conn
+    conn.rollback()
+    cur.execute("DROP TABLE IF EXISTS test_import_sites_new, test_import_sites")
+    conn.commit()
+    conn.close()
+    engine.dispose()
+
+
+def _rows(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT id, name, address, lat FROM test_import_sites ORDER BY id")
+    rows = cur.fetchall()
+    conn.commit()
+    return rows
+
+
+def test_swap_replaces_table_keeping_indexes_and_sequence(db):
+    engine, conn = db
+    stats = run_import(conn, SRC, _csv(("a", "x", "25.0", "121.5"), ("b", "y", "25.1", "121.6")))
+    assert stats["rows"] == 2 and sorted(stats["indexes"]) == ["idx_test_import_sites_name", "test_import_sites_pkey"]
+    assert _rows(conn) == [(1, "a", "x", 25.0), (2, "b", "y", 25.1)]
+
+    cur = conn.cursor()
+    cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'test_import_sites' ORDER BY 1")
+    assert [r[0] for r in cur.fetchall()] == ["idx_test_import_sites_name", "test_import_sites_pkey"]
+    cur.execute("SELECT to_regclass('test_import_sites_new')")
+    assert cur.fetchone()[0] is None
+    cur.execute("INSERT INTO test_import_sites (name) VALUES ('c') RETURNING id")
+    assert cur.fetchone()[0] == 3                                  # 序列跟著換上、接在 max(id) 後面
+    cur.execute("SELECT geom FROM test_import_sites WHERE id = 1")
+    assert cur.fetchone()[0] == "SRID=4326;POINT(121.5 25.0)"
+    conn.commit()
+
+
+def test_failed_swap_leaves_table_untouched(db):
+    engine, conn = db
+    run_import(conn, SRC, _csv(("a", "x", "25.0", "121.5")))
+    with pytest.raises(CsvError):
+        run_import(conn, SRC, _csv(("b", "y", "25.1", "121.6"), ("c", "z", "bad", "121.6")))
+    assert _rows(conn) == [(1, "a", "x", 25.0)]
+
+
+def test_diff_touches_only_changed_rows(db):
+    engine, conn = db
+    run_import(conn, SRC, _csv(("a", "x", "25.0", "121.5"), ("b", "y", "25.1", "121.6"),
+                               ("c", "z", "25.2", "121.7"), ("dup", "d", "25.3", "121.5"),
+                               ("dup", "d", "25.4", "121.5")))
+    stats = run_import(conn, SRC, _csv(("a", "x", "25.0", "121.5"),        # 沒變
+                                       ("c", "z", "25.25", "121.7"),       # 改了
+                                       ("dup", "d", "25.3", "121.5"),
+                                       ("dup", "d", "25.4", "121.5"),
+                                       ("e", "w", "25.5", "121.5")),       # 新的；b 消失
+                       mode="diff")
+    assert (stats["deleted"], stats["updated"], stats["inserted"], stats["unchanged"]) == (1, 1, 1, 3)
+    assert _rows(conn) == [(1, "a", "x", 25.0), (3, "c", "z", 25.25), (4, "dup", "d", 25.3),
+                           (5, "dup", "d", 25.4), (6, "e", "w", 25.5)]
+
+
+def test_concurrent_import_is_rejected(db):
+    engine, conn = db
+    other = engine.raw_connection()
+    try:
+        cur = other.cursor()
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('import:test_import_sites'))")
+        with pytest.raises(ImportBusy):
+            run_import(conn, SRC, _csv(("a", "x", "25.0", "121.5")))
+    finally:
+        other.rollback()
+        other.close()
+    assert _rows(conn) == []
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        run_import(None, SRC, _csv(), mode="merge")
@@ -0,0 +1,87 @@
+# backend/tests/test_metrics.py
+import pytest
+from prometheus_client.core import REGISTRY
+from sqlalchemy import create_engine, text
+
+from services import metrics
+
+
+def _value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture()
+def app(monkeypatch):
+    monkeypatch.setenv("CAMS_PREFETCH", "0")
+    monkeypatch.setenv("CWA_REFRESH", "0")
+    from app import create_app
+
+    return create_app()
+
+
+def test_route_latency_labelled_by_rule(app):
+    c = app.test_client()
+    labels = {"method": "GET", "route": "/health", "status": "200"}
+    before = _value("http_request_duration_seconds_count", **labels)
+    assert c.get("/health").status_code == 200
+    assert _value("http_request_duration_seconds_count", **labels) == before + 1
+    c.get("/no/such/path")
+    assert _value("http_request_duration_seconds_count", method="GET", route="unmatched", status="404") >= 1
+    assert _value("http_requests_in_flight") == 0
+
+    r = c.get("/metrics")
+    assert r.status_code == 200 and r.content_type == metrics.CONTENT_TYPE_LATEST
+    assert b'route="/health"' in r.data
+    assert b"_created" not in r.data
+
+
+def test_upstream_timer_records_status_or_error():
+    ok = {"upstream": "test_up", "status": "200"}
+    err = {"upstream": "test_up", "status": "error"}
+    before_ok, before_err = (_value("upstream_request_duration_seconds_count", **l) for l in (ok, err))
+    with metrics.upstream_timer("test_up") as t:
+        t.status = 200
+    with pytest.raises(OSError):
+        with metrics.upstream_timer("test_up"):
+            raise OSError("connection refused")
+    assert _value("upstream_request_duration_seconds_count", **ok) == before_ok + 1
+    assert _value("upstream_request_duration_seconds_count", **err) == before_err + 1
+
+
+def test_cache_counter_is_bound():
+    c = metrics.cache_counter("test_cache", "hit")
+    before = _value("cache_requests_total", cache="test_cache", result="hit")
+    c.inc()
+    assert _value("cache_requests_total", cache="test_cache", result="hit") == before + 1
+
+
+@pytest.mark.parametrize("sql,op", [
+    ("  select 1", "SELECT"), ("WITH x AS (SELECT 1) SELECT * FROM x", "WITH"),
+    ("INSERT INTO t VALUES (1)", "INSERT"), ("CREATE TABLE t (a int)", "OTHER"),
+])
+def test_op(sql, op):
+    assert metrics._op(sql) == op
+
+
+def test_sql_labelled_with_service_caller_and_pool(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'm.db'}", poolclass=metrics.TimedQueuePool,
+                           pool_logging_name="test_pool")
+    metrics.instrument_sqlalchemy()
+    metrics.register_pool(engine, "test_pool")
+    # 模擬 services 模組裡的函式發出查詢
+    scope = {"__name__": "services.fake_service", "text": text}
+    exec("def list_things(conn):\n    return conn.execute(text('SELECT 1')).scalar()", scope)
+    labels = {"caller": "fake_service.list_things", "op": "SELECT"}
+    before = _value("db_statement_duration_seconds_count", **labels)
+    try:
+        with engine.connect() as conn:
+            assert scope["list_things"](conn) == 1
+            assert _value("db_pool_connections", pool="test_pool", state="checked_out") == 1
+            with pytest.raises(Exception):
+                conn.execute(text("SELECT * FROM missing_table"))
+            assert not conn.info["metrics_t0"]                 # 出錯的語句不留計時
+        assert _value("db_statement_duration_seconds_count", **labels) == before + 1
+        assert _value("db_pool_checkout_wait_seconds_count", pool="test_pool") >= 1
+    finally:
+        metrics._pool_collector.engines.pop("test_pool", None)
+        engine.dispose()
@@ -0,0 +1,94 @@
+# backend/tests/test_nearest_query.py
+import math
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from services import batch_spatial_service, nearest_query
+from services.nearest_query import CANDIDATE_MAX, initial_candidates, planar_bound_m
+
+
+def _haversine_m(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * 6371008.8 * math.asin(math.sqrt(a))
+
+
+def test_planar_bound_is_a_lower_bound():
+    rng = random.Random(0)
+    for _ in range(5000):
+        lat, lon = rng.uniform(24.9, 25.3), rng.uniform(121.4, 121.7)
+        dlat, dlon = rng.uniform(-0.2, 0.2), rng.uniform(-0.2, 0.2)
+        d = math.hypot(dlat, dlon)
+        assert planar_bound_m(lat, d) <= _haversine_m(lat, lon, lat + dlat, lon + dlon)
+
+
+class _Session:
+    """nearest_query 換成回傳 n_cand；第 k 名距離固定，候選外下界隨 n_cand 變大。"""
+
+    def __init__(self, kth_m, bound_deg_for, table_rows=10_000):
+        self.kth_m, self.bound_deg_for, self.table_rows = kth_m, bound_deg_for, table_rows
+        self.calls = []
+
+    def execute(self, n_cand):
+        self.calls.append(n_cand)
+        cand_n = min(n_cand, self.table_rows)
+        row = SimpleNamespace(distance_m=self.kth_m, cand_bound_deg=self.bound_deg_for(n_cand), cand_n=cand_n)
+        return SimpleNamespace(all=lambda: [row] * 3)
+
+
+@pytest.fixture()
+def fake_query(monkeypatch):
+    monkeypatch.setattr(nearest_query, "nearest_query", lambda m, lat, lon, limit, where, n_cand: n_cand)
+
+
+def test_exact_first_round(fake_query):
+    s = _Session(kth_m=500, bound_deg_for=lambda n: 0.01)          # 下界約 1 km
+    nearest_query.nearest_rows(s, None, 25.03, 121.5, 3)
+    assert s.calls == [initial_candidates(3)]
+
+
+def test_widens_until_bound_covers_kth(fake_query):
+    s = _Session(kth_m=2500, bound_deg_for=lambda n: n / 1900)     # 19→0.01°、38→0.02°、76→0.04°
+    nearest_query.nearest_rows(s, None, 25.03, 121.5, 3)
+    assert s.calls == [19, 38, 76]
+
+
+def test_stops_when_candidates_cover_table(fake_query):
+    s = _Session(kth_m=10_000, bound_deg_for=lambda n: 0.0001, table_rows=20)
+    nearest_query.nearest_rows(s, None, 25.03, 121.5, 3)
+    assert s.calls == [19, 38]
+
+
+def test_stops_at_candidate_max(fake_query):
+    s = _Session(kth_m=10_000, bound_deg_for=lambda n: 0.0001)
+    nearest_query.nearest_rows(s, None, 25.03, 121.5, 3)
+    assert s.calls[-1] == CANDIDATE_MAX
+
+
+# ---- 批次版（LATERAL）：只重查還不確定的點 ----
+
+class _BatchSession:
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, sql, params):
+        self.calls.append((list(params["lats"]), params["n_cand"]))
+        rows = []
+        for i, lat in enumerate(params["lats"]):
+            far = lat > 25.1 and params["n_cand"] < 64                  # 北邊的點要加寬兩次
+            for j in range(2):
+                rows.append({"i": i, "id": j, "name": "n", "address": "a", "lat": lat, "lon": 121.5,
+                             "distance_m": 100.0 * (j + 1), "cand_bound_deg": 0.0001 if far else 0.01,
+                             "cand_n": params["n_cand"]})
+        return SimpleNamespace(mappings=lambda: rows)
+
+
+def test_batch_requeries_only_uncertain_points():
+    s = _BatchSession()
+    out = batch_spatial_service._nearest_postgis(s, "aed", [25.0, 25.2, 25.05], [121.5] * 3, 2)
+    assert s.calls == [([25.0, 25.2, 25.05], 18), ([25.2], 36), ([25.2], 72)]
+    assert [len(items) for items in out] == [2, 2, 2]
+    assert out[1][0]["lat"] == 25.2
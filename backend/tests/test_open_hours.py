@@ -0,0 +1,89 @@
+# backend/tests/test_open_hours.py
+import pytest
+
+from importer.open_hours import DAY_MINUTES as D, WEEK_MINUTES, parse_open_hours, to_multirange
+
+MON, TUE, WED, THU, FRI, SAT, SUN = (i * D for i in range(7))
+
+
+def _daily(days, start, end):
+    return [(d + start, d + end) for d in days]
+
+
+def test_all_day():
+    assert parse_open_hours("24小時") == [(0, WEEK_MINUTES)]
+    assert parse_open_hours("全天") == [(0, WEEK_MINUTES)]
+
+
+def test_plain_range_every_day():
+    assert parse_open_hours("09:30–17:30") == _daily((MON, TUE, WED, THU, FRI, SAT, SUN), 570, 1050)
+
+
+def test_leading_days():
+    assert parse_open_hours("週一至週五8:30-17:30") == _daily((MON, TUE, WED, THU, FRI), 510, 1050)
+    assert parse_open_hours("星期六日 10:00-12:00") == _daily((SAT, SUN), 600, 720)
+
+
+def test_days_on_their_own_line():
+    text = "週一:\n9:00-17:00\n週二~週六:\n8:30-21:00"
+    assert parse_open_hours(text) == (_daily((MON,), 540, 1020) + _daily((TUE, WED, THU, FRI, SAT), 510, 1260))
+
+
+def test_days_before_next_line_range():
+    text = "週二至週五9:00-21:00、週六\n9:00-17:00"
+    assert parse_open_hours(text) == (_daily((TUE, WED, THU, FRI), 540, 1260) + _daily((SAT,), 540, 1020))
+
+
+@pytest.mark.parametrize("text", [
+    "9:00-17:00 週一至週五",
+    "9:00-17:00、週一至週五",
+    "9:00-17:00 週一至週五\n週六10:00-12:00",
+])
+def test_trailing_days_unparsed(text):
+    assert parse_open_hours(text) is None
+
+
+def test_overnight_wraps_into_next_day():
+    iv = parse_open_hours("週六22:00-2:00")
+    assert iv == [(SAT + 1320, SUN + 120)]
+
+
+def test_sunday_overnight_wraps_to_monday():
+    assert parse_open_hours("週日20:00-1:00") == [(0, 60), (SUN + 1200, WEEK_MINUTES)]
+
+
+def test_week_range_wraps():
+    assert parse_open_hours("週六至週一9:00-10:00") == _daily((MON, SAT, SUN), 540, 600)
+
+
+def test_closed_day_subtracted():
+    iv = parse_open_hours("8:00-17:00（每周三休園）")
+    assert iv == _daily((MON, TUE, THU, FRI, SAT, SUN), 480, 1020)
+
+
+def test_weekend_closed():
+    assert parse_open_hours("8:00-17:00（假日不開放）") == _daily((MON, TUE, WED, THU, FRI), 480, 1020)
+
+
+def test_national_holiday_ignored():
+    # 國定假日無法表示，不等同週末
+    assert parse_open_hours("8:00-17:00（國定假日休館）") == _daily((MON, TUE, WED, THU, FRI, SAT, SUN), 480, 1020)
+
+
+@pytest.mark.parametrize("text", [
+    None, "", "  ",
+    "9:0017:00",                    # 落單的時間
+    "25:00-26:00",
+    "9:00-17:61",
+    "6月：9:00-17:00",
+    "9:00-17:00 週六延長至21:00",
+    "9:00-17:00\n週六10:00-12:00",   # 不分星期後又出現指定星期
+    "假日9:00-17:00",
+])
+def test_unparsed(text):
+    assert parse_open_hours(text) is None
+
+
+def test_to_multirange():
+    assert to_multirange([(0, 1440), (2880, 4320)]) == "{[0,1440),[2880,4320)}"
+    assert to_multirange(None) is None
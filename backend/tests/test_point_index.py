@@ -0,0 +1,104 @@
+# backend/tests/test_point_index.py
+import math
+
+import numpy as np
+import pytest
+
+from services import point_index
+from services.point_index import PointIndex, _parse_multirange
+
+rng = np.random.default_rng(7)
+N = 400
+LATS = 25.0 + rng.random(N) * 0.2           # 台北市一帶
+LONS = 121.45 + rng.random(N) * 0.2
+BITS = rng.integers(0, 64, N)
+
+
+def _haversine(lat1, lon1, lat2, lon2, r=point_index.EARTH_RADIUS_M):
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(np.radians(lon2 - lon1) / 2) ** 2
+    return 2 * r * np.arcsin(np.sqrt(a))
+
+
+@pytest.fixture(scope="module")
+def idx():
+    ids = np.arange(1, N + 1)
+    return PointIndex(ids, LATS, LONS, {"id": list(ids)}, bits=BITS,
+                      intervals=[[(0, 600)] if i % 2 else [] for i in range(N)])
+
+
+def _brute(lat, lon, ok=None):
+    d = _haversine(lat, lon, LATS, LONS)
+    pos = np.flatnonzero(ok if ok is not None else np.ones(N, bool))
+    order = pos[np.argsort(d[pos], kind="stable")]
+    return order, d[order]
+
+
+@pytest.mark.parametrize("q", [(25.04, 121.51), (25.1, 121.6), (24.9, 121.4)])   # 最後一個在範圍外
+def test_knn_matches_brute_force_great_circle(idx, q):
+    pos, dist = idx.knn(*q, k=10)
+    want, want_d = _brute(*q)
+    assert pos.tolist() == want[:10].tolist()
+    np.testing.assert_allclose(dist, want_d[:10], rtol=1e-9)
+
+
+def test_distance_close_to_ellipsoid():
+    # 台北市內 1 度緯度差（子午線弧長，25°N 附近約 110,800 m）；誤差在 DISTANCE_TOLERANCE 內
+    d = PointIndex([1], [25.5], [121.5], {}).knn(24.5, 121.5, 1)[1][0]
+    assert abs(d - 110_800) / 110_800 < point_index.DISTANCE_TOLERANCE
+
+
+def test_mask_subset_gives_true_nearest(idx):
+    pos, _ = idx.knn(25.05, 121.55, 5, mask=2 | 8)
+    want, _ = _brute(25.05, 121.55, (BITS & 10) == 10)
+    assert pos.tolist() == want[:5].tolist()
+    assert idx.knn(25.05, 121.55, 5, mask=1 << 10)[0].size == 0      # 沒有點符合
+
+
+def test_where_and_mask_combined(idx):
+    where = idx.open_at(300)
+    pos, _ = idx.knn(25.05, 121.55, 5, mask=4, where=where)
+    want, _ = _brute(25.05, 121.55, where & ((BITS & 4) == 4))
+    assert pos.tolist() == want[:5].tolist()
+    assert not idx.open_at(600).any()                               # 區間是 [start, end)
+
+
+def test_within_radius_sorted(idx):
+    pos, dist = idx.within(25.05, 121.55, 2000, mask=1)
+    want, want_d = _brute(25.05, 121.55, (BITS & 1) == 1)
+    assert pos.tolist() == want[want_d <= 2000].tolist()
+    assert np.all(np.diff(dist) >= 0)
+
+
+def test_knn_many_pads_missing():
+    small = PointIndex([1, 2], [25.0, 25.1], [121.5, 121.5], {})
+    pos, dist = small.knn_many([25.0, 25.1], [121.5, 121.5], 3)
+    assert pos.tolist() == [[0, 1, -1], [1, 0, -1]]
+    assert math.isinf(dist[0, 2]) and dist[0, 0] == 0
+
+
+def test_parse_multirange():
+    assert _parse_multirange("{[0,1440),[2880,4320)}") == [(0, 1440), (2880, 4320)]
+    assert _parse_multirange(None) == []
+
+
+# ---- 依表指紋重建 ----
+
+def test_reload_only_when_fingerprint_changes(monkeypatch):
+    fp, loads, clock = [(1, 1, 1)], [], [1000.0]
+    monkeypatch.setattr(point_index, "table_fingerprint", lambda session, table: fp[0])
+    monkeypatch.setattr(point_index.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(point_index.SOURCES["aed_sites"], "load",
+                        lambda session, f: loads.append(f) or PointIndex([1], [25.0], [121.5], {}, fingerprint=f))
+    point_index.invalidate("aed_sites")
+    try:
+        first = point_index.get_point_index(None, "aed_sites")
+        clock[0] += point_index.CHECK_INTERVAL_SEC + 1
+        assert point_index.get_point_index(None, "aed_sites") is first     # 指紋沒變
+        fp[0] = (1, 2, 1)
+        assert point_index.get_point_index(None, "aed_sites") is first     # 檢查間隔內不碰資料庫
+        clock[0] += point_index.CHECK_INTERVAL_SEC + 1
+        assert point_index.get_point_index(None, "aed_sites") is not first
+        assert loads == [(1, 1, 1), (1, 2, 1)]
+    finally:
+        point_index.invalidate("aed_sites")
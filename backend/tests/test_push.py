@@ -0,0 +1,286 @@
+# backend/tests/test_push.py
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from services import push_fanout, push_service_rest
+from services.push_service_rest import is_dead_token_error, is_transient_error, send_to_token, validate_message
+
+
+def _fcm_error(status, error_code=None, message="", field=None):
+    details = []
+    if error_code:
+        details.append({"@type": "type.googleapis.com/google.firebase.fcm.v1.FcmError", "errorCode": error_code})
+    if field:
+        details.append({"@type": "type.googleapis.com/google.rpc.BadRequest",
+                        "fieldViolations": [{"field": field, "description": "bad"}]})
+    return {"error": {"code": 400, "status": status, "message": message, "details": details}}
+
+
+# ---- validate_message ----
+
+def test_validate_accepts_string_data():
+    assert validate_message("熱傷害警示", "請補充水分", {"level": "3"}) == {"level": "3"}
+    assert validate_message("t", "", None) == {}
+
+
+@pytest.mark.parametrize("title,body,data", [
+    ("t", "b", {"level": 3}),                  # 非字串值
+    ("t", "b", ["level"]),                     # 不是物件
+    ("t", "b", {"google.x": "1"}),             # 保留鍵
+    ("t", "b", {"from": "x"}),
+    (5, "b", {}),
+    ("t" * 500, "b", {}),
+    ("t", "b", {"k": "x" * 5000}),             # 超過 4KB
+])
+def test_validate_rejects_bad_messages(title, body, data):
+    with pytest.raises(ValueError):
+        validate_message(title, body, data)
+
+
+# ---- is_dead_token_error ----
+
+def test_unregistered_is_dead():
+    assert is_dead_token_error(_fcm_error("NOT_FOUND", "UNREGISTERED"))
+
+
+def test_invalid_argument_for_token_is_dead():
+    assert is_dead_token_error(_fcm_error(
+        "INVALID_ARGUMENT", "INVALID_ARGUMENT",
+        "The registration token is not a valid FCM registration token"))
+    assert is_dead_token_error(_fcm_error("INVALID_ARGUMENT", field="message.token"))
+
+
+def test_transient_errors():
+    assert is_transient_error(None, {"raw": "connection reset"})
+    assert is_transient_error(429, _fcm_error("RESOURCE_EXHAUSTED", "QUOTA_EXCEEDED"))
+    assert is_transient_error(503, _fcm_error("UNAVAILABLE", "UNAVAILABLE"))
+    assert not is_transient_error(404, _fcm_error("NOT_FOUND", "UNREGISTERED"))
+    assert not is_transient_error(400, _fcm_error("INVALID_ARGUMENT", "INVALID_ARGUMENT"))
+
+
+def test_invalid_argument_for_payload_is_not_dead():
+    assert not is_dead_token_error(_fcm_error(
+        "INVALID_ARGUMENT", "INVALID_ARGUMENT",
+        "Invalid value at 'message.data[0].value' (TYPE_STRING), 3", field="message.data[0].value"))
+    assert not is_dead_token_error(_fcm_error("INVALID_ARGUMENT"))
+    assert not is_dead_token_error({"raw": "oops"})
+
+
+# ---- fan-out ----
+
+class _Result:
+    def __init__(self, tokens, size):
+        self.tokens, self.size = tokens, size
+
+    def partitions(self):
+        for i in range(0, len(self.tokens), self.size):
+            yield [(t,) for t in self.tokens[i:i + self.size]]
+
+
+class _Session:
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def execute(self, stmt, execution_options=None):
+        return _Result(self.tokens, execution_options["yield_per"])
+
+
+@pytest.fixture
+def fanout(monkeypatch):
+    state = {"pruned": [], "sent": []}
+
+    def setup(tokens, error_for):
+        session = _Session(tokens)
+        factory = lambda: session
+        factory.remove = lambda: None
+        monkeypatch.setattr(push_fanout, "SessionLocal", factory)
+        monkeypatch.setattr(push_fanout, "_prune", lambda ts: state["pruned"].extend(ts) or len(ts))
+
+        def send(ts, title, body, data):
+            state["sent"].append(list(ts))
+            errors = []
+            for t in ts:
+                err = error_for(t)
+                if err:
+                    status = err.pop("_status", 400) if isinstance(err, dict) else 400
+                    errors.append({"token": t, "error": err, "status": status})
+            return {"success": True, "success_count": len(ts) - len(errors),
+                    "failure_count": len(errors), "errors": errors}
+        monkeypatch.setattr(push_fanout, "send_multicast", send)
+        monkeypatch.setattr(push_fanout.time, "sleep", lambda sec: state.setdefault("slept", []).append(sec))
+        return state
+    return setup
+
+
+def test_fanout_prunes_only_dead_tokens(fanout):
+    tokens = [f"t{i}" for i in range(10)]
+    state = fanout(tokens, lambda t: _fcm_error("NOT_FOUND", "UNREGISTERED") if t in ("t1", "t7") else None)
+    job = push_fanout.fanout_district("大安區", "t", "b", {}, batch_size=4)
+    assert job["status"] == "done" and job["pruned"] == 2
+    assert state["pruned"] == ["t1", "t7"]
+
+
+def test_fanout_aborts_on_payload_errors_without_pruning(fanout):
+    tokens = [f"t{i}" for i in range(20)]
+    # 訊息格式錯：每個 token 都回 INVALID_ARGUMENT（甚至訊息提到 token 也不該整批刪）
+    state = fanout(tokens, lambda t: _fcm_error("INVALID_ARGUMENT", "INVALID_ARGUMENT",
+                                                "The registration token is not a valid FCM registration token"))
+    job = push_fanout.fanout_district("大安區", "t", "b", {}, batch_size=10)
+    assert job["status"] == "aborted"
+    assert state["pruned"] == [] and job["pruned"] == 0
+    assert len(state["sent"]) == 1            # 第一批就停
+    assert job["finished_at"] is not None
+
+
+def _throttled():
+    return {**_fcm_error("RESOURCE_EXHAUSTED", "QUOTA_EXCEEDED"), "_status": 429}
+
+
+def test_fanout_throttle_burst_is_retried_not_aborted(fanout):
+    tokens = [f"t{i}" for i in range(10)]
+    calls = {}
+
+    def error_for(t):
+        calls[t] = calls.get(t, 0) + 1
+        return _throttled() if calls[t] == 1 else None      # 第一次全被限流，重送成功
+
+    state = fanout(tokens, error_for)
+    job = push_fanout.fanout_district("大安區", "t", "b", {}, batch_size=10)
+    assert job["status"] == "done"
+    assert job["success"] == 10 and job["failure"] == 0
+    assert job["retried"] == 10 and job["transient_failures"] == 0
+    assert state["pruned"] == [] and len(state["slept"]) == 1
+
+
+def test_fanout_reports_persistent_transient_failures(fanout):
+    tokens = [f"t{i}" for i in range(10)]
+    state = fanout(tokens, lambda t: {"raw": "connection reset", "_status": None} if t in ("t2", "t3") else None)
+    job = push_fanout.fanout_district("大安區", "t", "b", {}, batch_size=5)
+    assert job["status"] == "done"
+    assert job["success"] == 8 and job["failure"] == 2
+    assert job["transient_failures"] == 2
+    assert job["retried"] == 2 * push_fanout.FANOUT_TRANSIENT_RETRIES
+    assert state["pruned"] == []
+
+
+def test_start_fanout_rejects_bad_data():
+    with pytest.raises(ValueError):
+        push_fanout.start_district_fanout("大安區", "t", "b", {"level": 3})
+
+
+# ---- ASGI 模式的 FCM 連線池 ----
+
+def test_async_client_pool_grows_then_waits():
+    from services.push_service_rest import _AsyncClientPool
+
+    async def run():
+        pool = _AsyncClientPool(2)
+        a, b = await pool.get(), await pool.get()
+        waiter = asyncio.ensure_future(pool.get())
+        await asyncio.sleep(0)
+        assert pool.created == 2 and not waiter.done()     # 滿了就等別人還
+        pool.put(a)
+        assert await waiter is a
+        pool.put(a)
+        pool.put(b)
+        await pool.aclose()
+
+    asyncio.run(run())
+
+
+# ---- send_multicast：平行送出、重試、限速 ----
+
+class _Resp:
+    def __init__(self, status, headers=None, body=None):
+        self.status_code = status
+        self.headers = headers or {}
+        self._body = body if body is not None else {"name": "projects/p/messages/1"}
+        self.text = json.dumps(self._body)
+
+    def json(self):
+        return self._body
+
+
+@pytest.fixture
+def fcm(monkeypatch):
+    """假 FCM：responses 依序回給每次 post；slept 記錄退避秒數。"""
+    state = {"responses": [], "posts": 0, "slept": []}
+    monkeypatch.setenv("FCM_ACCESS_TOKEN", "test")
+    monkeypatch.setenv("FCM_PROJECT_ID", "p")
+
+    def post(url, headers, json, timeout):
+        state["posts"] += 1
+        return state["responses"].pop(0) if state["responses"] else _Resp(200)
+
+    monkeypatch.setattr(push_service_rest._session, "post", post)
+    monkeypatch.setattr(push_service_rest.time, "sleep", state["slept"].append)
+    return state
+
+
+def test_retry_honours_retry_after_seconds(fcm):
+    fcm["responses"] = [_Resp(503, {"Retry-After": "7"}), _Resp(429, {"Retry-After": "3"})]
+    assert send_to_token("t", "title", "body")["success"]
+    assert fcm["posts"] == 3 and fcm["slept"] == [7.0, 3.0]
+
+
+def test_retry_gives_up_after_max_retries(fcm):
+    fcm["responses"] = [_Resp(503, body={"error": {"status": "UNAVAILABLE"}})
+                        for _ in range(push_service_rest.FCM_MAX_RETRIES + 1)]
+    res = send_to_token("t", "title", "body")
+    assert res == {"success": False, "status": 503, "error": {"error": {"status": "UNAVAILABLE"}}}
+    assert fcm["posts"] == push_service_rest.FCM_MAX_RETRIES + 1
+
+
+def test_non_retryable_status_not_retried(fcm):
+    fcm["responses"] = [_Resp(404, body={"error": {"status": "NOT_FOUND"}})]
+    assert not send_to_token("t", "title", "body")["success"]
+    assert fcm["posts"] == 1 and fcm["slept"] == []
+
+
+def test_retry_after_http_date_and_backoff():
+    soon = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=10), usegmt=True)
+    assert 8 <= push_service_rest._retry_after(_Resp(503, {"Retry-After": soon}), 0) <= 10
+    assert push_service_rest._retry_after(_Resp(503, {"Retry-After": "9999"}), 0) == \
+        push_service_rest.FCM_BACKOFF_MAX_SEC
+    base = push_service_rest.FCM_BACKOFF_BASE_SEC
+    for attempt in range(3):                       # 沒有 Retry-After：指數退避，jitter 落在 [½, 1) 倍
+        wait = push_service_rest._retry_after(_Resp(503), attempt)
+        assert base * 2 ** attempt / 2 <= wait <= base * 2 ** attempt
+
+
+def test_multicast_runs_concurrently_within_limit(monkeypatch):
+    lock, state = threading.Lock(), {"now": 0, "peak": 0}
+
+    def fake_send(token, title, body, data):
+        with lock:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+        time.sleep(0.02)
+        with lock:
+            state["now"] -= 1
+        if token == "dead":
+            return {"success": False, "status": 404, "error": {"error": {"status": "NOT_FOUND"}}}
+        return {"success": True}
+
+    monkeypatch.setattr(push_service_rest, "send_to_token", fake_send)
+    tokens = [f"t{i}" for i in range(19)] + ["dead"]
+    res = push_service_rest.send_multicast(tokens, "title", "body", concurrency=4)
+    assert res["success_count"] == 19 and res["failure_count"] == 1
+    assert res["errors"] == [{"token": "dead", "error": {"error": {"status": "NOT_FOUND"}}, "status": 404}]
+    assert 1 < state["peak"] <= 4
+
+
+def test_rate_limiter_spaces_requests(monkeypatch):
+    clock = {"now": 0.0}
+    monkeypatch.setattr(push_service_rest.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(push_service_rest.time, "sleep", lambda sec: clock.update(now=clock["now"] + sec))
+    limiter = push_service_rest._RateLimiter(4)
+    for _ in range(12):
+        limiter.acquire()
+    assert clock["now"] == 2.0                            # 先用掉 4 個突發，其餘每秒 4 個
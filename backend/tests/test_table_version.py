@@ -0,0 +1,58 @@
+# backend/tests/test_table_version.py
+import re
+
+from sqlalchemy import text
+
+from services.table_version import table_fingerprint
+
+
+class _OgrShapedSession:
+    """只認得 ogr2ogr 建出的欄位（ogc_fid, city_name, district_name, geom）；引用其他欄位就報錯。"""
+    columns = {"ogc_fid", "city_name", "district_name", "geom"}
+
+    def __init__(self):
+        self.sql = []
+
+    def execute(self, stmt, params=None):
+        sql = str(stmt)
+        self.sql.append(sql)
+        if "to_regclass" in sql:
+            return _Result([("taipei_districts",)])
+        for col in re.findall(r"max\((\w+)\)", sql):
+            if col not in self.columns:
+                raise RuntimeError(f'column "{col}" does not exist')
+        return _Result([(12345, 18, 4242)])
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalar(self):
+        return self.rows[0][0]
+
+    def one(self):
+        return self.rows[0]
+
+
+def test_fingerprint_does_not_need_id_column():
+    s = _OgrShapedSession()
+    assert table_fingerprint(s, "taipei_districts") == (12345, 18, 4242)
+
+
+def test_fingerprint_on_ogr2ogr_shaped_table(pg_session):
+    # 與 ogr2ogr -overwrite（未加 -lco FID=id）建出的表同形：主鍵叫 ogc_fid
+    pg_session.execute(text(
+        "CREATE TEMP TABLE ogr_districts (ogc_fid SERIAL PRIMARY KEY, city_name VARCHAR, district_name VARCHAR)"
+    ))
+    pg_session.execute(text("INSERT INTO ogr_districts (city_name, district_name) VALUES ('臺北市', '大安區')"))
+    before = table_fingerprint(pg_session, "ogr_districts")
+    assert before is not None and before[1] == 1
+
+    pg_session.execute(text("INSERT INTO ogr_districts (city_name, district_name) VALUES ('臺北市', '信義區')"))
+    after = table_fingerprint(pg_session, "ogr_districts")
+    assert after[0] == before[0] and after[1] == 2
+
+
+def test_fingerprint_missing_table(pg_session):
+    assert table_fingerprint(pg_session, "no_such_table_xyz") is None
@@ -0,0 +1,55 @@
+# backend/tests/test_vector_tiles.py
+import pytest
+
+from services import vector_tiles
+from services.tile_cache import TileCache
+
+
+class _Session:
+    def __init__(self):
+        self.sql = []
+
+    def execute(self, stmt, params=None):
+        sql = str(stmt)
+        self.sql.append(sql)
+        return _Result(sql)
+
+
+class _Result:
+    def __init__(self, sql):
+        self.sql = sql
+
+    def scalar(self):
+        if "to_regclass" in self.sql:
+            return 4242
+        if "ST_AsMVT" in self.sql:
+            return b"\x1a\x00"
+        return None
+
+    def one(self):
+        return (4242, 18, 1000)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_state(monkeypatch):
+    monkeypatch.setattr(vector_tiles, "_versions", {})
+    monkeypatch.setattr(vector_tiles, "tile_cache", TileCache(1 << 20))
+
+
+def _mvt_sql(session):
+    return [s for s in session.sql if "ST_AsMVT" in s]
+
+
+def test_districts_layer_tile():
+    # taipei_districts 的主鍵固定是 id（import_shp_twd97.sh 以 -lco FID=id 匯入，舊表由 db/12 改名）
+    s = _Session()
+    tile = vector_tiles.get_tile(s, "districts", 12, 3430, 1753)
+    assert tile.body == b"\x1a\x00"
+    assert "t.id, t.city_name" in _mvt_sql(s)[0]
+    assert "ST_SimplifyPreserveTopology" in _mvt_sql(s)[0]
+
+
+def test_cluster_query():
+    s = _Session()
+    vector_tiles.get_tile(s, "sites", 10, 857, 438)
+    assert "SELECT t.id, ST_Transform" in _mvt_sql(s)[0] and "point_count" in _mvt_sql(s)[0]
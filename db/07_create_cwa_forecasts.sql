@@ -0,0 +1,35 @@
+-- db/07_create_cwa_forecasts.sql
+-- CWA 健康氣象預報落地（熱傷害 M-A0085-001、溫差 F-A0085-005）
+-- 以 (district, issue_time) 為鍵；refresher 只 upsert 新增或數值有變的列，舊列保留做分析
+
+CREATE TABLE IF NOT EXISTS heat_forecasts (
+  district             TEXT NOT NULL,        -- TownName，例如 '大安區'
+  issue_time           TIMESTAMPTZ NOT NULL,
+  heat_injury_index    TEXT,                 -- 與上游相同的字串
+  heat_injury_warning  TEXT,
+  created_at           TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at           TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (district, issue_time)
+);
+
+CREATE TABLE IF NOT EXISTS tempdiff_forecasts (
+  district                        TEXT NOT NULL,
+  issue_time                      TIMESTAMPTZ NOT NULL,
+  start_time                      TIMESTAMPTZ,
+  end_time                        TIMESTAMPTZ,
+  temperature_difference_index    TEXT,
+  temperature_difference_warning  TEXT,
+  created_at                      TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at                      TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (district, issue_time)
+);
+
+-- 每個資料集最近一次同步：window_start = 最新一批預報最早的 issue_time（路由只回這之後的列）
+CREATE TABLE IF NOT EXISTS cwa_forecast_sync (
+  dataset       TEXT PRIMARY KEY,            -- 'heat' / 'tempdiff'
+  issue_key     TEXT,                        -- 最新一批的 IssueTime（判斷是否有新資料）
+  window_start  TIMESTAMPTZ,
+  rows_changed  INTEGER NOT NULL DEFAULT 0,  -- 上次同步 upsert 的列數
+  checked_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,7 @@
+-- db/08_device_tokens_district.sql
+-- 裝置最近一次回報位置所在的行政區（行政區推播用）
+ALTER TABLE device_tokens ADD COLUMN IF NOT EXISTS last_district TEXT;
+ALTER TABLE device_tokens ADD COLUMN IF NOT EXISTS district_updated_at TIMESTAMPTZ;
+
+-- 依行政區串流（server-side cursor 依 id 排序讀取）
+CREATE INDEX IF NOT EXISTS idx_device_tokens_district ON device_tokens (last_district, id);
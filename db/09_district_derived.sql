@@ -0,0 +1,27 @@
+-- db/09_district_derived.sql
+-- 由 taipei_districts 衍生的表（python -m importer districts 重建；匯入 SHP 後會自動跑）
+
+-- ST_Subdivide 切成小塊（每塊頂點數有上限），contains / 50m 容錯只需測少數小多邊形
+CREATE TABLE IF NOT EXISTS taipei_district_parts (
+  id            SERIAL PRIMARY KEY,
+  district_id   INTEGER NOT NULL,           -- taipei_districts 的主鍵（ogr2ogr -lco FID=id；SHP 以 -overwrite 重匯，不設 FK）
+  city_name     TEXT,
+  district_name TEXT NOT NULL,
+  geom          geometry(Polygon, 4326) NOT NULL,
+  geog          geography(Polygon, 4326) NOT NULL   -- 預先轉好，ST_DWithin 不必每次 cast
+);
+CREATE INDEX IF NOT EXISTS idx_district_parts_geom ON taipei_district_parts USING GIST (geom);
+CREATE INDEX IF NOT EXISTS idx_district_parts_geog ON taipei_district_parts USING GIST (geog);
+
+-- 地圖用的簡化邊界：每個 tier 一組容差，GeoJSON 預先算好
+CREATE TABLE IF NOT EXISTS taipei_district_boundaries (
+  id            SERIAL PRIMARY KEY,
+  tier          SMALLINT NOT NULL,
+  district_id   INTEGER NOT NULL,
+  city_name     TEXT,
+  district_name TEXT NOT NULL,
+  tolerance_deg DOUBLE PRECISION NOT NULL,
+  n_points      INTEGER NOT NULL,
+  geojson       TEXT NOT NULL,              -- geometry 部分（ST_AsGeoJSON）
+  UNIQUE (tier, district_id)
+);
@@ -0,0 +1,12 @@
+-- db/10_cooling_sites_amenities.sql
+-- 設施位元遮罩（寫入時由資料庫算好；位元定義同 services/cooling_sites_service.AMENITY_BITS）
+--   fan=1, ac=2, toilet=4, seating=8, drinking=16, accessible_seat=32
+-- 查詢：amenities & :mask = :mask（最近點查詢時在 GiST KNN 掃描中逐列套用，不需另建索引）
+ALTER TABLE cooling_sites ADD COLUMN IF NOT EXISTS amenities SMALLINT GENERATED ALWAYS AS ((
+    (coalesce(fan, false)::int)
+  | (coalesce(ac, false)::int << 1)
+  | (coalesce(toilet, false)::int << 2)
+  | (coalesce(seating, false)::int << 3)
+  | (coalesce(drinking, false)::int << 4)
+  | (coalesce(accessible_seat, false)::int << 5)
+)::smallint) STORED;
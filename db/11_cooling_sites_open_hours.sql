@@ -0,0 +1,11 @@
+-- db/11_cooling_sites_open_hours.sql
+-- 開放時間的結構化版本（由 importer 解析 open_hours 後寫入，規則見 backend/importer/open_hours.py）
+--   open_week：一週內開放的分鐘區間，週一 00:00 = 0、週日 24:00 = 10080，例如每天 9-17 點為
+--              {[540,1020),[1980,2460),...}；看不懂或空白為 NULL
+--   open_hours_parsed：open_hours 是否解析成功（false 的列需要人工確認，open_now 查詢不會選到）
+-- 查詢：open_week @> :minute_of_week（台北時間），走 GiST 索引
+-- 舊資料要重新匯入（make import-csv）才會填入
+ALTER TABLE cooling_sites ADD COLUMN IF NOT EXISTS open_week int4multirange;
+ALTER TABLE cooling_sites ADD COLUMN IF NOT EXISTS open_hours_parsed BOOLEAN NOT NULL DEFAULT false;
+
+CREATE INDEX IF NOT EXISTS idx_cooling_sites_open_week ON cooling_sites USING GIST (open_week);
@@ -0,0 +1,14 @@
+-- db/12_taipei_districts_fid.sql
+-- 舊版 scripts/import_shp_twd97.sh 沒加 -lco FID=id，ogr2ogr 會把主鍵建成 ogc_fid；
+-- 程式（models.TaipeiDistrict、importer/districts.py、/tiles/districts）一律用 id，這裡把舊表改回來。
+-- 已經是 id 的表不受影響，可重複執行。
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM information_schema.columns
+              WHERE table_schema = current_schema() AND table_name = 'taipei_districts' AND column_name = 'ogc_fid')
+     AND NOT EXISTS (SELECT 1 FROM information_schema.columns
+              WHERE table_schema = current_schema() AND table_name = 'taipei_districts' AND column_name = 'id') THEN
+    ALTER TABLE taipei_districts RENAME COLUMN ogc_fid TO id;
+  END IF;
+END
+$$;
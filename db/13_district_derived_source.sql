@@ -0,0 +1,11 @@
+-- db/13_district_derived_source.sql
+-- 衍生表（taipei_district_parts / boundaries）是由哪一版 taipei_districts 建的：
+-- python -m importer districts 重建時寫入當下的表指紋（同 services/table_version：OID、筆數、max(xmin)）。
+-- SHP 以 import_shp_twd97.sh 重匯後若沒重建衍生表，指紋就對不上，行政區判斷改用整塊多邊形。
+CREATE TABLE IF NOT EXISTS taipei_district_derived_source (
+  id          BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),   -- 只有一列
+  source_oid  BIGINT NOT NULL,
+  source_rows BIGINT NOT NULL,
+  source_xmin BIGINT NOT NULL,
+  built_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,5 @@
+-- db/migrations/drop_legacy_aqi_cache.sql
+-- 刪除舊版 AQI 快取表 aqi_cache（10 分鐘時槽 × 0.001 度 bucket，已由 aqi_grid_cache 取代）。
+-- 會刪資料，不放在 db/ 根目錄（docker-entrypoint-initdb.d 與 make init-db 只套用根目錄的建表檔），
+-- 確認新版已上線後以 make drop-legacy-aqi-cache 手動執行。
+DROP TABLE IF EXISTS aqi_cache;
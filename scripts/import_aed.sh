@@ -1,5 +1,6 @@
 #!/usr/bin/env bash
 # scripts/import_aed.sh
+# 舊版流程（TRUNCATE 後重灌，期間 API 會讀到空表）；make import-* 已改用 backend/importer
 set -euo pipefail
 
 # --- 讀取環境變數 ---
@@ -62,12 +62,18 @@ docker exec -i tp-gdal ogr2ogr -f "PostgreSQL" \
   -nln taipei_districts \
   -nlt MULTIPOLYGON \
   -lco GEOMETRY_NAME=geom \
+  -lco FID=id \
   -overwrite \
   --config SHAPE_ENCODING "${SHP_ENCODING}" \
   -s_srs "EPSG:${SRC_SRID}" \
   -t_srs "EPSG:4326" \
   -sql "SELECT PNAME AS city_name, TNAME AS district_name, * FROM ${LAYER_NAME}"
 
+# 主鍵需叫 id（db/02、models.TaipeiDistrict、行政區衍生表都用它）；ogr2ogr 預設會建成 ogc_fid
+echo "===> 檢查主鍵欄位 id"
+docker exec -i tp-postgis psql -U "${POSTGRES_USER}" -d "${POSTGRES_DB}" -v ON_ERROR_STOP=1 -qc \
+"SELECT id FROM taipei_districts LIMIT 0;" >/dev/null || { echo "taipei_districts 缺少 id 欄位（ogr2ogr 需加 -lco FID=id）"; exit 1; }
+
 # --- 建索引 + 分析 + 檢查 ---
 echo "===> 建立 GIST 索引與 ANALYZE"
 docker exec -i tp-postgis psql -U "${POSTGRES_USER}" -d "${POSTGRES_DB}" -v ON_ERROR_STOP=1 -c \